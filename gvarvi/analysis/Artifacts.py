@@ -0,0 +1,256 @@
+# coding=utf-8
+
+from collections import namedtuple, deque
+
+import numpy as np
+
+from config import ARTIFACT_MIN_RR, ARTIFACT_MAX_RR, ARTIFACT_WINDOW, ARTIFACT_MAX_CHANGE, ARTIFACT_ADAPTIVE_FACTOR, \
+    ARTIFACT_ADAPTIVE_MIN, ARTIFACT_ACTION
+
+# Reasons why a beat is an artifact (bit flags)
+OUT_OF_BOUNDS = 1
+MEDIAN_CHANGE = 2
+ADAPTIVE_THRESHOLD = 4
+REASON_NAMES = ((OUT_OF_BOUNDS, "bounds"), (MEDIAN_CHANGE, "median_change"), (ADAPTIVE_THRESHOLD, "adaptive"))
+
+# What is done with artifacts
+FLAG = "flag"
+INTERPOLATE = "interpolate"
+DROP = "drop"
+ACTIONS = (FLAG, INTERPOLATE, DROP)
+
+# Scale factor from median absolute deviation to standard deviation of normal data
+MAD_TO_SD = 1.4826
+
+ArtifactRules = namedtuple("ArtifactRules", ["min_rr", "max_rr", "window", "max_change", "adaptive_factor",
+                                             "adaptive_min"])
+"""
+Artifact detection rules. A beat is an artifact if:
+    it's out of [min_rr, max_rr] (ms),
+    it differs from median of its window (window beats centered on it) more than max_change (ratio), or
+    it differs from median more than adaptive_factor local standard deviations (estimated from median
+    absolute deviation of the window), and at least adaptive_min ms.
+Rules set to None are disabled.
+"""
+DEFAULT_RULES = ArtifactRules(ARTIFACT_MIN_RR, ARTIFACT_MAX_RR, ARTIFACT_WINDOW, ARTIFACT_MAX_CHANGE,
+                              ARTIFACT_ADAPTIVE_FACTOR, ARTIFACT_ADAPTIVE_MIN)
+
+AuditEntry = namedtuple("AuditEntry", ["index", "rr", "reasons", "action", "value"])
+ArtifactReport = namedtuple("ArtifactReport", ["rr", "flags", "audit"])
+
+
+def reason_names(flags):
+    """
+    Gets names of the reasons of an artifact.
+    @param flags: Artifact flags of a beat.
+    @return: Comma separated reason names.
+    """
+    return ",".join(name for flag, name in REASON_NAMES if flags & flag)
+
+
+def _half_window(rules):
+    return rules.window // 2
+
+
+def _window_indices(centers, n, half):
+    """
+    Gets indices of the windows centered on some beats of a series of n beats.
+    Windows that exceed series limits are completed by reflection, so edge beats
+    are judged with the same number of neighbours than the rest.
+    """
+    indices = np.asarray(centers)[:, np.newaxis] + np.arange(-half, half + 1)
+    if n < 2:
+        return np.zeros_like(indices)
+    period = 2 * (n - 1)
+    indices = np.mod(indices, period)
+    return np.where(indices > n - 1, period - indices, indices)
+
+
+def _classify(values, windows, rules):
+    """
+    Applies detection rules to beats, given the windows centered on them.
+    @param values: Numpy array of rr values.
+    @param windows: Numpy matrix with the window of every value (one row per value).
+    @param rules: The ArtifactRules.
+    @return: A tuple (flags, local medians).
+    """
+    flags = np.zeros(len(values), dtype=np.uint8)
+    medians = np.median(windows, axis=1)
+    deviation = np.abs(values - medians)
+    if rules.min_rr is not None:
+        flags[values < rules.min_rr] |= OUT_OF_BOUNDS
+    if rules.max_rr is not None:
+        flags[values > rules.max_rr] |= OUT_OF_BOUNDS
+    if rules.max_change is not None:
+        flags[deviation > rules.max_change * medians] |= MEDIAN_CHANGE
+    if rules.adaptive_factor is not None:
+        mad = np.median(np.abs(windows - medians[:, np.newaxis]), axis=1)
+        threshold = np.maximum(rules.adaptive_factor * MAD_TO_SD * mad, rules.adaptive_min or 0)
+        flags[deviation > threshold] |= ADAPTIVE_THRESHOLD
+    return flags, medians
+
+
+def _replacement_values(rr, flags, medians, half):
+    """
+    Computes values that replace artifacts: linear interpolation between nearest valid
+    beats, looking at most half window away on each side. If there is a valid beat
+    only on one side, its value is used. If there isn't any, local median is used.
+    @return: A numpy array with the replacement of every beat (meaningless for valid beats).
+    """
+    n = len(rr)
+    positions = np.arange(n)
+    valid = flags == 0
+    previous = np.maximum.accumulate(np.where(valid, positions, -1))
+    following = np.minimum.accumulate(np.where(valid, positions, n)[::-1])[::-1]
+    has_previous = (previous >= 0) & (positions - previous <= half)
+    has_following = (following < n) & (following - positions <= half)
+    previous_rr = rr[np.clip(previous, 0, n - 1)]
+    following_rr = rr[np.clip(following, 0, n - 1)]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        interpolated = previous_rr + (following_rr - previous_rr) * (positions - previous) / \
+            (following - previous).astype(float)
+    return np.where(has_previous & has_following, interpolated,
+                    np.where(has_previous, previous_rr, np.where(has_following, following_rr, medians)))
+
+
+def _audit(indices, rr, flags, action, values):
+    return [AuditEntry(int(i), int(v), reason_names(f), action, None if action == DROP else int(np.round(c)))
+            for i, v, f, c in zip(indices, rr, flags, values)]
+
+
+def detect_artifacts(rr, rules=DEFAULT_RULES):
+    """
+    Detects artifacts of a whole rr series. Rolling medians and deviations of every
+    beat are computed in a single vectorized pass.
+    @param rr: Sequence of rr values, in ms.
+    @param rules: The ArtifactRules.
+    @return: A numpy array with artifact flags of every beat (0 for valid beats).
+    """
+    return _detect(np.asarray(rr, dtype=float), rules)[0]
+
+
+def _detect(rr, rules):
+    half = _half_window(rules)
+    if len(rr) == 0:
+        return np.zeros(0, dtype=np.uint8), np.zeros(0)
+    return _classify(rr, rr[_window_indices(np.arange(len(rr)), len(rr), half)], rules)
+
+
+def correct_artifacts(rr, rules=DEFAULT_RULES, action=ARTIFACT_ACTION):
+    """
+    Detects and corrects artifacts of a whole rr series.
+    @param rr: Sequence of rr values, in ms.
+    @param rules: The ArtifactRules.
+    @param action: FLAG (values are kept), INTERPOLATE (values are replaced) or DROP (values are removed).
+    Dropping beats shifts the time of the following beats, so tags may not match anymore.
+    @return: An ArtifactReport with corrected rr series, flags of every original beat and audit trail.
+    """
+    if action not in ACTIONS:
+        raise ValueError("Unknown artifact action: {0}".format(action))
+    rr = np.asarray(rr, dtype=float)
+    flags, medians = _detect(rr, rules)
+    artifacts = np.flatnonzero(flags)
+    if action == INTERPOLATE:
+        replacements = _replacement_values(rr, flags, medians, _half_window(rules))
+        corrected = np.where(flags == 0, rr, np.round(replacements))
+        audit = _audit(artifacts, rr[artifacts], flags[artifacts], action, replacements[artifacts])
+    else:
+        corrected = rr[flags == 0] if action == DROP else rr.copy()
+        audit = _audit(artifacts, rr[artifacts], flags[artifacts], action, rr[artifacts])
+    return ArtifactReport(corrected.astype(int), flags, audit)
+
+
+class StreamingArtifactFilter(object):
+    """
+    Applies artifact detection and correction to a rr stream, beat by beat, with
+    the same rules (and the same results) than correct_artifacts applied to the
+    whole series. Every beat is delayed until a bounded number of following beats
+    (a full window, to judge and to interpolate it) has been received.
+    @param rules: The ArtifactRules.
+    @param action: FLAG, INTERPOLATE or DROP.
+    """
+
+    def __init__(self, rules=DEFAULT_RULES, action=ARTIFACT_ACTION):
+        if action not in ACTIONS:
+            raise ValueError("Unknown artifact action: {0}".format(action))
+        self.rules = rules
+        self.action = action
+        self.half = _half_window(rules)
+        self.lookahead = 2 * self.half
+        # Recent beats: raw values, flags and local medians. Index of first one is base
+        self.raw = deque()
+        self.flags = deque()
+        self.medians = deque()
+        self.base = 0
+        self.received = 0
+        self.classified = 0
+        self.emitted = 0
+        self.audit = []
+
+    def push(self, rr):
+        """
+        Adds a beat to stream.
+        @param rr: The rr value, in ms.
+        @return: A list with the values (zero, one or none) that leave the filter.
+        """
+        self.raw.append(float(rr))
+        self.received += 1
+        # A beat can be judged when the whole window after it has been received
+        self._classify_until(self.received - self.half)
+        return self._emit_until(self.received - self.lookahead)
+
+    def flush(self):
+        """
+        Ends stream, judging and correcting last beats.
+        @return: A list with the remaining values.
+        """
+        self._classify_until(self.received)
+        return self._emit_until(self.received)
+
+    def _classify_until(self, end):
+        if end <= self.classified:
+            return
+        centers = np.arange(self.classified, end)
+        indices = _window_indices(centers, self.received, self.half) - self.base
+        raw = np.array(self.raw)
+        flags, medians = _classify(raw[centers - self.base], raw[indices], self.rules)
+        self.flags.extend(flags)
+        self.medians.extend(medians)
+        self.classified = end
+
+    def _emit_until(self, end):
+        output = []
+        while self.emitted < end:
+            i = self.emitted - self.base
+            rr, flags = self.raw[i], self.flags[i]
+            if not flags:
+                output.append(int(rr))
+            elif self.action == FLAG:
+                self.audit.extend(_audit([self.emitted], [rr], [flags], self.action, [rr]))
+                output.append(int(rr))
+            elif self.action == DROP:
+                self.audit.extend(_audit([self.emitted], [rr], [flags], self.action, [rr]))
+            else:
+                # Replacement only looks at beats half window away, all of them already judged
+                beg = max(i - self.half, 0)
+                end_window = min(i + self.half + 1, self.classified - self.base)
+                value = _replacement_values(np.array(list(self.raw)[beg:end_window]),
+                                            np.array(list(self.flags)[beg:end_window]),
+                                            np.array(list(self.medians)[beg:end_window]), self.half)[i - beg]
+                self.audit.append(_audit([self.emitted], [rr], [flags], self.action, [value])[0])
+                output.append(int(np.round(value)))
+            self.emitted += 1
+        self._trim()
+        return output
+
+    def _trim(self):
+        # Window of oldest beat still to be judged (reflection at begin only uses first beats,
+        # that are kept while needed) and neighbours of oldest beat still to be emitted
+        keep_from = min(self.classified - self.half, self.emitted - self.half)
+        if self.classified <= self.half:
+            keep_from = 0
+        while self.base < keep_from:
+            self.raw.popleft()
+            self.flags.popleft()
+            self.medians.popleft()
+            self.base += 1
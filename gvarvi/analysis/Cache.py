@@ -0,0 +1,157 @@
+# coding=utf-8
+
+import hashlib
+import os
+import tempfile
+import threading
+import zlib
+
+import numpy as np
+
+from logger import Logger
+from utils import Singleton, result_file_stamp
+from config import ANALYSIS_CACHE_DIR, ANALYSIS_CACHE_SIZE
+
+CACHE_EXTENSION = ".npz"
+HASH_BLOCK_SIZE = 1 << 20
+
+
+class AnalysisCache(object):
+    """
+    On disk cache of analysis results (parsed arrays, resampled series, metrics...).
+    Entries are keyed by the files they come from (size, modification time and a
+    content hash of each one) and by the analysis parameters, so an entry is never
+    used once its files change. Entries are dictionaries of numpy arrays, saved as
+    npz files. When cache exceeds its size limit, least recently used entries are
+    removed.
+    @param cache_dir: Directory of cache files.
+    @param max_size: Size limit, in bytes.
+    """
+    __metaclass__ = Singleton
+
+    def __init__(self, cache_dir=os.path.join(ANALYSIS_CACHE_DIR, "results"), max_size=ANALYSIS_CACHE_SIZE):
+        self.logger = Logger()
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        # Content hashes already computed, by file stamp (path, size, modification time)
+        self.hashes = {}
+        self.lock = threading.Lock()
+
+    def key(self, files, params):
+        """
+        Builds the key of an analysis.
+        @param files: Paths to result files (plain, rotated or compressed) used by the analysis.
+        @param params: Analysis name and parameters (any value with a stable repr).
+        @return: The key, or None if some file doesn't exist.
+        """
+        fingerprints = []
+        for path in files:
+            stamp = result_file_stamp(path)
+            if stamp is None:
+                return None
+            fingerprints.append(stamp + (self._content_hash(stamp),))
+        return hashlib.sha1(repr((fingerprints, params))).hexdigest()
+
+    def get(self, key):
+        """
+        Gets a cache entry, marking it as recently used.
+        @param key: The entry key.
+        @return: A dictionary of numpy arrays, or None if entry is not cached.
+        """
+        if key is None:
+            return None
+        path = self._entry_file(key)
+        try:
+            with open(path, "rb") as f:
+                data = np.load(f)
+                entry = dict((name, data[name]) for name in data.files)
+            os.utime(path, None)
+            return entry
+        except (IOError, OSError):
+            return None
+        except (ValueError, KeyError, zlib.error):
+            self.logger.warning("Invalid analysis cache file removed: {0}".format(path))
+            self._remove(path)
+            return None
+
+    def put(self, key, entry):
+        """
+        Saves a cache entry, removing least recently used ones if cache gets too big.
+        @param key: The entry key.
+        @param entry: A dictionary of numpy arrays (or values convertible to numpy arrays, without objects).
+        """
+        if key is None:
+            return
+        path = self._entry_file(key)
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            # Written to a temporary file first (unique for every thread and process), so a partial entry is
+            # never read
+            fd, tmp_file = tempfile.mkstemp(suffix=".tmp", dir=self.cache_dir)
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.savez(f, **entry)
+                if os.name == "nt" and os.path.isfile(path):
+                    # Windows can't rename over an existing file (other writer may have just removed it)
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                os.rename(tmp_file, path)
+            except Exception:
+                if os.path.isfile(tmp_file):
+                    os.remove(tmp_file)
+                raise
+        except (IOError, OSError) as e:
+            self.logger.warning("Unable to save analysis cache entry: {0}".format(e))
+            return
+        self.evict()
+
+    def evict(self):
+        """
+        Removes least recently used entries until cache size is below its limit.
+        """
+        with self.lock:
+            try:
+                entries = []
+                for name in os.listdir(self.cache_dir):
+                    if name.endswith(CACHE_EXTENSION):
+                        path = os.path.join(self.cache_dir, name)
+                        st = os.stat(path)
+                        entries.append((st.st_mtime, st.st_size, path))
+            except OSError:
+                return
+            total = sum(size for _mtime, size, _path in entries)
+            for _mtime, size, path in sorted(entries):
+                if total <= self.max_size:
+                    break
+                self._remove(path)
+                total -= size
+
+    def clear(self):
+        """
+        Removes every entry.
+        """
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(CACHE_EXTENSION):
+                    self._remove(os.path.join(self.cache_dir, name))
+
+    def _entry_file(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_EXTENSION)
+
+    def _content_hash(self, stamp):
+        if stamp not in self.hashes:
+            checksum = 1
+            with open(stamp[0], "rb") as f:
+                for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+                    checksum = zlib.adler32(block, checksum)
+            self.hashes[stamp] = checksum & 0xFFFFFFFF
+        return self.hashes[stamp]
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,145 @@
+# coding=utf-8
+
+import numpy as np
+
+from analysis.Resampling import get_resampled_hr
+from config import FREQUENCY_BANDS, RESAMPLING_FREQUENCY, WELCH_SEGMENT_SECONDS, LOMB_FREQUENCY_STEP
+
+WELCH = "welch"
+LOMB = "lomb"
+
+# Max size of (samples x frequencies) matrices built by Lomb-Scargle periodogram
+LOMB_BLOCK_SIZE = 1 << 20
+
+
+def welch_psd(signal, fs, segment_length):
+    """
+    Estimates power spectral density with Welch's method: mean of periodograms of
+    overlapping (50%), Hann windowed and mean detrended segments. All segments are
+    transformed with a single FFT call. Signals shorter than a segment are
+    analysed as one segment.
+    @param signal: Numpy array of evenly spaced samples.
+    @param fs: Sampling frequency, in Hz.
+    @param segment_length: Samples per segment.
+    @return: A tuple (frequencies, one-sided psd).
+    """
+    n = min(segment_length, len(signal))
+    if n < 2:
+        return np.empty(0), np.empty(0)
+    step = max(n // 2, 1)
+    count = (len(signal) - n) // step + 1
+    signal = np.ascontiguousarray(signal, dtype=float)
+    segments = np.lib.stride_tricks.as_strided(signal, shape=(count, n),
+                                               strides=(step * signal.strides[0], signal.strides[0]))
+    segments = segments - segments.mean(axis=1)[:, np.newaxis]
+    window = np.hanning(n)
+    spectra = np.abs(np.fft.rfft(segments * window, axis=1)) ** 2
+    psd = spectra.mean(axis=0) / (fs * (window ** 2).sum())
+    # One-sided: every frequency but DC (and Nyquist, for even lengths) is counted twice
+    psd[1:len(psd) - (1 if n % 2 == 0 else 0)] *= 2
+    return np.fft.rfftfreq(n, 1.0 / fs), psd
+
+
+def lomb_psd(times, values, frequencies):
+    """
+    Estimates power spectral density of an unevenly sampled signal with
+    Lomb-Scargle periodogram, scaled as a one-sided psd.
+    @param times: Numpy array with sample times, in seconds.
+    @param values: Numpy array of samples.
+    @param frequencies: Numpy array of frequencies (Hz), all greater than 0.
+    @return: Numpy array with psd of every frequency.
+    """
+    psd = np.zeros(len(frequencies))
+    if len(times) < 2 or times[-1] <= times[0]:
+        return psd
+    y = values - values.mean()
+    # Frequencies are processed in blocks, to bound the size of intermediate matrices
+    block = max(LOMB_BLOCK_SIZE // len(times), 1)
+    for i in range(0, len(frequencies), block):
+        w = 2 * np.pi * frequencies[i:i + block, np.newaxis]
+        tau = np.arctan2(np.sin(2 * w * times).sum(axis=1), np.cos(2 * w * times).sum(axis=1)) / (2 * w[:, 0])
+        arg = w * (times - tau[:, np.newaxis])
+        cos, sin = np.cos(arg), np.sin(arg)
+        psd[i:i + block] = (cos.dot(y) ** 2 / (cos ** 2).sum(axis=1) + sin.dot(y) ** 2 / (sin ** 2).sum(axis=1)) / 2
+    # Periodogram of N samples has the scale of |X|^2 / N: converted to density with mean sampling rate
+    mean_fs = (len(times) - 1) / (times[-1] - times[0])
+    return 2 * psd / mean_fs
+
+
+def band_powers(frequencies, psd, bands=FREQUENCY_BANDS):
+    """
+    Integrates a psd in frequency bands.
+    @param frequencies: Numpy array of frequencies, in Hz.
+    @param psd: Numpy array with psd of every frequency.
+    @param bands: Sequence of (name, from Hz, to Hz) bands.
+    @return: A dictionary with power of every band, by band name, plus "total" power
+    of all bands and "lf_hf" ratio (if there are "lf" and "hf" bands).
+    """
+    powers = {}
+    for name, low, high in bands:
+        mask = (frequencies >= low) & (frequencies < high)
+        powers[name] = np.trapz(psd[mask], frequencies[mask]) if mask.sum() > 1 else np.nan
+    powers["total"] = sum(powers[name] for name, _low, _high in bands)
+    if "lf" in powers and "hf" in powers:
+        powers["lf_hf"] = powers["lf"] / powers["hf"] if powers["hf"] > 0 else np.nan
+    return powers
+
+
+def frequency_domain_metrics(session, beg, end, method=WELCH, bands=FREQUENCY_BANDS, fs=RESAMPLING_FREQUENCY):
+    """
+    Computes band powers of many time windows of a session.
+    Welch's method works on the resampled heart rate series of the session, which is
+    computed (or loaded from cache) once for every window and band setting.
+    Lomb-Scargle periodogram works directly on heart rate of every beat.
+    @param session: The analysis.Session.
+    @param beg: Array of window begins, in seconds.
+    @param end: Array of window ends, in seconds.
+    @param method: WELCH or LOMB.
+    @param bands: Sequence of (name, from Hz, to Hz) bands.
+    @param fs: Sampling frequency of resampled series (Welch's method), in Hz.
+    @return: A dictionary of numpy arrays (one value per window) with power of every band, "total"
+    and "lf_hf" (see band_powers).
+    """
+    if method == WELCH:
+        series = get_resampled_hr(session, fs)
+        starts, stops = series.window_indices(beg, end)
+        segment_length = int(WELCH_SEGMENT_SECONDS * fs)
+        spectra = [welch_psd(series.hr[s:e], fs, segment_length) for s, e in zip(starts, stops)]
+    elif method == LOMB:
+        max_frequency = max(high for _name, _low, high in bands)
+        frequencies = np.arange(LOMB_FREQUENCY_STEP, max_frequency + LOMB_FREQUENCY_STEP, LOMB_FREQUENCY_STEP)
+        hr = 60000.0 / session.rr
+        starts, stops = session.segment_indices(beg, end)
+        spectra = [(frequencies, lomb_psd(session.times[s:e], hr[s:e], frequencies)) for s, e in zip(starts, stops)]
+    else:
+        raise ValueError("Unknown spectral method: {0}".format(method))
+
+    names = [name for name, _low, _high in bands] + ["total"]
+    if "lf" in names and "hf" in names:
+        names.append("lf_hf")
+    metrics = dict((name, np.empty(len(spectra))) for name in names)
+    for i, (frequencies, psd) in enumerate(spectra):
+        powers = band_powers(frequencies, psd, bands)
+        for name in names:
+            metrics[name][i] = powers[name]
+    return metrics
+
+
+def frequency_domain_by_tag(session, method=WELCH, bands=FREQUENCY_BANDS, fs=RESAMPLING_FREQUENCY):
+    """
+    Computes band powers of every tag of a session.
+    @return: A dictionary with "tag", "beg" and "end" (tag names, begin and end times) and an array
+    for every band, "total" and "lf_hf", in tag order. See frequency_domain_metrics.
+    """
+    metrics = frequency_domain_metrics(session, session.tag_beg, session.tag_end, method, bands, fs)
+    metrics.update({"tag": session.tag_names, "beg": session.tag_beg, "end": session.tag_end})
+    return metrics
+
+
+def frequency_domain_summary(session, method=WELCH, bands=FREQUENCY_BANDS, fs=RESAMPLING_FREQUENCY):
+    """
+    Computes band powers of a whole session.
+    @return: A dictionary with power of every band, "total" and "lf_hf".
+    """
+    metrics = frequency_domain_metrics(session, [0.0], [np.inf], method, bands, fs)
+    return dict((name, values[0]) for name, values in metrics.items())
@@ -0,0 +1,55 @@
+# coding=utf-8
+
+import numpy as np
+
+from config import LIVE_PLOT_BEATS
+
+
+class BeatRingBuffer(object):
+    """
+    Fixed size buffer with the last beats received, shared by one producer (the
+    device thread, that only pushes beats) and any number of readers (GUI timers,
+    that pull them when they want to redraw). It doesn't use locks: producer writes
+    a slot before publishing it by increasing the beat counter, and readers discard
+    the slots that may have been overwritten while they were copied.
+    @param capacity: Number of beats kept.
+    """
+
+    def __init__(self, capacity=LIVE_PLOT_BEATS):
+        self.capacity = capacity
+        # Seconds since first beat and heart rate of every slot
+        self.times = np.zeros(capacity)
+        self.hr = np.zeros(capacity)
+        self.elapsed = 0.0
+        self.count = 0
+
+    def push(self, rr):
+        """
+        Adds a beat, overwriting the oldest one when buffer is full. Must be called
+        always from the same thread.
+        @param rr: The rr value, in ms.
+        """
+        if rr <= 0:
+            return
+        self.elapsed += rr / 1000.0
+        slot = self.count % self.capacity
+        self.times[slot] = self.elapsed
+        self.hr[slot] = 60000.0 / rr
+        self.count += 1
+
+    def latest(self):
+        """
+        Gets beats in buffer, from oldest to newest. Safe to call from any thread.
+        @return: A tuple (times, hr, count) with copies of beat times and heart rates,
+        and the number of beats pushed when they were read (so readers can skip
+        redrawing when it hasn't changed).
+        """
+        count = self.count
+        size = min(count, self.capacity)
+        slots = np.arange(count - size, count) % self.capacity
+        times = self.times.take(slots)
+        hr = self.hr.take(slots)
+        # Oldest slots may have been overwritten by beats pushed meanwhile (one more
+        # than pushed, since producer writes a slot before publishing it)
+        overwritten = min(max(self.count - count + 1 - (self.capacity - size), 0), size)
+        return times[overwritten:], hr[overwritten:], count
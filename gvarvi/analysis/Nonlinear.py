@@ -0,0 +1,232 @@
+# coding=utf-8
+
+import math
+
+import numpy as np
+
+from analysis.TimeDomain import _segment_sums
+from config import ENTROPY_DIMENSION, ENTROPY_TOLERANCE, DFA_SHORT_SCALES, DFA_LONG_SCALES
+
+NONLINEAR_METRICS = ("sd1", "sd2", "sd1_sd2", "sampen", "apen", "dfa_alpha1", "dfa_alpha2")
+
+# Matched template pairs buffered before counting them
+_MATCHES_BUFFER = 1 << 20
+
+
+def poincare_metrics(rr, starts, stops):
+    """
+    Computes Poincaré plot descriptors of many segments of a rr series at once, from
+    cumulative sums (SD1 is the deviation of successive differences and SD2 is
+    derived from SD1 and SDNN).
+    @param rr: Numpy array of rr values, in ms.
+    @param starts: Array with first beat index of every segment.
+    @param stops: Array with last beat index (excluded) of every segment.
+    @return: A dictionary with "sd1", "sd2" and "sd1_sd2" arrays (nan if segment has less than 3 beats).
+    """
+    rr = np.asarray(rr, dtype=float)
+    starts = np.asarray(starts, dtype=np.intp)
+    stops = np.maximum(np.asarray(stops, dtype=np.intp), starts)
+    beats = stops - starts
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        offset = rr.mean() if len(rr) else 0.0
+        centered = rr - offset
+        sums = _segment_sums(centered, starts, stops)
+        sdnn_2 = (_segment_sums(centered ** 2, starts, stops) - sums ** 2 / beats) / (beats - 1)
+
+        diffs = np.diff(rr)
+        diff_stops = np.minimum(np.maximum(stops - 1, starts), len(diffs))
+        diff_starts = np.minimum(starts, diff_stops)
+        diff_count = diff_stops - diff_starts
+        diff_sums = _segment_sums(diffs, diff_starts, diff_stops)
+        diff_var = (_segment_sums(diffs ** 2, diff_starts, diff_stops) - diff_sums ** 2 / diff_count) / \
+            (diff_count - 1)
+
+        sd1 = np.sqrt(np.maximum(diff_var, 0) / 2)
+        sd2 = np.sqrt(np.maximum(2 * sdnn_2 - sd1 ** 2, 0))
+        sd1_sd2 = sd1 / sd2
+
+    invalid = beats < 3
+    for values in (sd1, sd2, sd1_sd2):
+        values[invalid] = np.nan
+    return {"sd1": sd1, "sd2": sd2, "sd1_sd2": sd1_sd2}
+
+
+def _template_matches(rr, m, r):
+    """
+    Counts, for every template (m consecutive rr values), how many other templates
+    are within tolerance r (Chebyshev distance), and how many of them still match
+    when templates are extended to m + 1 values.
+    Templates are sorted by their first value, so the candidates of every template
+    are the following ones up to first value + r (found with binary search). Pairs
+    are checked by offset in the sorted order, every offset in a single vectorized
+    step, so cost is proportional to the number of candidate pairs instead of n².
+    @return: A tuple (matches_m, matches_m1) of arrays, in template order. Last
+    template has no extension, so it never matches in matches_m1.
+    """
+    count = len(rr) - m + 1
+    order = np.argsort(rr[:count], kind="mergesort")
+    columns = [rr[k:k + count][order] for k in range(m)]
+    # nan never matches
+    extension = np.append(rr[m:], np.nan)[order]
+
+    first = columns[0]
+    widths = first.searchsorted(first + r, "right") - np.arange(1, count + 1)
+    by_width = np.argsort(-widths, kind="mergesort")
+    descending_widths = -widths[by_width]
+
+    matches_m = np.zeros(count, dtype=np.intp)
+    matches_m1 = np.zeros(count, dtype=np.intp)
+    pending_m, pending_m1 = [], []
+    pending_size = 0
+    for offset in xrange(1, widths.max() + 1 if count else 1):
+        # Templates with at least offset candidates
+        i = by_width[:descending_widths.searchsorted(-offset, "right")]
+        j = i + offset
+        match = np.ones(len(i), dtype=bool)
+        for column in columns[1:]:
+            match &= np.abs(column[i] - column[j]) <= r
+        i, j = i[match], j[match]
+        with np.errstate(invalid="ignore"):
+            match1 = np.abs(extension[i] - extension[j]) <= r
+        pending_m += [i, j]
+        pending_m1 += [i[match1], j[match1]]
+        pending_size += 2 * len(i)
+        if pending_size > _MATCHES_BUFFER:
+            matches_m += np.bincount(np.concatenate(pending_m), minlength=count)
+            matches_m1 += np.bincount(np.concatenate(pending_m1), minlength=count)
+            pending_m, pending_m1 = [], []
+            pending_size = 0
+    if pending_m:
+        matches_m += np.bincount(np.concatenate(pending_m), minlength=count)
+        matches_m1 += np.bincount(np.concatenate(pending_m1), minlength=count)
+
+    result_m = np.empty_like(matches_m)
+    result_m1 = np.empty_like(matches_m1)
+    result_m[order] = matches_m
+    result_m1[order] = matches_m1
+    return result_m, result_m1
+
+
+def entropies(rr, m=ENTROPY_DIMENSION, tolerance=ENTROPY_TOLERANCE):
+    """
+    Computes sample entropy and approximate entropy of a rr series, from a single
+    template matching pass (see _template_matches).
+    @param rr: Numpy array of rr values, in ms.
+    @param m: Template length.
+    @param tolerance: Matching tolerance, in standard deviations of rr.
+    @return: A tuple (sampen, apen). Entropies that can't be computed (too few beats,
+    no matches) are nan.
+    """
+    rr = np.asarray(rr, dtype=float)
+    n = len(rr)
+    if n < m + 2:
+        return np.nan, np.nan
+    r = tolerance * rr.std(ddof=1)
+    matches_m, matches_m1 = _template_matches(rr, m, r)
+
+    # Sample entropy only uses the n - m templates that have an extension, without self matches
+    pairs_m = (matches_m.sum() - 2 * matches_m[-1]) / 2
+    pairs_m1 = matches_m1.sum() / 2
+    sampen = -math.log(float(pairs_m1) / pairs_m) if pairs_m1 and pairs_m else np.nan
+
+    # Approximate entropy counts self matches
+    phi_m = np.log((matches_m + 1) / float(n - m + 1)).mean()
+    phi_m1 = np.log((matches_m1[:-1] + 1) / float(n - m)).mean()
+    return sampen, phi_m - phi_m1
+
+
+def dfa_fluctuations(rr, scales):
+    """
+    Computes detrended fluctuation of a rr series for many window sizes. The profile
+    (cumulative sum of rr minus its mean) is split in non overlapping windows and
+    the linear trend of all windows of a size is removed at once, projecting them
+    onto an orthonormal basis of constant and linear functions.
+    @param rr: Numpy array of rr values, in ms.
+    @param scales: Window sizes, in beats.
+    @return: Numpy array with the fluctuation of every window size (nan if series is shorter).
+    """
+    rr = np.asarray(rr, dtype=float)
+    profile = np.cumsum(rr - rr.mean())
+    fluctuations = np.empty(len(scales))
+    for k, size in enumerate(scales):
+        windows = len(profile) // size
+        if size < 3 or windows == 0:
+            fluctuations[k] = np.nan
+            continue
+        y = profile[:windows * size].reshape(windows, size)
+        t = np.arange(size, dtype=float)
+        t -= t.mean()
+        t /= math.sqrt((t ** 2).sum())
+        residuals = y - y.mean(axis=1)[:, np.newaxis]
+        residuals -= np.outer(residuals.dot(t), t)
+        fluctuations[k] = math.sqrt((residuals ** 2).mean())
+    return fluctuations
+
+
+def dfa_alphas(rr, short_scales=DFA_SHORT_SCALES, long_scales=DFA_LONG_SCALES):
+    """
+    Computes short and long term DFA scaling exponents of a rr series: slopes of
+    log fluctuation against log window size.
+    @param rr: Numpy array of rr values, in ms.
+    @param short_scales: (from, to) window sizes of alpha1, in beats.
+    @param long_scales: (from, to) window sizes of alpha2, in beats.
+    @return: A tuple (alpha1, alpha2). Exponents are nan if series is shorter than
+    two windows of the largest size.
+    """
+    low = min(short_scales[0], long_scales[0])
+    high = max(short_scales[1], long_scales[1])
+    scales = np.arange(low, high + 1)
+    with np.errstate(divide="ignore"):
+        log_fluctuations = np.log10(dfa_fluctuations(rr, scales))
+    alphas = []
+    for beg, end in (short_scales, long_scales):
+        selected = (scales >= beg) & (scales <= end)
+        if len(rr) < 2 * end or not np.all(np.isfinite(log_fluctuations[selected])):
+            alphas.append(np.nan)
+        else:
+            alphas.append(np.polyfit(np.log10(scales[selected]), log_fluctuations[selected], 1)[0])
+    return tuple(alphas)
+
+
+def nonlinear_metrics(rr, starts, stops):
+    """
+    Computes nonlinear HRV metrics of many segments of a rr series.
+    @param rr: Numpy array of rr values, in ms.
+    @param starts: Array with first beat index of every segment.
+    @param stops: Array with last beat index (excluded) of every segment.
+    @return: A dictionary of numpy arrays (one value per segment) by metric name (NONLINEAR_METRICS).
+    Metrics that can't be computed for a segment are nan.
+    """
+    rr = np.asarray(rr, dtype=float)
+    metrics = poincare_metrics(rr, starts, stops)
+    for name in ("sampen", "apen", "dfa_alpha1", "dfa_alpha2"):
+        metrics[name] = np.empty(len(starts))
+    for k, (start, stop) in enumerate(zip(starts, stops)):
+        segment = rr[start:stop]
+        metrics["sampen"][k], metrics["apen"][k] = entropies(segment)
+        metrics["dfa_alpha1"][k], metrics["dfa_alpha2"][k] = dfa_alphas(segment)
+    return metrics
+
+
+def nonlinear_by_tag(session):
+    """
+    Computes nonlinear HRV metrics of every tag of a session.
+    @param session: The analysis.Session.
+    @return: A dictionary with "tag", "beg" and "end" (tag names, begin and end times) and an array
+    for every metric in NONLINEAR_METRICS, in tag order.
+    """
+    starts, stops = session.tag_segments()
+    metrics = nonlinear_metrics(session.rr, starts, stops)
+    metrics.update({"tag": session.tag_names, "beg": session.tag_beg, "end": session.tag_end})
+    return metrics
+
+
+def nonlinear_summary(session):
+    """
+    Computes nonlinear HRV metrics of a whole session.
+    @param session: The analysis.Session.
+    @return: A dictionary with the value of every metric in NONLINEAR_METRICS.
+    """
+    metrics = nonlinear_metrics(session.rr, [0], [len(session.rr)])
+    return dict((name, values[0]) for name, values in metrics.items())
@@ -0,0 +1,95 @@
+# coding=utf-8
+
+from collections import namedtuple, deque
+import math
+import threading
+
+from config import LIVE_HR_WINDOW_SECONDS
+
+HRVSnapshot = namedtuple("HRVSnapshot", ["beats", "elapsed", "last_rr", "mean_rr", "sdnn", "rmssd", "mean_hr",
+                                         "window_hr", "last_tag"])
+
+
+class OnlineHRV(object):
+    """
+    HRV statistics updated beat by beat, in constant time and without keeping the
+    whole rr series: running mean and SDNN (Welford's algorithm), RMSSD (running
+    sum of squared successive differences) and heart rate of the last seconds
+    (running sum over a sliding window).
+    Statistics are updated from acquisition thread and can be read from any thread
+    with snapshot().
+    @param window_seconds: Duration of the sliding window of window_hr.
+    """
+
+    def __init__(self, window_seconds=LIVE_HR_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self.lock = threading.Lock()
+
+        self.beats = 0
+        self.elapsed = 0.0
+        self.last_rr = None
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.squared_diffs = 0.0
+        self.hr_sum = 0.0
+        # (rr, heart rate) of beats in sliding window
+        self.window = deque()
+        self.window_rr = 0.0
+        self.window_hr_sum = 0.0
+        self.last_tag = None
+
+    def update(self, rr):
+        """
+        Adds a beat to statistics. Values that can't be a rr (0 or less) are ignored.
+        @param rr: The rr value, in ms.
+        """
+        rr = float(rr)
+        if rr <= 0:
+            return
+        hr = 60000.0 / rr
+        with self.lock:
+            self.beats += 1
+            self.elapsed += rr / 1000
+            delta = rr - self.mean
+            self.mean += delta / self.beats
+            self.m2 += delta * (rr - self.mean)
+            if self.last_rr is not None:
+                self.squared_diffs += (rr - self.last_rr) ** 2
+            self.last_rr = rr
+            self.hr_sum += hr
+
+            self.window.append((rr, hr))
+            self.window_rr += rr
+            self.window_hr_sum += hr
+            # Every beat leaves the window once, so this is constant time on average
+            while self.window_rr - self.window[0][0] >= self.window_seconds * 1000:
+                old_rr, old_hr = self.window.popleft()
+                self.window_rr -= old_rr
+                self.window_hr_sum -= old_hr
+
+    def set_tag(self, name):
+        """
+        Records last tag played.
+        @param name: Tag name.
+        """
+        with self.lock:
+            self.last_tag = name
+
+    def snapshot(self):
+        """
+        Gets current statistics. Safe to call from any thread.
+        @return: A HRVSnapshot. Statistics that can't be computed yet are None.
+        """
+        with self.lock:
+            beats, elapsed, last_rr, mean, m2 = self.beats, self.elapsed, self.last_rr, self.mean, self.m2
+            squared_diffs, hr_sum, last_tag = self.squared_diffs, self.hr_sum, self.last_tag
+            window_beats, window_hr_sum = len(self.window), self.window_hr_sum
+        return HRVSnapshot(beats=beats,
+                           elapsed=elapsed,
+                           last_rr=last_rr,
+                           mean_rr=mean if beats else None,
+                           sdnn=math.sqrt(m2 / (beats - 1)) if beats > 1 else None,
+                           rmssd=math.sqrt(squared_diffs / (beats - 1)) if beats > 1 else None,
+                           mean_hr=hr_sum / beats if beats else None,
+                           window_hr=window_hr_sum / window_beats if window_beats else None,
+                           last_tag=last_tag)
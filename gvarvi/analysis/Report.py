@@ -0,0 +1,59 @@
+# coding=utf-8
+
+import numpy as np
+
+from analysis.Cache import AnalysisCache
+from analysis.Session import Session
+from analysis.TimeDomain import TIME_DOMAIN_METRICS, time_domain_summary, time_domain_by_tag
+from analysis.FrequencyDomain import WELCH, frequency_domain_summary, frequency_domain_by_tag
+from analysis.Nonlinear import NONLINEAR_METRICS, nonlinear_summary, nonlinear_by_tag
+from config import FREQUENCY_BANDS, RESAMPLING_FREQUENCY, WELCH_SEGMENT_SECONDS, LOMB_FREQUENCY_STEP, \
+    ENTROPY_DIMENSION, ENTROPY_TOLERANCE, DFA_SHORT_SCALES, DFA_LONG_SCALES
+
+FREQUENCY_METRICS = tuple(name for name, _low, _high in FREQUENCY_BANDS) + ("total", "lf_hf")
+HRV_METRICS = TIME_DOMAIN_METRICS + FREQUENCY_METRICS + NONLINEAR_METRICS
+
+
+def hrv_statistics(session, method=WELCH):
+    """
+    Computes time domain, frequency domain and nonlinear HRV metrics of a whole session and of every tag.
+    @param session: The analysis.Session.
+    @param method: Spectral method (see analysis.FrequencyDomain).
+    @return: A tuple (summary, by_tag). Summary is a dictionary with a value for every metric in
+    HRV_METRICS. By_tag is a dictionary with "tag", "beg" and "end" and an array for every metric.
+    """
+    summary = time_domain_summary(session)
+    summary.update(frequency_domain_summary(session, method))
+    summary.update(nonlinear_summary(session))
+    by_tag = time_domain_by_tag(session)
+    by_tag.update(frequency_domain_by_tag(session, method))
+    by_tag.update(nonlinear_by_tag(session))
+    return summary, by_tag
+
+
+def cached_hrv_statistics(rr_file, tag_file, method=WELCH):
+    """
+    Gets HRV metrics of an acquisition (see hrv_statistics) from the analysis cache,
+    computing and caching them if result files or analysis settings have changed.
+    @param rr_file: Path to rr file.
+    @param tag_file: Path to tag file.
+    @param method: Spectral method.
+    @return: A tuple (summary, by_tag).
+    """
+    cache = AnalysisCache()
+    settings = (FREQUENCY_BANDS, RESAMPLING_FREQUENCY, WELCH_SEGMENT_SECONDS, LOMB_FREQUENCY_STEP,
+                ENTROPY_DIMENSION, ENTROPY_TOLERANCE, DFA_SHORT_SCALES, DFA_LONG_SCALES)
+    key = cache.key([rr_file, tag_file], ("hrv_statistics", method, settings))
+    entry = cache.get(key)
+    if entry is not None:
+        summary = dict((m, entry["summary_" + m][()]) for m in HRV_METRICS)
+        by_tag = dict((m, entry["by_tag_" + m]) for m in HRV_METRICS + ("beg", "end"))
+        by_tag["tag"] = entry["by_tag_tag"].tolist()
+        return summary, by_tag
+
+    summary, by_tag = hrv_statistics(Session.load(rr_file, tag_file), method)
+    entry = dict(("summary_" + m, np.asarray(summary[m])) for m in HRV_METRICS)
+    entry.update(("by_tag_" + m, np.asarray(by_tag[m])) for m in HRV_METRICS + ("beg", "end"))
+    entry["by_tag_tag"] = np.array(by_tag["tag"], dtype=bytes)
+    cache.put(key, entry)
+    return summary, by_tag
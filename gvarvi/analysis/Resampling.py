@@ -0,0 +1,72 @@
+# coding=utf-8
+
+import numpy as np
+
+from analysis.Cache import AnalysisCache
+from config import RESAMPLING_FREQUENCY
+
+
+class ResampledSeries(object):
+    """
+    Evenly sampled heart rate series.
+    @param start: Time (s) of first sample, from acquisition begin.
+    @param fs: Sampling frequency, in Hz.
+    @param hr: Numpy array with heart rate samples, in bpm.
+    """
+
+    def __init__(self, start, fs, hr):
+        self.start = start
+        self.fs = fs
+        self.hr = hr
+
+    def window_indices(self, beg, end):
+        """
+        Gets sample index ranges of time windows [beg, end).
+        @param beg: Array of window begins, in seconds.
+        @param end: Array of window ends, in seconds.
+        @return: A tuple (starts, stops) of index arrays.
+        """
+        starts = np.clip(np.ceil((np.asarray(beg) - self.start) * self.fs), 0, len(self.hr)).astype(np.intp)
+        stops = np.clip(np.ceil((np.asarray(end) - self.start) * self.fs), 0, len(self.hr)).astype(np.intp)
+        return starts, np.maximum(stops, starts)
+
+
+def resample_hr(times, rr, fs=RESAMPLING_FREQUENCY):
+    """
+    Converts a rr series into an evenly sampled heart rate series, by linear
+    interpolation of instantaneous heart rate between beats.
+    @param times: Numpy array with time (s) of every beat.
+    @param rr: Numpy array of rr values, in ms.
+    @param fs: Sampling frequency, in Hz.
+    @return: A ResampledSeries.
+    """
+    if len(times) < 2:
+        return ResampledSeries(times[0] if len(times) else 0.0, fs, np.empty(0))
+    sample_times = times[0] + np.arange(int((times[-1] - times[0]) * fs) + 1) / float(fs)
+    return ResampledSeries(times[0], fs, np.interp(sample_times, times, 60000.0 / rr))
+
+
+def get_resampled_hr(session, fs=RESAMPLING_FREQUENCY):
+    """
+    Gets the evenly sampled heart rate series of a session. The series is computed
+    once and cached in session and, for sessions loaded from a rr file, in the
+    analysis cache, so a session that hasn't changed is never parsed again to be
+    resampled.
+    @param session: The analysis.Session.
+    @param fs: Sampling frequency, in Hz.
+    @return: A ResampledSeries.
+    """
+    key = ("resampled", fs)
+    if key in session.cache:
+        return session.cache[key]
+
+    cache = AnalysisCache()
+    cache_key = cache.key([session.rr_file], key) if session.rr_file else None
+    entry = cache.get(cache_key)
+    if entry is not None:
+        series = ResampledSeries(float(entry["start"]), fs, entry["hr"])
+    else:
+        series = resample_hr(session.times, session.rr, fs)
+        cache.put(cache_key, {"start": series.start, "hr": series.hr})
+    session.cache[key] = series
+    return series
@@ -0,0 +1,100 @@
+# coding=utf-8
+
+import numpy as np
+
+from analysis.Cache import AnalysisCache
+from utils import parse_rr_array, parse_tag_file, parse_tag_arrays
+
+
+class Session(object):
+    """
+    Rr values and tags of an acquisition, loaded once into numpy arrays so every
+    analysis works on the same data without parsing result files again.
+    @param rr_values: Sequence (RRBuffer, list, numpy array) of rr values, in ms. If it's None,
+    values are read from rr_file the first time they are needed.
+    @param tags: List of tags, with parse_tag_file structure: [beg_seconds, tag_name, duration_seconds]
+    @param rr_file: Path to rr file of the session, if any.
+    """
+
+    def __init__(self, rr_values=None, tags=(), rr_file=None):
+        self.rr_file = rr_file
+        self._rr = None
+        self._times = None
+        if rr_values is not None:
+            self._set_rr(rr_values)
+        self.tag_names = [t[1] for t in tags]
+        self.tag_beg = np.array([t[0] for t in tags], dtype=float)
+        self.tag_end = self.tag_beg + np.array([t[2] for t in tags], dtype=float)
+        # Intermediate results shared by analyses (i.e. resampled series), by key
+        self.cache = {}
+
+    @classmethod
+    def from_files(cls, rr_file, tag_file):
+        """
+        Loads a session from result files (plain, rotated or compressed). Rr file
+        is not parsed until rr values are needed.
+        @param rr_file: Path to rr file.
+        @param tag_file: Path to tag file.
+        @return: The session.
+        """
+        return cls(tags=parse_tag_file(tag_file), rr_file=rr_file)
+
+    @classmethod
+    def load(cls, rr_file, tag_file):
+        """
+        Loads a session from result files, taking parsed arrays from the analysis cache
+        if files haven't changed since they were parsed (and saving them otherwise).
+        @param rr_file: Path to rr file.
+        @param tag_file: Path to tag file.
+        @return: The session.
+        """
+        cache = AnalysisCache()
+        key = cache.key([rr_file, tag_file], ("session",))
+        entry = cache.get(key)
+        if entry is None:
+            tags = parse_tag_arrays(tag_file)
+            entry = {"rr": parse_rr_array(rr_file), "tag_beg": tags.beg, "tag_duration": tags.duration,
+                     "tag_names": np.array(tags.names, dtype=bytes)}
+            cache.put(key, entry)
+        tags = zip(entry["tag_beg"].tolist(), entry["tag_names"].tolist(), entry["tag_duration"].tolist())
+        return cls(entry["rr"], tags, rr_file=rr_file)
+
+    def _set_rr(self, rr_values):
+        if hasattr(rr_values, "as_numpy"):
+            rr_values = rr_values.as_numpy()
+        self._rr = np.asarray(rr_values, dtype=float)
+        # Time (s) of every beat, from acquisition begin
+        self._times = np.cumsum(self._rr) / 1000
+
+    @property
+    def rr(self):
+        if self._rr is None:
+            self._set_rr(parse_rr_array(self.rr_file))
+        return self._rr
+
+    @property
+    def times(self):
+        if self._times is None:
+            self._set_rr(parse_rr_array(self.rr_file))
+        return self._times
+
+    @property
+    def duration(self):
+        return self.times[-1] if len(self.times) else 0.0
+
+    def segment_indices(self, beg, end):
+        """
+        Gets beat index ranges of time windows. A beat belongs to a window when it
+        happens in [beg, end).
+        @param beg: Array of window begins, in seconds.
+        @param end: Array of window ends, in seconds.
+        @return: A tuple (starts, stops) of index arrays: beats of window i are rr[starts[i]:stops[i]]
+        """
+        return np.searchsorted(self.times, beg, "left"), np.searchsorted(self.times, end, "left")
+
+    def tag_segments(self):
+        """
+        Gets beat index ranges of every tag.
+        @return: A tuple (starts, stops) of index arrays, in tag order.
+        """
+        return self.segment_indices(self.tag_beg, self.tag_end)
@@ -0,0 +1,99 @@
+# coding=utf-8
+
+import numpy as np
+
+# Threshold (ms) of successive rr differences counted by pNN50
+NN50_THRESHOLD = 50
+
+TIME_DOMAIN_METRICS = ("beats", "mean_rr", "sdnn", "rmssd", "pnn50", "mean_hr", "min_hr", "max_hr", "hr_range")
+
+
+def _segment_sums(values, starts, stops):
+    """
+    Sums values of many index ranges with a single cumulative sum.
+    """
+    cum = np.concatenate(([0.0], np.cumsum(values, dtype=float)))
+    return cum[stops] - cum[starts]
+
+
+def _segment_reduce(ufunc, values, starts, stops):
+    """
+    Reduces values of many (possibly overlapping) index ranges with a single
+    ufunc.reduceat call. Empty ranges get nan.
+    """
+    if len(starts) == 0:
+        return np.empty(0)
+    # reduceat reduces values[idx[i]:idx[i + 1]], so (start, stop) pairs are interleaved and only
+    # even results are taken. A trailing nan makes stop == len(values) a valid index.
+    extended = np.append(values, np.nan)
+    indices = np.empty(2 * len(starts), dtype=np.intp)
+    indices[0::2] = starts
+    indices[1::2] = stops
+    result = ufunc.reduceat(extended, indices)[0::2]
+    result[stops <= starts] = np.nan
+    return result
+
+
+def time_domain_metrics(rr, starts, stops):
+    """
+    Computes time domain HRV metrics of many segments of a rr series. Every metric
+    is computed for all segments at once, from cumulative sums of the whole series.
+    @param rr: Numpy array of rr values, in ms.
+    @param starts: Array with first beat index of every segment.
+    @param stops: Array with last beat index (excluded) of every segment.
+    @return: A dictionary of numpy arrays (one value per segment) by metric name (TIME_DOMAIN_METRICS).
+    Metrics that can't be computed for a segment (i.e. too few beats) are nan.
+    """
+    rr = np.asarray(rr, dtype=float)
+    starts = np.asarray(starts, dtype=np.intp)
+    stops = np.maximum(np.asarray(stops, dtype=np.intp), starts)
+    beats = stops - starts
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Centering values before squaring avoids precision loss on long sessions
+        offset = rr.mean() if len(rr) else 0.0
+        centered = rr - offset
+        sums = _segment_sums(centered, starts, stops)
+        squares = _segment_sums(centered ** 2, starts, stops)
+        mean_rr = sums / beats + offset
+        sdnn = np.sqrt((squares - sums ** 2 / beats) / (beats - 1))
+
+        # Successive differences of a segment are diffs[start:stop - 1]
+        diffs = np.diff(rr)
+        diff_stops = np.minimum(np.maximum(stops - 1, starts), len(diffs))
+        diff_starts = np.minimum(starts, diff_stops)
+        diff_count = diff_stops - diff_starts
+        rmssd = np.sqrt(_segment_sums(diffs ** 2, diff_starts, diff_stops) / diff_count)
+        pnn50 = 100.0 * _segment_sums(np.abs(diffs) > NN50_THRESHOLD, diff_starts, diff_stops) / diff_count
+
+        hr = 60000.0 / rr
+        mean_hr = _segment_sums(hr, starts, stops) / beats
+        min_hr = _segment_reduce(np.minimum, hr, starts, stops)
+        max_hr = _segment_reduce(np.maximum, hr, starts, stops)
+
+    sdnn[beats < 2] = np.nan
+    return {"beats": beats, "mean_rr": mean_rr, "sdnn": sdnn, "rmssd": rmssd, "pnn50": pnn50,
+            "mean_hr": mean_hr, "min_hr": min_hr, "max_hr": max_hr, "hr_range": max_hr - min_hr}
+
+
+def time_domain_by_tag(session):
+    """
+    Computes time domain HRV metrics of every tag of a session.
+    @param session: The analysis.Session.
+    @return: A dictionary with "tag", "beg" and "end" (tag names, begin and end times) and an array
+    for every metric in TIME_DOMAIN_METRICS, in tag order.
+    """
+    starts, stops = session.tag_segments()
+    metrics = time_domain_metrics(session.rr, starts, stops)
+    metrics.update({"tag": session.tag_names, "beg": session.tag_beg, "end": session.tag_end})
+    return metrics
+
+
+def time_domain_summary(session):
+    """
+    Computes time domain HRV metrics of a whole session.
+    @param session: The analysis.Session.
+    @return: A dictionary with the value of every metric in TIME_DOMAIN_METRICS.
+    """
+    metrics = time_domain_metrics(session.rr, [0], [len(session.rr)])
+    return dict((name, values[0]) for name, values in metrics.items())
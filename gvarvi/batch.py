@@ -0,0 +1,222 @@
+# coding=utf-8
+"""
+Headless batch analysis of acquisitions.
+
+Scans a directory tree for acquisitions (rr and tag files, either plain, rotated
+or compressed), computes time and frequency domain HRV metrics of every
+acquisition and every tag in a pool of processes, and merges all results in a
+single CSV table.
+
+Results of every acquisition are also saved next to it (<acquisition>.hrv.csv),
+so acquisitions whose results are newer than their rr and tag files (and were
+computed with the same options) are not analysed again.
+
+Usage:
+    python batch.py DIRECTORY [-o results.csv] [-j JOBS] [--method welch|lomb] [--correct-artifacts] [--force]
+"""
+
+import os
+
+# Every worker process uses a single core, so numerical libraries must not start their own threads
+for _variable in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(_variable, "1")
+
+import argparse
+import csv
+import multiprocessing
+import sys
+import time
+
+from config import CONF_DIR
+
+if not os.path.isdir(CONF_DIR):
+    os.mkdir(CONF_DIR)
+
+from analysis.Session import Session
+from analysis.FrequencyDomain import WELCH, LOMB
+from analysis.Report import HRV_METRICS, hrv_statistics
+from analysis.Artifacts import correct_artifacts, INTERPOLATE
+from utils import result_file_stamp, parse_tag_file, parse_rr_array, is_rotated_rr_file, is_compressed_file, \
+    read_rr_index, BlockCompressedFile, COMPRESSED_EXTENSION
+
+RR_SUFFIXES = (".rr.txt", ".rr.txt" + COMPRESSED_EXTENSION, ".rr.idx")
+SESSION_RESULTS_SUFFIX = ".hrv.csv"
+SESSION_RESULTS_HEADER = "# gvarvi batch {0}"
+WHOLE_ACQUISITION = "*"
+
+COLUMNS = ("acquisition", "tag", "beg", "end") + HRV_METRICS
+
+
+def find_acquisitions(directory):
+    """
+    Looks for acquisitions (rr file with its tag file) in a directory tree.
+    @param directory: Root directory.
+    @return: A sorted list of acquisition paths, without .rr.txt/.tag.txt extensions.
+    """
+    acquisitions = set()
+    for root, _dirs, files in os.walk(directory):
+        for f in files:
+            for suffix in RR_SUFFIXES:
+                if f.endswith(suffix):
+                    path = os.path.join(root, f[:-len(suffix)])
+                    if result_file_stamp(path + ".tag.txt"):
+                        acquisitions.add(path)
+    return sorted(acquisitions)
+
+
+def _options_key(options):
+    # Metrics are included, so results saved before metrics were added are computed again
+    return "method={0} artifacts={1} metrics={2}".format(options["method"],
+                                                         "yes" if options["correct_artifacts"] else "no",
+                                                         ",".join(HRV_METRICS))
+
+
+def is_up_to_date(path, options):
+    """
+    Checks if saved results of an acquisition are newer than its files and were
+    computed with the same options.
+    @param path: Acquisition path.
+    @param options: Analysis options.
+    @return: True if acquisition doesn't have to be analysed again.
+    """
+    results_file = path + SESSION_RESULTS_SUFFIX
+    if not os.path.isfile(results_file):
+        return False
+    results_mtime = os.path.getmtime(results_file)
+    for stamp in (result_file_stamp(path + ".rr.txt"), result_file_stamp(path + ".tag.txt")):
+        if stamp is None or stamp[2] > results_mtime:
+            return False
+    with open(results_file, "rt") as f:
+        return f.readline().rstrip("\r\n") == SESSION_RESULTS_HEADER.format(_options_key(options))
+
+
+def _format(value):
+    if isinstance(value, float):
+        return "" if value != value else "{0:.6g}".format(value)
+    return str(value)
+
+
+def analyze_acquisition(path, options):
+    """
+    Computes HRV metrics of an acquisition and of every tag, and saves them next to it.
+    @param path: Acquisition path.
+    @param options: Analysis options.
+    @return: A list of result rows (lists of strings, in COLUMNS order).
+    """
+    rr_file, tag_file = path + ".rr.txt", path + ".tag.txt"
+    if options["correct_artifacts"]:
+        rr_values = correct_artifacts(parse_rr_array(rr_file), action=INTERPOLATE).rr
+        session = Session(rr_values, parse_tag_file(tag_file))
+    else:
+        session = Session.from_files(rr_file, tag_file)
+
+    summary, by_tag = hrv_statistics(session, options["method"])
+    rows = [[path, WHOLE_ACQUISITION, _format(0.0), _format(float(session.duration))] +
+            [_format(float(summary[m])) for m in HRV_METRICS]]
+    for i, name in enumerate(by_tag["tag"]):
+        rows.append([path, name, _format(float(by_tag["beg"][i])), _format(float(by_tag["end"][i]))] +
+                    [_format(float(by_tag[m][i])) for m in HRV_METRICS])
+
+    # Written to a temporary file first, so an interrupted run never leaves results that look up to date
+    results_file = path + SESSION_RESULTS_SUFFIX
+    with open(results_file + ".tmp", "wb") as f:
+        f.write(SESSION_RESULTS_HEADER.format(_options_key(options)) + "\n")
+        csv.writer(f).writerows(rows)
+    os.rename(results_file + ".tmp", results_file)
+    return rows
+
+
+def read_session_results(path):
+    with open(path + SESSION_RESULTS_SUFFIX, "rb") as f:
+        f.readline()  # Skipping options header
+        return list(csv.reader(f))
+
+
+def _worker(args):
+    path, options = args
+    try:
+        return path, analyze_acquisition(path, options), None
+    except Exception as e:
+        return path, None, "{0}: {1}".format(type(e).__name__, e)
+
+
+def rr_data_size(rr_file):
+    """
+    Estimates the work of analysing an acquisition.
+    @param rr_file: Path to rr file (plain, rotated or compressed).
+    @return: Bytes of rr values (uncompressed), from chunk sizes of rotated files and block headers of
+    compressed files.
+    """
+    if is_rotated_rr_file(rr_file):
+        return sum(os.path.getsize(chunk.path) for chunk in read_rr_index(rr_file) if os.path.isfile(chunk.path))
+    if is_compressed_file(rr_file):
+        return sum(block.size for block in BlockCompressedFile(rr_file + COMPRESSED_EXTENSION).blocks)
+    return os.path.getsize(rr_file)
+
+
+def run_batch(directory, output_file, jobs=None, options=None, force=False):
+    """
+    Analyses every acquisition of a directory tree and merges results.
+    @param directory: Root directory.
+    @param output_file: Path to merged CSV table.
+    @param jobs: Number of worker processes (default: number of cores).
+    @param options: Analysis options (method, correct_artifacts).
+    @param force: If True, up to date acquisitions are analysed again.
+    @return: A tuple (analysed, skipped, failed) with acquisition counts.
+    """
+    options = options or {"method": WELCH, "correct_artifacts": False}
+    acquisitions = find_acquisitions(directory)
+    pending = [p for p in acquisitions if force or not is_up_to_date(p, options)]
+    # Biggest acquisitions first, so no worker is left alone with a long one at the end
+    pending.sort(key=lambda p: rr_data_size(p + ".rr.txt"), reverse=True)
+
+    results = {}
+    failed = []
+    if pending:
+        pool = multiprocessing.Pool(min(jobs or multiprocessing.cpu_count(), len(pending)))
+        try:
+            for i, (path, rows, error) in enumerate(
+                    pool.imap_unordered(_worker, [(p, options) for p in pending]), 1):
+                if error:
+                    failed.append(path)
+                    print >> sys.stderr, "[{0}/{1}] {2} failed: {3}".format(i, len(pending), path, error)
+                else:
+                    results[path] = rows
+                    print "[{0}/{1}] {2}".format(i, len(pending), path)
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    with open(output_file, "wb") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for path in acquisitions:
+            if path in failed:
+                continue
+            writer.writerows(results[path] if path in results else read_session_results(path))
+    return len(pending) - len(failed), len(acquisitions) - len(pending), len(failed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch HRV analysis of gVARVI acquisitions")
+    parser.add_argument("directory", help="Directory to scan for acquisitions")
+    parser.add_argument("-o", "--output", help="Merged results table (default: DIRECTORY/gvarvi_results.csv)")
+    parser.add_argument("-j", "--jobs", type=int, help="Worker processes (default: number of cores)")
+    parser.add_argument("--method", choices=(WELCH, LOMB), default=WELCH, help="Spectral method (default: welch)")
+    parser.add_argument("--correct-artifacts", action="store_true", help="Interpolate artifacts before analysis")
+    parser.add_argument("--force", action="store_true", help="Analyse up to date acquisitions again")
+    args = parser.parse_args()
+
+    output_file = args.output or os.path.join(args.directory, "gvarvi_results.csv")
+    start = time.time()
+    analysed, skipped, failed = run_batch(args.directory, output_file, args.jobs,
+                                          {"method": args.method, "correct_artifacts": args.correct_artifacts},
+                                          args.force)
+    print "{0} acquisitions analysed, {1} up to date, {2} failed in {3:.1f} s. Results saved to {4}".format(
+        analysed, skipped, failed, time.time() - start, output_file)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,299 @@
+# coding=utf-8
+"""
+Throughput and latency benchmark of acquisition results writers.
+
+Every writer is driven with a synthetic rr stream (with a tag every TAG_EVERY
+beats) in three scenarios:
+    realistic:  one session paced at a real heart rate (1-3 beats per second).
+    stress:     one session replayed as fast as possible.
+    concurrent: several stress sessions at the same time, one thread each.
+
+Each case runs in its own process, so peak RSS is not polluted by previous
+cases. Reported metrics are throughput (beats/s, close included), p50/p99
+latency of write_rr_value calls, close time, peak RSS and bytes on disk.
+
+Results can be saved as a baseline (--save). Baselines are appended to a
+history file, and every run is compared with the latest baseline of the
+same host, so regressions are visible over time.
+
+Usage, from gvarvi source directory:
+    python -m benchmarks.writer_benchmark [--scenarios stress,concurrent] [--writers TextWriter] [--save]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from facade.Writer import TextWriter, StreamingTextWriter, RotatingTextWriter, CompressedTextWriter, AsyncWriter, \
+    BinaryWriter, TeeWriter, NetworkWriter
+from facade.Journal import JournalWriter
+from devices.RRSimulator import RRSimulator
+from utils import monotonic
+
+BASELINES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+TAG_EVERY = 60
+REALISTIC_RATES = (1.0, 2.0, 3.0)
+STRESS_BEATS = 20000
+CONCURRENT_SESSIONS = 4
+CONCURRENT_BEATS = 10000
+
+# A run is a regression if it is worse than baseline by these ratios
+THROUGHPUT_TOLERANCE = 0.8
+LATENCY_TOLERANCE = 1.5
+
+
+def _text_files(d):
+    return os.path.join(d, "bench.tag.txt"), os.path.join(d, "bench.rr.txt")
+
+
+def _unused_udp_port():
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+# Writer name -> function that builds the writer inside a temporary directory
+WRITERS = {
+    "TextWriter": lambda d: TextWriter(*_text_files(d)),
+    "StreamingTextWriter": lambda d: StreamingTextWriter(*_text_files(d)),
+    "StreamingTextWriter-nofsync": lambda d: StreamingTextWriter(*_text_files(d), fsync=False),
+    "RotatingTextWriter": lambda d: RotatingTextWriter(*_text_files(d), chunk_beats=5000),
+    "CompressedTextWriter": lambda d: CompressedTextWriter(*_text_files(d)),
+    "BinaryWriter": lambda d: BinaryWriter(os.path.join(d, "bench.session.bin")),
+    "NetworkWriter": lambda d: NetworkWriter("127.0.0.1", _unused_udp_port()),
+    "AsyncWriter": lambda d: AsyncWriter(StreamingTextWriter(*_text_files(d))),
+    "JournalWriter": lambda d: JournalWriter(StreamingTextWriter(*_text_files(d)), *_text_files(d),
+                                             journal_dir=d),
+    "TeeWriter": lambda d: TeeWriter([JournalWriter(StreamingTextWriter(*_text_files(d)), *_text_files(d),
+                                                    journal_dir=d),
+                                      BinaryWriter(os.path.join(d, "bench.session.bin"))]),
+}
+
+SCENARIOS = ["realistic", "stress", "concurrent"]
+
+
+def synthetic_rr(beats, rate, seed=0):
+    """
+    Generates a synthetic rr series around a mean heart rate, with the simulator of
+    the demo band (oscillations, drift, ectopic beats and missed beats).
+    @param beats: Number of rr values.
+    @param rate: Mean heart rate, in beats per second.
+    @param seed: Random seed, so every writer gets the same stream.
+    @return: A numpy array of integer rr values, in ms.
+    """
+    return RRSimulator(mean_hr=rate * 60, seed=seed).generate_beats(beats)
+
+
+def run_session(writer, rr_values, paced, latencies):
+    """
+    Drives a writer with a rr stream and closes it.
+    @param writer: The writer.
+    @param rr_values: Numpy array of rr values, in ms.
+    @param paced: If True, every value is written when it would be received from a real device.
+    @param latencies: List where latency (s) of every write_rr_value call is appended.
+    @return: Time, in seconds, spent in close_writer.
+    """
+    writer.write_event("connected")
+    start = monotonic()
+    elapsed = 0.0
+    tag_beg = 0.0
+    for i, rr in enumerate(rr_values.tolist()):
+        elapsed += rr / 1000.0
+        if paced:
+            delay = start + elapsed - monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        t0 = monotonic()
+        writer.write_rr_value(rr)
+        latencies.append(monotonic() - t0)
+        if (i + 1) % TAG_EVERY == 0:
+            writer.write_tag_value("Tag {0}".format(i // TAG_EVERY), tag_beg, elapsed)
+            tag_beg = elapsed
+    writer.write_event("activity_ended")
+    t0 = monotonic()
+    writer.close_writer()
+    return monotonic() - t0
+
+
+def _disk_usage(d):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(d) for f in files)
+
+
+def run_case(writer_name, scenario, realistic_seconds):
+    """
+    Runs a benchmark case in current process.
+    @param writer_name: Key of WRITERS.
+    @param scenario: One of SCENARIOS.
+    @param realistic_seconds: Duration of every paced session of realistic scenario.
+    @return: A dictionary with case metrics.
+    """
+    tmp_dir = tempfile.mkdtemp(prefix="gvarvi-bench-")
+    try:
+        latencies = []
+        close_time = 0.0
+        if scenario == "realistic":
+            streams = [synthetic_rr(int(rate * realistic_seconds), rate) for rate in REALISTIC_RATES]
+            start = monotonic()
+            for i, rr_values in enumerate(streams):
+                session_dir = os.path.join(tmp_dir, str(i))
+                os.mkdir(session_dir)
+                close_time = max(close_time, run_session(WRITERS[writer_name](session_dir), rr_values, True,
+                                                         latencies))
+        elif scenario == "stress":
+            streams = [synthetic_rr(STRESS_BEATS, 2.0)]
+            start = monotonic()
+            close_time = run_session(WRITERS[writer_name](tmp_dir), streams[0], False, latencies)
+        else:
+            streams = [synthetic_rr(CONCURRENT_BEATS, 2.0, seed=i) for i in range(CONCURRENT_SESSIONS)]
+            session_latencies = [[] for _ in streams]
+            close_times = [0.0] * len(streams)
+
+            def session(i):
+                session_dir = os.path.join(tmp_dir, str(i))
+                os.mkdir(session_dir)
+                close_times[i] = run_session(WRITERS[writer_name](session_dir), streams[i], False,
+                                             session_latencies[i])
+
+            threads = [threading.Thread(target=session, args=(i,)) for i in range(len(streams))]
+            start = monotonic()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            latencies = [l for s in session_latencies for l in s]
+            close_time = max(close_times)
+        total_time = monotonic() - start
+        beats = sum(len(s) for s in streams)
+        latencies = np.array(latencies) * 1e6
+        return {"beats": beats,
+                "seconds": total_time,
+                "throughput": beats / total_time,
+                "p50_us": float(np.percentile(latencies, 50)),
+                "p99_us": float(np.percentile(latencies, 99)),
+                "max_us": float(latencies.max()),
+                "close_ms": close_time * 1000,
+                # Linux reports ru_maxrss in KB
+                "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                "disk_bytes": _disk_usage(tmp_dir)}
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _run_case_process(queue, writer_name, scenario, realistic_seconds):
+    try:
+        queue.put(run_case(writer_name, scenario, realistic_seconds))
+    except Exception as e:
+        queue.put({"error": "{0}: {1}".format(type(e).__name__, e)})
+
+
+def run_isolated_case(writer_name, scenario, realistic_seconds):
+    """
+    Runs a benchmark case in a child process.
+    """
+    queue = multiprocessing.Queue()
+    p = multiprocessing.Process(target=_run_case_process, args=(queue, writer_name, scenario, realistic_seconds))
+    p.start()
+    result = queue.get()
+    p.join()
+    return result
+
+
+def load_baselines(baselines_file=BASELINES_FILE):
+    if not os.path.isfile(baselines_file):
+        return []
+    with open(baselines_file, "rt") as f:
+        return json.load(f)
+
+
+def save_baseline(results, baselines_file=BASELINES_FILE):
+    """
+    Appends a run to baselines history file.
+    @param results: Dictionary of case results, by "scenario/writer" key.
+    @param baselines_file: Path to history file.
+    """
+    history = load_baselines(baselines_file)
+    history.append({"date": time.strftime("%Y-%m-%d %H:%M:%S"), "host": platform.node(),
+                    "python": platform.python_version(), "results": results})
+    with open(baselines_file, "wt") as f:
+        json.dump(history, f, indent=1, sort_keys=True)
+
+
+def latest_baseline(history):
+    host = platform.node()
+    for run in reversed(history):
+        if run["host"] == host:
+            return run
+    return None
+
+
+def compare(result, baseline):
+    """
+    Compares a case result with its baseline.
+    @return: A list of regression descriptions (empty if there aren't regressions).
+    """
+    regressions = []
+    if result["throughput"] < baseline["throughput"] * THROUGHPUT_TOLERANCE:
+        regressions.append("throughput {0:.0f} < {1:.0f}".format(result["throughput"], baseline["throughput"]))
+    if result["p99_us"] > baseline["p99_us"] * LATENCY_TOLERANCE:
+        regressions.append("p99 {0:.1f}us > {1:.1f}us".format(result["p99_us"], baseline["p99_us"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of acquisition results writers")
+    parser.add_argument("--writers", default=",".join(sorted(WRITERS)),
+                        help="Comma separated writers (default: all)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help="Comma separated scenarios (default: all)")
+    parser.add_argument("--realistic-seconds", type=float, default=10,
+                        help="Duration of every paced session in realistic scenario (default: 10)")
+    parser.add_argument("--save", action="store_true", help="Save results as new baseline")
+    parser.add_argument("--baselines", default=BASELINES_FILE, help="Baselines history file")
+    args = parser.parse_args()
+
+    baseline = latest_baseline(load_baselines(args.baselines))
+    if baseline:
+        print "Comparing with baseline of {0}".format(baseline["date"])
+
+    print "{0:<40} {1:>11} {2:>9} {3:>9} {4:>9} {5:>10} {6:>11}".format(
+        "case", "beats/s", "p50 us", "p99 us", "close ms", "rss KB", "disk bytes")
+    results = {}
+    regressed = False
+    for scenario in args.scenarios.split(","):
+        for writer_name in args.writers.split(","):
+            key = "{0}/{1}".format(scenario, writer_name)
+            result = run_isolated_case(writer_name, scenario, args.realistic_seconds)
+            if "error" in result:
+                print "{0:<40} FAILED {1}".format(key, result["error"])
+                continue
+            results[key] = result
+            line = "{0:<40} {throughput:>11.0f} {p50_us:>9.1f} {p99_us:>9.1f} {close_ms:>9.1f} " \
+                   "{peak_rss_kb:>10} {disk_bytes:>11}".format(key, **result)
+            if baseline and key in baseline["results"]:
+                regressions = compare(result, baseline["results"][key])
+                if regressions:
+                    regressed = True
+                    line += "  REGRESSION: " + ", ".join(regressions)
+            print line
+
+    if args.save:
+        save_baseline(results, args.baselines)
+        print "Baseline saved to {0}".format(args.baselines)
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    exit(main())
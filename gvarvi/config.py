@@ -1,9 +1,13 @@
 # coding=utf-8
 
 import os
-import wx
-import wx.lib.agw.ultimatelistctrl as ULC
-from pygame.locals import *
+
+try:
+    import wx
+    import wx.lib.agw.ultimatelistctrl as ULC
+    from pygame.locals import *
+except ImportError:
+    wx = None  # Headless tools (see batch.py): only paths and analysis settings are defined
 
 VERSION = "0.5.1"
 
@@ -18,9 +22,58 @@ LOG_FILE = os.path.join(CONF_DIR, "gVarvi.log")
 CONF_FILE = os.path.join(CONF_DIR, "conf.xml")
 ACTIV_FILE = os.path.join(CONF_DIR, "activ.xml")
 RECENT_ACQUISITIONS_FILE = os.path.join(CONF_DIR, "recent.txt")
+JOURNAL_DIR = os.path.join(CONF_DIR, "journal")
+CATALOG_FILE = os.path.join(CONF_DIR, "catalog.db")
 
 RECENT_ACQUISITIONS_COUNT = 8
 
+# Results writer
+RR_FLUSH_BEATS = 16  # rr values buffered before writing them to disk
+RR_FLUSH_SECONDS = 5  # max time (in seconds) that a rr value stays buffered
+RR_FSYNC = True  # force written data to disk after every flush
+JOURNAL_FLUSH_SECONDS = 0.5  # max time (in seconds) that a record waits before being written to the journal
+WRITER_QUEUE_SIZE = 4096  # max records waiting to be written by an asynchronous writer
+BINARY_CHUNK_RECORDS = 256  # rr values per chunk in binary session files
+ROTATION_BEATS = 10000  # max rr values per chunk in rotated rr files
+ROTATION_SECONDS = 3600  # max duration (in seconds) of every chunk in rotated rr files
+COMPRESSION_CODEC = "zlib"  # "zlib" or "lzma" (Python 3 or backports.lzma)
+COMPRESSION_BLOCK_SIZE = 65536  # uncompressed bytes per block in compressed result files
+
+# HRV analysis
+ANALYSIS_CACHE_DIR = os.path.join(CONF_DIR, "cache")
+ANALYSIS_CACHE_SIZE = 256 * 1024 * 1024  # bytes of analysis results kept on disk
+PLAIN_FILES_DIR = os.path.join(ANALYSIS_CACHE_DIR, "plain")  # plain copies of rotated and compressed result files
+RESAMPLING_FREQUENCY = 4.0  # Hz of the evenly sampled heart rate series used by spectral analysis
+FREQUENCY_BANDS = (("vlf", 0.003, 0.04), ("lf", 0.04, 0.15), ("hf", 0.15, 0.4))  # (name, from Hz, to Hz)
+WELCH_SEGMENT_SECONDS = 128  # length of every Welch segment (segments overlap 50%)
+LOMB_FREQUENCY_STEP = 0.001  # Hz between Lomb-Scargle periodogram frequencies
+ENTROPY_DIMENSION = 2  # template length (m) of sample and approximate entropy
+ENTROPY_TOLERANCE = 0.2  # matching tolerance (r) of entropies, in standard deviations of rr
+DFA_SHORT_SCALES = (4, 16)  # window sizes (beats) of DFA alpha1
+DFA_LONG_SCALES = (16, 64)  # window sizes (beats) of DFA alpha2
+LIVE_HR_WINDOW_SECONDS = 10  # sliding window of heart rate shown during acquisition
+LIVE_PLOT_BEATS = 512  # beats kept in memory for the live heart rate plot
+LIVE_PLOT_SECONDS = 60  # seconds shown by the live heart rate plot
+LIVE_PLOT_FPS = 10  # maximum redraws per second of the live heart rate plot
+SIMULATOR_MEAN_HR = 70  # bpm of simulated heart rate (demo band)
+SIMULATOR_LF = (0.1, 30)  # (Hz, ms) frequency and rr amplitude of simulated LF (Mayer waves) oscillation
+SIMULATOR_HF = (0.25, 25)  # (Hz, ms) breathing rate and rr amplitude of simulated respiratory sinus arrhythmia
+SIMULATOR_VLF_AMPLITUDE = 40  # ms, max rr change of simulated slow heart rate drift
+SIMULATOR_NOISE = 8  # ms, standard deviation of simulated beat to beat noise
+SIMULATOR_ECTOPIC_RATE = 0.002  # fraction of simulated beats that are ectopic (premature)
+SIMULATOR_DROPOUT_RATE = 2.0  # simulated bursts of missed beats per hour
+SIMULATOR_DROPOUT_BEATS = 4  # mean missed beats of every simulated burst
+SIMULATOR_BLOCK_SECONDS = 60  # seconds of simulated rr values generated at once
+
+# Artifact detection (see analysis.Artifacts). None disables a rule
+ARTIFACT_MIN_RR = 300  # ms
+ARTIFACT_MAX_RR = 2000  # ms
+ARTIFACT_WINDOW = 11  # beats of local median window, centered on every beat
+ARTIFACT_MAX_CHANGE = 0.2  # max change ratio from local median
+ARTIFACT_ADAPTIVE_FACTOR = 4.0  # max deviation from local median, in local standard deviations
+ARTIFACT_ADAPTIVE_MIN = 50  # ms, lower limit of adaptive threshold
+ARTIFACT_ACTION = "interpolate"  # "flag", "interpolate" or "drop"
+
 # Icons
 MAIN_ICON = os.path.join(RESOURCES_FOLDER, "heart.png")
 IMAGE_ICON = os.path.join(RESOURCES_FOLDER, "image.png")
@@ -30,9 +83,10 @@ KEY_ICON = os.path.join(RESOURCES_FOLDER, "key.png")
 MANUAL_ICON = os.path.join(RESOURCES_FOLDER, "manual.png")
 
 # All players
-ABORT_KEY = K_ESCAPE
-FINISH_KEY = K_RETURN
-NEXT_TAG_KEY = K_SPACE
+if wx is not None:
+    ABORT_KEY = K_ESCAPE
+    FINISH_KEY = K_RETURN
+    NEXT_TAG_KEY = K_SPACE
 EXIT_SUCCESS_CODE = 0
 EXIT_ABORT_CODE = 1
 EXIT_FAIL_CODE = 2
@@ -56,36 +110,44 @@ FRAMERATE = 30  # how often to check if playback has finished
 SUPPORTED_IMG_EXTENSIONS = (".JPG", ".JPEG", ".PNG", ".GIF", ".BMP", ".PCX", ".XPM", ".TIF",
                             ".jpg", ".jpeg", ".png", ".gif", ".bmp", ".pcx", ".xpm", ".tif")
 
-# Bluetooth Test Result Event ID
-EVT_RESULT_ID = wx.NewId()
+if wx is not None:
+    # Bluetooth Test Result Event ID
+    EVT_RESULT_ID = wx.NewId()
 
-# Bluetooth acquisition step ID
-EVT_ACQUISITION_STEP_ID = wx.NewId()
+    # Bluetooth acquisition step ID
+    EVT_ACQUISITION_STEP_ID = wx.NewId()
 
 # GUI
 BACKGROUND_COLOUR = "#FFFFFF"
 ACTIVITIES_LIST_ID = 1
 DEVICES_LIST_ID = 2
-GRID_STYLE = ULC.ULC_REPORT | ULC.ULC_SINGLE_SEL | ULC.ULC_USER_ROW_HEIGHT | ULC.ULC_HRULES | ULC.ULC_EDIT_LABELS ^ ULC.ULC_EDIT_LABELS
+if wx is not None:
+    GRID_STYLE = ULC.ULC_REPORT | ULC.ULC_SINGLE_SEL | ULC.ULC_USER_ROW_HEIGHT | ULC.ULC_HRULES | ULC.ULC_EDIT_LABELS ^ ULC.ULC_EDIT_LABELS
 
 # Adquisiton modes
 DEVICE_CONNECTED_MODE = 0
 DEMO_MODE = 1
+REPLAY_MODE = 2  # device data is replayed from a capture file (dev_dir) by devices.ReplayDevice
+# Replay mode speeds: data is replayed speed times faster (None: as fast as possible)
+REPLAY_SPEEDS = [("Real time", 1.0), ("10x", 10.0), ("100x", 100.0), ("As fast as possible", None)]
 
 # Pygame to wxPython event mapping
-pygame_wx_evt_map = {
-    K_0: "0", K_1: "1", K_2: "2", K_3: "3", K_4: "4",
-    K_5: "5", K_6: "6", K_7: "7", K_8: "8", K_9: "9",
-    K_a: "A", K_b: "B", K_c: "C", K_d: "D", K_e: "E",
-    K_f: "F", K_g: "G", K_h: "H", K_i: "I", K_j: "J",
-    K_k: "K", K_l: "L", K_m: "M", K_n: "N", K_o: "O",
-    K_p: "P", K_q: "Q", K_r: "R", K_s: "S", K_t: "T",
-    K_u: "U", K_v: "V", K_w: "W", K_x: "X", K_y: "Y",
-    K_z: "Z"
-}
+if wx is not None:
+    pygame_wx_evt_map = {
+        K_0: "0", K_1: "1", K_2: "2", K_3: "3", K_4: "4",
+        K_5: "5", K_6: "6", K_7: "7", K_8: "8", K_9: "9",
+        K_a: "A", K_b: "B", K_c: "C", K_d: "D", K_e: "E",
+        K_f: "F", K_g: "G", K_h: "H", K_i: "I", K_j: "J",
+        K_k: "K", K_l: "L", K_m: "M", K_n: "N", K_o: "O",
+        K_p: "P", K_q: "Q", K_r: "R", K_s: "S", K_t: "T",
+        K_u: "U", K_v: "V", K_w: "W", K_x: "X", K_y: "Y",
+        K_z: "Z"
+    }
 
 # Bluetooth config
 bt_lookup_time = 4
+bt_receive_buffer_size = 4096  # bytes received but not parsed yet kept in memory
+bt_receive_timeout = 1.0  # seconds waiting for data before checking if acquisition has finished
 
 # Ant config
 ant_lookup_timeout = 5
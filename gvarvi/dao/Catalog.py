@@ -0,0 +1,129 @@
+# coding=utf-8
+
+from collections import namedtuple
+from datetime import datetime
+import sqlite3
+import time
+
+from config import CATALOG_FILE
+
+CatalogEntry = namedtuple("CatalogEntry", ["id", "path", "date", "activity_id", "activity_name", "activity_type",
+                                           "device_type", "device_name", "device_mac", "duration", "beats", "mean_rr",
+                                           "sdnn", "rmssd", "mean_hr"])
+
+
+class Catalog(object):
+    """
+    Class that stores metadata and summary statistics of every acquisition in a
+    SQLite database, indexed by date, activity and device.
+    @param catalog_file: Absolute path to database file.
+    """
+
+    def __init__(self, catalog_file=CATALOG_FILE):
+        self.catalog_file = catalog_file
+        self.connection = sqlite3.connect(catalog_file, check_same_thread=False)
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS acquisitions (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    date REAL NOT NULL,
+                    activity_id TEXT,
+                    activity_name TEXT,
+                    activity_type TEXT,
+                    device_type TEXT,
+                    device_name TEXT,
+                    device_mac TEXT,
+                    duration REAL,
+                    beats INTEGER,
+                    mean_rr REAL,
+                    sdnn REAL,
+                    rmssd REAL,
+                    mean_hr REAL)""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS acquisitions_date ON acquisitions (date)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS acquisitions_activity "
+                                    "ON acquisitions (activity_id, date)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS acquisitions_activity_type "
+                                    "ON acquisitions (activity_type, date)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS acquisitions_device "
+                                    "ON acquisitions (device_type, device_mac, date)")
+
+    def add_acquisition(self, path, activity, device_type, device_name, device_mac, summary, date=None):
+        """
+        Saves an acquisition in catalog.
+        @param path: Acquisition path (without .rr.txt/.tag.txt extensions).
+        @param activity: The played activity.
+        @param device_type: Device type ("BT", "ANT+" or "Demo").
+        @param device_name: Device name.
+        @param device_mac: Physical address of device.
+        @param summary: Dictionary of summary statistics (see utils.summarize_rr).
+        @param date: Acquisition date, as datetime or epoch seconds. Now by default.
+        @return: Id of new catalog entry.
+        """
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO acquisitions (path, date, activity_id, activity_name, activity_type, device_type, "
+                "device_name, device_mac, duration, beats, mean_rr, sdnn, rmssd, mean_hr) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, self._to_epoch(date if date is not None else time.time()), str(activity.id), activity.name,
+                 activity.__class__.name, device_type, device_name, device_mac, summary["duration"],
+                 summary["beats"], summary["mean_rr"], summary["sdnn"], summary["rmssd"], summary["mean_hr"]))
+            return cursor.lastrowid
+
+    def find_acquisitions(self, activity_id=None, activity_type=None, device_type=None, device_mac=None,
+                          since=None, until=None, limit=None):
+        """
+        Looks for acquisitions that match every given filter, newest first.
+        @param activity_id: Id of the played activity.
+        @param activity_type: Type of the played activity.
+        @param device_type: Device type.
+        @param device_mac: Physical address of device.
+        @param since: Minimum date, as datetime or epoch seconds.
+        @param until: Maximum date (excluded), as datetime or epoch seconds.
+        @param limit: Max number of results.
+        @return: A list of CatalogEntry namedtuples. Dates are returned as datetime.
+        """
+        conditions = []
+        params = []
+        for column, value in (("activity_id", activity_id), ("activity_type", activity_type),
+                              ("device_type", device_type), ("device_mac", device_mac)):
+            if value is not None:
+                conditions.append("{0} = ?".format(column))
+                params.append(str(value) if column == "activity_id" else value)
+        if since is not None:
+            conditions.append("date >= ?")
+            params.append(self._to_epoch(since))
+        if until is not None:
+            conditions.append("date < ?")
+            params.append(self._to_epoch(until))
+
+        query = "SELECT {0} FROM acquisitions".format(", ".join(CatalogEntry._fields))
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY date DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        entries = []
+        for row in self.connection.execute(query, params):
+            entry = CatalogEntry(*row)
+            entries.append(entry._replace(date=datetime.fromtimestamp(entry.date)))
+        return entries
+
+    def remove_acquisition(self, entry_id):
+        """
+        Removes an acquisition from catalog (result files are not removed).
+        @param entry_id: Id of catalog entry.
+        """
+        with self.connection:
+            self.connection.execute("DELETE FROM acquisitions WHERE id = ?", (entry_id,))
+
+    def close(self):
+        self.connection.close()
+
+    @staticmethod
+    def _to_epoch(date):
+        if isinstance(date, datetime):
+            return time.mktime(date.timetuple()) + date.microsecond / 1e6
+        return float(date)
@@ -13,6 +13,7 @@ from third_party.ant.core import driver, event
 from third_party.ant.core.message import ChannelBroadcastDataMessage, MessageError
 from third_party.ant.core.constants import CHANNEL_TYPE_TWOWAY_RECEIVE, TIMEOUT_NEVER
 from devices.IDevice import IDevice
+from devices.Capture import CaptureWriter, ANT_CAPTURE
 from utils import run_in_thread
 from utils import ResultEvent
 from utils import HostDownError
@@ -41,6 +42,7 @@ class ANTDevice(IDevice):
         self.channel = None
         self.callback = None
         self.connected = False
+        self.capture = None
 
     def connect(self, *args):
         """
@@ -53,17 +55,28 @@ class ANTDevice(IDevice):
         """
         Disconnects ANT+ device.
         """
-        pass
+        if self.capture is not None:
+            self.capture.close()
+            self.capture = None
+
+    def start_capture(self, capture_file):
+        """
+        Records every read from the ANT stick (used as driver log) until device is
+        disconnected. Must be called before connecting.
+        @param capture_file: Path to capture file.
+        """
+        self.capture = CaptureWriter(capture_file, ANT_CAPTURE)
 
     @run_in_thread
-    def run_test(self, notify_window):
+    def run_test(self, notify_window, live_buffer=None):
         """
         Run test for ANT+ device.
         @param notify_window: Window that device will send test data.
+        @param live_buffer: analysis.LiveBuffer.BeatRingBuffer where rr values are pushed, if any.
         """
         if not self.antnode.evm.running:
             self.antnode.evm.start()
-        self.callback = TestCallback(notify_window)
+        self.callback = TestCallback(notify_window, live_buffer)
         self.channel.registerCallback(self.callback)
 
     def finish_test(self):
@@ -106,6 +119,8 @@ class ANTDevice(IDevice):
             self.logger.debug("Trying to open a channel")
             # Initialize driver
             stick = driver.usb2Driver(ant_SERIAL)
+            if self.capture is not None:
+                stick.log = self.capture
             self.antnode = Node(stick)
             self.antnode.start()
             # Setup channel
@@ -296,11 +311,13 @@ class TestCallback(event.EventCallback):
     """
     Custom message to process an ANT+ message for testing a device.
     @param notify_window: Window where testing messages will be sent to.
+    @param live_buffer: analysis.LiveBuffer.BeatRingBuffer where rr values are pushed, if any.
     """
 
-    def __init__(self, notify_window):
+    def __init__(self, notify_window, live_buffer=None):
         self.logger = Logger()
         self.notify_window = notify_window
+        self.live_buffer = live_buffer
 
     def process(self, msg):
         """
@@ -321,6 +338,8 @@ class TestCallback(event.EventCallback):
                 self.logger.debug("Heart beat count: {0}".format(unpacked_message.heartbeat_count))
                 self.logger.debug("Computed Heart Rate: {0}".format(unpacked_message.computed_heart_rate))
                 test_dict['hr'] = unpacked_message.computed_heart_rate
+                if self.live_buffer is not None:
+                    self.live_buffer.push(rr)
                 PostEvent(self.notify_window, ResultEvent(test_dict))
 
 
@@ -10,6 +10,7 @@ import bluetooth
 from utils import HostDownError
 from config import bt_lookup_time
 from devices.IDevice import IDevice
+from devices.ReceiveBuffer import ReceiveBuffer
 from logger import Logger
 
 
@@ -27,6 +28,7 @@ class BTDevice(IDevice):
         self.socket = None
         self.connected = False
         self.logger = Logger()
+        self.receive_buffer = ReceiveBuffer()
 
     @classmethod
     def find(cls):
@@ -53,6 +55,7 @@ class BTDevice(IDevice):
         # TODO: e ao chegar ao metodo connect (xusto abaixo) casca
         #################################################################
         self.socket = bluetooth.BluetoothSocket()
+        self.receive_buffer.clear()
         print "Socket id: {0}".format(id(self.socket))
         try:
             self.socket.connect((self.mac, 1))
@@ -70,6 +73,9 @@ class BTDevice(IDevice):
         """
         self.socket.close()
         self.connected = False
+        if self.receive_buffer.capture is not None:
+            self.receive_buffer.capture.close()
+            self.receive_buffer.capture = None
 
     def receive(self, n):
         """
@@ -82,12 +88,21 @@ class BTDevice(IDevice):
         else:
             return self.socket.recv(n, socketlib.MSG_WAITALL).encode('hex')
 
+    def fill_receive_buffer(self, timeout=None):
+        """
+        Receives everything available in the socket into receive buffer, with a single read.
+        @param timeout: Max seconds waiting for data, or None to wait forever.
+        @return: Number of bytes received, 0 if timeout expired.
+        @raise ValueError: If connection is closed.
+        """
+        return self.receive_buffer.fill(self.socket, timeout)
+
     # -----------------------------------------------
     # The following methods have to be implemented on
     # each specific subclass
 
     @abstractmethod
-    def run_test(self, notify_window):
+    def run_test(self, notify_window, live_buffer=None):
         pass
 
     @abstractmethod
@@ -0,0 +1,116 @@
+# coding=utf-8
+
+import struct
+import threading
+
+from utils import monotonic
+
+# Capture file: header (magic, version, source) and a record for every read from the
+# device: seconds since capture started, data length and raw data
+CAPTURE_MAGIC = "GVCAP"
+CAPTURE_VERSION = 1
+CAPTURE_FILE_HEADER = struct.Struct("<5sBB")
+CAPTURE_RECORD = struct.Struct("<dI")
+CAPTURE_EXTENSION = ".capture"
+
+# Sources (decoding path needed to replay a capture)
+POLAR_CAPTURE = 1
+ANT_CAPTURE = 2
+
+
+class CaptureWriter(object):
+    """
+    Records raw data received from a device, with its reception time, so acquisition
+    can be replayed later (see devices.ReplayDevice). Recording a read only costs a
+    struct pack and a buffered file write.
+    It can also be used as log of an ANT driver (third_party.ant.core.driver), since
+    it has the methods of third_party.ant.core.log.LogWriter.
+    @param capture_file: Path to capture file.
+    @param source: POLAR_CAPTURE or ANT_CAPTURE.
+    """
+
+    def __init__(self, capture_file, source):
+        self.lock = threading.Lock()
+        self.file = open(capture_file, "wb")
+        self.file.write(CAPTURE_FILE_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION, source))
+        self.start = monotonic()
+
+    def record(self, data):
+        """
+        Records a read.
+        @param data: Data read (string, bytearray or memoryview). Empty reads are not recorded.
+        """
+        if not len(data):
+            return
+        with self.lock:
+            if self.file is not None:
+                self.file.write(CAPTURE_RECORD.pack(monotonic() - self.start, len(data)))
+                self.file.write(data)
+
+    def close(self):
+        """
+        Finishes capture.
+        """
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    # ANT driver log methods. Only reads are recorded, and capture is closed by the device.
+
+    def logOpen(self):
+        pass
+
+    def logClose(self):
+        pass
+
+    def logRead(self, data):
+        self.record(data)
+
+    def logWrite(self, data):
+        pass
+
+
+def _read_ant_log(log_file):
+    from third_party.ant.core.log import LogReader, EVENT_READ
+
+    reader = LogReader(log_file)
+    records = []
+    start = None
+    event = reader.read()
+    while event is not None:
+        if event[0] == EVENT_READ:
+            if start is None:
+                start = event[1]
+            records.append((float(event[1] - start), event[2]))
+        event = reader.read()
+    return records
+
+
+def read_capture(capture_file):
+    """
+    Reads a capture file. ANT log files (written by third_party.ant.core.log.LogWriter)
+    are also supported, although their times have a resolution of one second.
+    A truncated last record (i.e. capture was interrupted) is ignored.
+    @param capture_file: Path to capture file.
+    @return: A tuple (source, records). Records are (seconds since capture started, data) tuples.
+    @raise IOError: If file is not a capture file.
+    """
+    with open(capture_file, "rb") as f:
+        content = f.read()
+    if not content.startswith(CAPTURE_MAGIC):
+        return ANT_CAPTURE, _read_ant_log(capture_file)
+
+    magic, version, source = CAPTURE_FILE_HEADER.unpack_from(content)
+    if version != CAPTURE_VERSION or source not in (POLAR_CAPTURE, ANT_CAPTURE):
+        raise IOError("Unsupported capture file: {0}".format(capture_file))
+    records = []
+    offset = CAPTURE_FILE_HEADER.size
+    while offset + CAPTURE_RECORD.size <= len(content):
+        seconds, length = CAPTURE_RECORD.unpack_from(content, offset)
+        offset += CAPTURE_RECORD.size
+        if offset + length > len(content):
+            break
+        records.append((seconds, content[offset:offset + length]))
+        offset += length
+    return source, records
@@ -1,63 +1,119 @@
 # coding=utf-8
 
-from random import randint
 from time import sleep
 
+from wx import PostEvent
+
 from devices.IDevice import IDevice
+from devices.RRSimulator import RRSimulator
+from devices.ReplayDevice import ReplayClock, REAL_TIME
 from utils import run_in_thread
+from utils import ResultEvent
+from logger import Logger
+
+# Max seconds sleeping before checking if acquisition has finished
+_MAX_WAIT = 0.1
 
 
 class DemoBand(IDevice):
     """
-    Class that simulates a real band, for debugging purposes.
+    Class that simulates a real band, for demos and for testing without hardware.
+    RR values are generated by a devices.RRSimulator.RRSimulator and sent paced as a
+    real band would send them, or with a virtual clock (AS_FAST_AS_POSSIBLE), where
+    hours of simulated data are sent in a moment.
+    @param speed: REAL_TIME, a factor (data is sent speed times faster) or AS_FAST_AS_POSSIBLE
+    (see devices.ReplayDevice).
+    @param duration: Seconds of simulated data. After them, band doesn't send anything
+    else, as a band that has been taken off (None: no limit).
+    @param simulator_args: Keyword arguments of RRSimulator (model parameters and seed).
     """
 
-    def __init__(self):
+    def __init__(self, speed=REAL_TIME, duration=None, **simulator_args):
+        self.logger = Logger()
+        self.speed = speed
+        self.duration = duration
+        self.simulator_args = simulator_args
+        self.simulator = None
         self.connected = False
         self.end_test = False
         self.ended_test = False
         self.end_acquisition = False
         self.ended_acquisition = False
 
-    # --------------------------------------------------------
-    # Follow methods have not any business logic. Only appears
-    # because DemoBand class implements IDevice interface.
-
     @classmethod
     def find(cls):
         pass
 
     def connect(self, *args):
+        """
+        Connects to simulated band, that starts a new rr series.
+        @param args: List of parameter values (not used).
+        """
+        self.simulator = RRSimulator(**self.simulator_args)
         self.connected = True
 
     def disconnect(self):
         self.connected = False
 
-    def run_test(self, notify_window):
+    def stabilize(self):
         pass
 
-    def finish_test(self):
-        pass
+    def _send(self, send_rr, finished):
+        """
+        Sends simulated rr values.
+        @param send_rr: Function called with every rr value.
+        @param finished: Function that returns True when sending must stop.
+        """
+        clock = ReplayClock(self.speed)
+        elapsed = 0.0
+        while not finished() and (self.duration is None or elapsed < self.duration):
+            for rr in self.simulator.next_block().tolist():
+                elapsed += rr / 1000.0
+                delay = clock.delay(elapsed)
+                while delay > 0 and not finished():
+                    sleep(min(delay, _MAX_WAIT))
+                    delay = clock.delay(elapsed)
+                if finished() or (self.duration is not None and elapsed > self.duration):
+                    break
+                send_rr(rr)
+        # Simulation ended: wait as a band that doesn't send anything else
+        while not finished():
+            sleep(_MAX_WAIT)
+        self.logger.info("Simulated band stats: {0}".format(self.simulator.get_stats()))
 
-    def stabilize(self):
-        pass
+    @run_in_thread
+    def run_test(self, notify_window, live_buffer=None):
+        """
+        Runs test for simulated band.
+        @param notify_window: Window that device will send test data.
+        @param live_buffer: analysis.LiveBuffer.BeatRingBuffer where rr values are pushed, if any.
+        """
+        self.end_test = False
+        self.ended_test = False
+
+        def send_rr(rr):
+            if live_buffer is not None:
+                live_buffer.push(rr)
+            PostEvent(notify_window, ResultEvent({'rr': rr, 'hr': 60000 // rr}))
+
+        self._send(send_rr, lambda: self.end_test)
+        self.ended_test = True
 
-    # --------------------------------------------------------
+    def finish_test(self):
+        """
+        Finishes test for simulated band.
+        """
+        self.end_test = True
 
     @run_in_thread
     def begin_acquisition(self, writer=None):
         """
-        Starts a fake acquisition.
+        Starts a simulated acquisition.
         @param writer: Object that writes all generated data.
         """
         self.end_acquisition = False
         self.ended_acquisition = False
-        while not self.end_acquisition:
-            wait_value = randint(800, 900)
-            sleep(wait_value / 1000.0)
-            rr = wait_value
-            if writer:
-                writer.write_rr_value(rr)
+        self._send(writer.write_rr_value if writer else lambda rr: None, lambda: self.end_acquisition)
         self.ended_acquisition = True
         if writer:
             writer.close_writer()
@@ -67,6 +123,3 @@ class DemoBand(IDevice):
         Finishes acquisition
         """
         self.end_acquisition = True
-
-
-
@@ -33,10 +33,11 @@ class IDevice:
         pass
 
     @abstractmethod
-    def run_test(self, notify_window):
+    def run_test(self, notify_window, live_buffer=None):
         """
         Runs test for device and sends data to a custom window.
         @param notify_window: The target window.
+        @param live_buffer: analysis.LiveBuffer.BeatRingBuffer where rr values are pushed, if any.
         """
         pass
 
@@ -69,4 +70,13 @@ class IDevice:
         """
         pass
 
+    def start_capture(self, capture_file):
+        """
+        Records raw data received from device from now on, until it's disconnected, so
+        it can be replayed by devices.ReplayDevice. Devices that don't receive raw data
+        just ignore it.
+        @param capture_file: Path to capture file.
+        """
+        pass
+
 
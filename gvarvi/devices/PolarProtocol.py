@@ -0,0 +1,143 @@
+# coding=utf-8
+
+from collections import namedtuple
+import struct
+
+from devices.ReceiveBuffer import ReceiveBuffer
+
+# Polar WearLink+ frame: header (0xFE), length of the whole frame, checksum (255 - length),
+# sequence, status, heart rate and (length - 6) / 2 big endian rr values (1/1000 s)
+FRAME_START = 0xFE
+FRAME_PREFIX = struct.Struct(">BB")
+FRAME_FIELDS = struct.Struct(">BBBB")
+MIN_FRAME_LENGTH = FRAME_PREFIX.size + FRAME_FIELDS.size
+MAX_FRAME_LENGTH = 255
+# Precompiled formats of every possible number of rr values
+RR_STRUCTS = [struct.Struct(">{0}H".format(n)) for n in range((MAX_FRAME_LENGTH - MIN_FRAME_LENGTH) // 2 + 1)]
+
+PolarFrame = namedtuple("PolarFrame", ["length", "checksum", "sequence", "status", "hr", "rr"])
+
+
+class MalformedFrame(ValueError):
+    """
+    Raised when bytes received can't be a Polar frame.
+    """
+    pass
+
+
+def frame_length(buf, offset=0):
+    """
+    Reads the length of a frame from its first two bytes.
+    @param buf: A bytearray or memoryview.
+    @param offset: Offset of the frame in buf.
+    @return: Length of the whole frame, in bytes.
+    @raise MalformedFrame: If there is no frame header at offset, or length is too short.
+    """
+    start, length = FRAME_PREFIX.unpack_from(buf, offset)
+    if start != FRAME_START:
+        raise MalformedFrame("Bad frame header: {0:#04x}".format(start))
+    if length < MIN_FRAME_LENGTH:
+        raise MalformedFrame("Bad frame length: {0}".format(length))
+    return length
+
+
+def decode_frame(buf, offset=0):
+    """
+    Decodes a complete frame without copying it.
+    @param buf: A bytearray or memoryview.
+    @param offset: Offset of the frame in buf.
+    @return: A PolarFrame. Checksum is not checked (see checksum_ok).
+    @raise MalformedFrame: If there is no frame header at offset, or length is too short.
+    """
+    length = frame_length(buf, offset)
+    checksum, sequence, status, hr = FRAME_FIELDS.unpack_from(buf, offset + FRAME_PREFIX.size)
+    rr = RR_STRUCTS[(length - MIN_FRAME_LENGTH) // 2].unpack_from(buf, offset + MIN_FRAME_LENGTH)
+    return PolarFrame(length, checksum, sequence, status, hr, rr)
+
+
+def checksum_ok(frame):
+    """
+    @param frame: A PolarFrame.
+    @return: True if frame checksum matches its length.
+    """
+    return frame.checksum + frame.length == 255
+
+
+class PolarStreamParser(object):
+    """
+    Framing state machine that finds Polar frames in a stream of received bytes,
+    recovering from corrupted data. A frame is accepted if it begins with the frame
+    header byte and its length is valid and matches its checksum. Otherwise, the
+    parser loses synchronization and scans for the next header byte, skipping bytes
+    one at a time. A frame followed by bytes already received must also be followed
+    by a header byte. While synchronization is lost, this is required for every
+    frame, so a header byte inside garbage is not taken for a frame.
+    @param receive_buffer: A devices.ReceiveBuffer.ReceiveBuffer with received bytes.
+    """
+
+    def __init__(self, receive_buffer=None):
+        self.receive_buffer = receive_buffer if receive_buffer is not None else ReceiveBuffer()
+        self.synchronized = True
+        self.frames_parsed = 0
+        self.dropped_bytes = 0
+        self.dropped_frames = 0
+        self.recovered_frames = 0
+
+    def _lose_sync(self, skip):
+        if self.synchronized:
+            self.synchronized = False
+            self.dropped_frames += 1
+        self.dropped_bytes += skip
+        self.receive_buffer.consume(skip)
+
+    def frames(self):
+        """
+        Parses every complete frame in receive buffer. Bytes of an incomplete frame
+        are kept until the rest of it is received.
+        @return: A generator of PolarFrame.
+        """
+        rb = self.receive_buffer
+        buf = rb.buffer
+        while len(rb) >= FRAME_PREFIX.size + 1:
+            start = rb.start
+            if buf[start] != FRAME_START:
+                header = buf.find(chr(FRAME_START), start, rb.end)
+                self._lose_sync((header if header >= 0 else rb.end) - start)
+                continue
+            length = buf[start + 1]
+            if length < MIN_FRAME_LENGTH or (length - MIN_FRAME_LENGTH) % 2 or buf[start + 2] + length != 255:
+                self._lose_sync(1)
+                continue
+            if len(rb) < length + (0 if self.synchronized else 1):
+                break
+            if len(rb) > length and buf[start + length] != FRAME_START:
+                self._lose_sync(1)
+                continue
+            if not self.synchronized:
+                self.synchronized = True
+                self.recovered_frames += 1
+            frame = decode_frame(buf, start)
+            rb.consume(length)
+            self.frames_parsed += 1
+            yield frame
+
+    def parse(self, data):
+        """
+        Adds received bytes to receive buffer and parses every complete frame.
+        @param data: A string, bytearray or memoryview.
+        @return: A generator of PolarFrame.
+        """
+        data = memoryview(data)
+        while len(data):
+            data = data[self.receive_buffer.write(data):]
+            for frame in self.frames():
+                yield frame
+
+    def get_stats(self):
+        """
+        Gets parser counters.
+        @return: A dictionary with frames parsed, bytes dropped, frames dropped (times
+        synchronization was lost) and frames recovered (times it was found again).
+        """
+        return {"frames": self.frames_parsed, "dropped_bytes": self.dropped_bytes,
+                "dropped_frames": self.dropped_frames, "recovered_frames": self.recovered_frames}
@@ -3,9 +3,12 @@
 from wx import PostEvent
 
 from devices.BTDevice import BTDevice
+from devices.PolarProtocol import PolarStreamParser
+from devices.Capture import CaptureWriter, POLAR_CAPTURE
 from utils import run_in_thread
 from utils import ResultEvent
 from logger import Logger
+from config import bt_receive_timeout
 
 
 class PolariWL(BTDevice):
@@ -25,12 +28,46 @@ class PolariWL(BTDevice):
         self.correct_data = False
         self.error = False
         self.min_rr = 550
+        self.parser = PolarStreamParser(self.receive_buffer)
+
+    def read_frames(self, stop=None):
+        """
+        Reads frames from the band. Everything available in the socket is received
+        at once into receive buffer, and parsed by a PolarStreamParser, so corrupted
+        data is skipped and only costs the frames it hits.
+        @param stop: Function checked while waiting for data. Reading ends when it returns True.
+        @return: A generator of devices.PolarProtocol.PolarFrame.
+        @raise ValueError: If connection is closed.
+        """
+        timeout = bt_receive_timeout if stop is not None else None
+        while stop is None or not stop():
+            for frame in self.parser.frames():
+                yield frame
+            self.fill_receive_buffer(timeout)
+
+    def start_capture(self, capture_file):
+        """
+        Records every read from the socket until device is disconnected.
+        @param capture_file: Path to capture file.
+        """
+        self.receive_buffer.capture = CaptureWriter(capture_file, POLAR_CAPTURE)
+
+    def get_receive_stats(self):
+        """
+        Gets counters of receive buffer and frame parser.
+        @return: A dictionary with every counter, and average frames parsed per socket read.
+        """
+        stats = self.receive_buffer.get_stats()
+        stats.update(self.parser.get_stats())
+        stats["frames_per_read"] = float(stats["frames"]) / stats["reads"] if stats["reads"] else 0.0
+        return stats
 
     @run_in_thread
-    def run_test(self, notify_window):
+    def run_test(self, notify_window, live_buffer=None):
         """
         Run test for Polar WearLink+ device.
         @param notify_window: Window that device will send test data.
+        @param live_buffer: analysis.LiveBuffer.BeatRingBuffer where rr values are pushed, if any.
         """
         self.end_test = False
         self.ended_test = False
@@ -38,42 +75,24 @@ class PolariWL(BTDevice):
         test_dict = {}
         while not self.end_test:
             try:
-                data1 = self.receive(1)
-                data2 = self.receive(1)
-                ll = int(data2, 16)
-                data3 = self.receive(ll - 2)
-
-                chk = int(data3[0:2], 16)
-                if chk + ll != 255:
-                    self.logger.error("Package not ok")
-
-                hr = int(data3[6:8], 16)
-                test_dict['hr'] = hr
-                self.logger.debug("Heart rate: {0} bpm".format(hr))
-                next_bit = 8
-
-                for i in range((ll - 6) / 2):  # rr values per packet
-                    rr1 = int(data3[next_bit:next_bit + 2], 16)
-                    rr2 = int(data3[next_bit + 2:next_bit + 4], 16)
-                    test_dict['rr'] = (rr1 << 8) | rr2
+                for frame in self.read_frames(stop=lambda: self.end_test):
+                    test_dict['hr'] = frame.hr
+                    self.logger.debug("Heart rate: {0} bpm".format(frame.hr))
+
+                    for rr in frame.rr:
+                        test_dict['rr'] = rr
+                        if self.end_test:
+                            break
+                        if live_buffer is not None:
+                            live_buffer.push(rr)
+                        PostEvent(notify_window, ResultEvent(test_dict))
+
                     if self.end_test:
                         break
-                    PostEvent(notify_window, ResultEvent(test_dict))
-
-                    next_bit += 4
 
             except ValueError:
                 if not self.end_test:  # Exception only works if BT is still connected
                     self.logger.exception("ValueError raised: data not Ok")
-                    import traceback
-                    import os.path
-
-                    top = traceback.extract_stack()[-1]
-                    self.logger.debug("Program:", os.path.basename(top[0]), " -  Line:", str(top[1]))
-                    self.logger.debug("Data1: {0}".format(data1))
-                    self.logger.debug("Data2: {0}".format(data2))
-                    self.logger.debug("Data3: {0}".format(data3))
-
                     self.error = True
                 else:
                     self.logger.warning("ValueError raised at the end of the acquisition")
@@ -96,17 +115,10 @@ class PolariWL(BTDevice):
         hr = 0
         while hr < minimum_value or hr > maximum_value:
             try:
-                data1 = self.receive(1)
-                data2 = self.receive(1)
-                ll = int(data2, 16)
-                data3 = self.receive(ll - 2)
-
-                chk = int(data3[0:2], 16)
-                if chk + ll != 255:
-                    self.logger.error("Package not ok")
-                    continue
-
-                hr = int(data3[6:8], 16)
+                for frame in self.read_frames():
+                    hr = frame.hr
+                    if minimum_value <= hr <= maximum_value:
+                        break
 
             except ValueError:
                 continue
@@ -122,51 +134,26 @@ class PolariWL(BTDevice):
         self.error = False
         while not self.end_acquisition:
             try:
-                data1 = self.receive(1)
-                data2 = self.receive(1)
-                ll = int(data2, 16)
-                data3 = self.receive(ll - 2)
-                chk = int(data3[0:2], 16)
-                if chk + ll != 255:
-                    self.logger.error("Package not OK")
-
-                seq = int(data3[2:4], 16)
-                self.logger.debug("Package seq: {0}".format(seq))
+                for frame in self.read_frames(stop=lambda: self.end_acquisition):
+                    self.logger.debug("Package seq: {0}".format(frame.sequence))
+                    self.logger.debug("Package status: {0}".format(frame.status))
+                    self.logger.debug("Heart rate: {0} bpm".format(frame.hr))
+                    self.logger.debug("Package contains {0} beats".format(len(frame.rr)))
 
-                status = int(data3[4:6], 16)
-                self.logger.debug("Package status: {0}".format(status))
+                    for rr in frame.rr:
+                        self.logger.debug("RR: {0} mseg".format(rr))
 
-                hr = int(data3[6:8], 16)
-                self.logger.debug("Heart rate: {0} bpm".format(hr))
-                nextbit = 8
+                        if rr > self.min_rr and not self.correct_data:
+                            self.correct_data = True
 
-                self.logger.debug("Package contains {0} beats".format((ll - 6) / 2))
+                        writer.write_rr_value(rr)
 
-                for i in range((ll - 6) / 2):  # rr values per packet
-                    rr1 = int(data3[nextbit:nextbit + 2], 16)
-                    rr2 = int(data3[nextbit + 2:nextbit + 4], 16)
-                    rr = (rr1 << 8) | rr2
-
-                    self.logger.debug("RR: {0} mseg".format(rr))
-
-                    if rr > self.min_rr and not self.correct_data:
-                        self.correct_data = True
-
-                    writer.write_rr_value(rr)
-
-                    nextbit += 4
+                    if self.end_acquisition:
+                        break
 
             except ValueError:
                 if not self.end_acquisition:  # Exception only works if BT is still connected
                     self.logger.exception("ValueError raised: data not Ok")
-                    import traceback
-                    import os.path
-
-                    top = traceback.extract_stack()[-1]
-                    self.logger.debug("Program:", os.path.basename(top[0]), " -  Line:", str(top[1]))
-                    self.logger.debug("Data1: {0}".format(data1))
-                    self.logger.debug("Data2: {0}".format(data2))
-                    self.logger.debug("Data3: {0}".format(data3))
                     self.error = True
                 else:
                     self.logger.warning("ValueError raised at the end of the acquisition")
@@ -182,6 +169,7 @@ class PolariWL(BTDevice):
 
             if self.end_acquisition:
                 self.ended_acquisition = True
+                self.logger.info("Polar stream: {0}".format(self.get_receive_stats()))
                 writer.close_writer()
                 break
 
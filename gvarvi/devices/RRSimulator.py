@@ -0,0 +1,192 @@
+# coding=utf-8
+
+import math
+
+import numpy as np
+
+from config import SIMULATOR_MEAN_HR, SIMULATOR_LF, SIMULATOR_HF, SIMULATOR_VLF_AMPLITUDE, SIMULATOR_NOISE, \
+    SIMULATOR_ECTOPIC_RATE, SIMULATOR_DROPOUT_RATE, SIMULATOR_DROPOUT_BEATS, SIMULATOR_BLOCK_SECONDS, \
+    FREQUENCY_BANDS
+
+# Hz of the grid where the modulated heart rate is integrated
+_GRID_FREQUENCY = 8.0
+# Sinusoids (random frequencies of VLF band) that make the slow drift
+_VLF_COMPONENTS = 4
+# Shortest rr of the modulated heart rate, in ms
+_MIN_RR = 250.0
+# An ectopic beat comes this fraction of its rr earlier, and next rr is longer (compensatory pause)
+_ECTOPIC_PREMATURITY = 0.35
+
+
+class RRSimulator(object):
+    """
+    Generates realistic rr series from a parametric model. Heart rate is a mean rr
+    modulated by a LF oscillation, a HF oscillation (respiratory sinus arrhythmia)
+    and a slow drift (random VLF sinusoids), and beats are found integrating it
+    (integral pulse frequency modulation) over a time grid, so long series are
+    generated with a few numpy operations. Beat to beat noise, ectopic beats and
+    bursts of missed beats (merged into the next rr value, as a band that loses
+    contact) are added afterwards.
+    Series is generated in blocks of model time, and every block continues the
+    previous one, so the simulator can feed an acquisition of any length. Same seed,
+    parameters and block sizes always give the same series.
+    @param mean_hr: Mean heart rate, in bpm.
+    @param lf: (frequency in Hz, rr amplitude in ms) of LF oscillation.
+    @param hf: (frequency in Hz, rr amplitude in ms) of HF oscillation (breathing rate).
+    @param vlf_amplitude: Max rr change of slow drift, in ms.
+    @param noise: Standard deviation of beat to beat noise, in ms.
+    @param ectopic_rate: Fraction of beats that are ectopic.
+    @param dropout_rate: Bursts of missed beats per hour.
+    @param dropout_beats: Mean missed beats per burst.
+    @param seed: Random seed (None: random series).
+    """
+
+    def __init__(self, mean_hr=SIMULATOR_MEAN_HR, lf=SIMULATOR_LF, hf=SIMULATOR_HF,
+                 vlf_amplitude=SIMULATOR_VLF_AMPLITUDE, noise=SIMULATOR_NOISE, ectopic_rate=SIMULATOR_ECTOPIC_RATE,
+                 dropout_rate=SIMULATOR_DROPOUT_RATE, dropout_beats=SIMULATOR_DROPOUT_BEATS, seed=None):
+        self.rng = np.random.RandomState(seed)
+        self.mean_rr = 60000.0 / mean_hr
+        self.noise = noise
+        self.ectopic_rate = ectopic_rate
+        self.dropout_beats = dropout_beats
+        # Probability that a burst begins at a beat
+        self.dropout_probability = dropout_rate * self.mean_rr / 3600000.0
+
+        vlf_low, vlf_high = [(low, high) for name, low, high in FREQUENCY_BANDS if name == "vlf"][0]
+        self.frequencies = np.concatenate(([lf[0], hf[0]], self.rng.uniform(vlf_low, vlf_high, _VLF_COMPONENTS)))
+        self.amplitudes = np.concatenate(([lf[1], hf[1]], [vlf_amplitude / float(_VLF_COMPONENTS)] * _VLF_COMPONENTS))
+        self.phases = self.rng.uniform(0, 2 * math.pi, len(self.frequencies))
+
+        # Model time (s) of next block, and beat phase (beats since last beat) at that time
+        self.time = 0.0
+        self.phase = self.rng.uniform()
+        # Time (ms) of last beat of previous block, None before the first beat
+        self.last_beat = None
+        # Missed beats still to come, and ms since last reported beat
+        self.pending_missed = 0
+        self.missed_time = 0.0
+
+        self.beats = 0
+        self.ectopic_beats = 0
+        self.missed_beats = 0
+        self.dropouts = 0
+
+    def modulated_rr(self, t):
+        """
+        @param t: Numpy array of model times, in seconds.
+        @return: Numpy array of rr values of the modulated heart rate at t, in ms (without noise).
+        """
+        oscillations = np.sin(2 * math.pi * np.outer(t, self.frequencies) + self.phases)
+        return self.mean_rr + oscillations.dot(self.amplitudes)
+
+    def _beat_times(self, seconds):
+        """
+        Finds beats of the next seconds of model time.
+        @return: Numpy array of beat times, in ms.
+        """
+        points = max(int(round(seconds * _GRID_FREQUENCY)), 1)
+        t = self.time + np.arange(points + 1) / _GRID_FREQUENCY
+        rate = 1000.0 / np.maximum(self.modulated_rr(t), _MIN_RR)
+        # Trapezoidal integration of beats per second
+        phase = np.empty(points + 1)
+        phase[0] = self.phase
+        np.cumsum((rate[1:] + rate[:-1]) / (2 * _GRID_FREQUENCY), out=phase[1:])
+        phase[1:] += self.phase
+        beats = math.floor(phase[-1])
+        self.time = t[-1]
+        self.phase = phase[-1] - beats
+        return np.interp(np.arange(1, beats + 1), phase, t) * 1000
+
+    def _add_ectopic_beats(self, rr):
+        ectopic = self.rng.random_sample(len(rr)) < self.ectopic_rate
+        # Compensatory pause must be in this block, and an ectopic beat can't follow another
+        ectopic[-1:] = False
+        ectopic[1:] &= ~ectopic[:-1]
+        advance = rr[ectopic] * _ECTOPIC_PREMATURITY
+        rr[ectopic] -= advance
+        rr[np.flatnonzero(ectopic) + 1] += advance
+        self.ectopic_beats += len(advance)
+
+    def _missed(self, count):
+        """
+        @return: Boolean numpy array of the beats (of count) that are missed.
+        """
+        bursts = np.flatnonzero(self.rng.random_sample(count) < self.dropout_probability)
+        lengths = self.rng.geometric(1.0 / max(self.dropout_beats, 1), len(bursts))
+        # +1 where a burst begins and -1 where it ends, so missed beats have a positive cumulative sum
+        marks = np.zeros(count + 1, dtype=np.intp)
+        carried = min(self.pending_missed, count)
+        if carried:
+            # Burst of previous block goes on
+            marks[0] += 1
+            marks[carried] -= 1
+        np.add.at(marks, bursts, 1)
+        np.add.at(marks, np.minimum(bursts + lengths, count), -1)
+        missed = np.cumsum(marks[:-1]) > 0
+        self.pending_missed = max(self.pending_missed - count, 0)
+        if len(bursts):
+            self.pending_missed = max(self.pending_missed, (bursts + lengths - count).max())
+        self.dropouts += len(bursts)
+        return missed
+
+    def next_block(self, seconds=SIMULATOR_BLOCK_SECONDS):
+        """
+        Generates the rr values reported during the next seconds of model time.
+        @param seconds: Model time, in seconds.
+        @return: Numpy array of integer rr values, in ms.
+        """
+        times = self._beat_times(seconds)
+        if self.last_beat is None:
+            # First beat only starts the first rr
+            if not len(times):
+                return np.zeros(0, dtype=int)
+            self.last_beat, times = times[0], times[1:]
+        if not len(times):
+            return np.zeros(0, dtype=int)
+        rr = np.diff(np.append(self.last_beat, times))
+        self.last_beat = times[-1]
+        self.beats += len(rr)
+
+        rr += self.rng.normal(0, self.noise, len(rr))
+        self._add_ectopic_beats(rr)
+
+        missed = self._missed(len(rr))
+        elapsed = self.missed_time + np.cumsum(rr)
+        reported = elapsed[~missed]
+        self.missed_time = elapsed[-1] - reported[-1] if len(reported) else elapsed[-1]
+        self.missed_beats += int(missed.sum())
+        return np.rint(np.diff(np.append(0.0, reported))).astype(int)
+
+    def generate(self, seconds, block_seconds=SIMULATOR_BLOCK_SECONDS):
+        """
+        Generates the rr values reported during the next seconds of model time, at once.
+        @param seconds: Model time, in seconds.
+        @param block_seconds: Model time generated by every block.
+        @return: Numpy array of integer rr values, in ms.
+        """
+        blocks = []
+        while seconds > 0:
+            blocks.append(self.next_block(min(seconds, block_seconds)))
+            seconds -= block_seconds
+        return np.concatenate(blocks) if blocks else np.zeros(0, dtype=int)
+
+    def generate_beats(self, beats):
+        """
+        Generates a number of rr values.
+        @param beats: Number of rr values.
+        @return: Numpy array of integer rr values, in ms.
+        """
+        blocks = []
+        count = 0
+        while count < beats:
+            blocks.append(self.next_block())
+            count += len(blocks[-1])
+        return np.concatenate(blocks)[:beats] if blocks else np.zeros(0, dtype=int)
+
+    def get_stats(self):
+        """
+        Gets simulator counters.
+        @return: A dictionary with beats generated, ectopic beats, missed beats and bursts of missed beats.
+        """
+        return {"beats": self.beats, "ectopic_beats": self.ectopic_beats, "missed_beats": self.missed_beats,
+                "dropouts": self.dropouts}
@@ -0,0 +1,118 @@
+# coding=utf-8
+
+import select
+
+from config import bt_receive_buffer_size
+
+
+class ReceiveBuffer(object):
+    """
+    Preallocated buffer of bytes received from a device and not parsed yet. Data is
+    received straight into its free space (fill(), or writable() and commit()) and
+    parsers consume it from the start. Unparsed bytes are always kept contiguous,
+    so frames can be decoded in place: when free space at the end runs out, they
+    are moved back to the beginning of the buffer.
+    @param capacity: Size of the buffer, in bytes.
+    """
+
+    def __init__(self, capacity=bt_receive_buffer_size):
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        # Unparsed bytes are buffer[start:end]
+        self.start = 0
+        self.end = 0
+        self.bytes_read = 0
+        self.reads = 0
+        self.syscalls = 0
+        self.timeouts = 0
+        # devices.Capture.CaptureWriter that records every read, if any
+        self.capture = None
+
+    def __len__(self):
+        return self.end - self.start
+
+    def writable(self):
+        """
+        Gets free space of the buffer, making room first if needed.
+        @return: A writable memoryview.
+        """
+        if self.start == self.end:
+            self.start = self.end = 0
+        elif self.end == len(self.buffer):
+            size = self.end - self.start
+            self.buffer[:size] = self.buffer[self.start:self.end]
+            self.start, self.end = 0, size
+        return self.view[self.end:]
+
+    def commit(self, n):
+        """
+        Marks bytes written in writable() space as received.
+        @param n: Number of bytes.
+        """
+        self.end += n
+
+    def write(self, data):
+        """
+        Copies received bytes into the buffer.
+        @param data: A string, bytearray or memoryview.
+        @return: Number of bytes copied (less than len(data) if buffer is full).
+        """
+        space = self.writable()
+        n = min(len(space), len(data))
+        space[:n] = data[:n]
+        self.commit(n)
+        return n
+
+    def consume(self, n):
+        """
+        Discards parsed bytes.
+        @param n: Number of bytes.
+        """
+        self.start += n
+
+    def clear(self):
+        """
+        Discards every unparsed byte (i.e. when connection is reset).
+        """
+        self.start = self.end = 0
+
+    def fill(self, sock, timeout=None):
+        """
+        Receives everything available in a socket (up to free space) with a single
+        read. Waits until some data is available.
+        @param sock: The socket (any object with recv, and fileno if timeout is used).
+        @param timeout: Max seconds waiting for data, or None to wait forever.
+        @return: Number of bytes received, 0 if timeout expired.
+        @raise ValueError: If connection is closed.
+        """
+        if timeout is not None:
+            self.syscalls += 1
+            readable, _, _ = select.select([sock], [], [], timeout)
+            if not readable:
+                self.timeouts += 1
+                return 0
+        space = self.writable()
+        self.syscalls += 1
+        if hasattr(sock, "recv_into"):
+            n = sock.recv_into(space)
+        else:
+            # Sockets without recv_into (some PyBluez versions)
+            data = sock.recv(len(space))
+            n = len(data)
+            space[:n] = data
+        if n == 0:
+            raise ValueError("Connection closed")
+        if self.capture is not None:
+            self.capture.record(space[:n])
+        self.commit(n)
+        self.bytes_read += n
+        self.reads += 1
+        return n
+
+    def get_stats(self):
+        """
+        Gets receive counters.
+        @return: A dictionary with bytes read, reads, syscalls (reads and waits) and timeouts.
+        """
+        return {"bytes_read": self.bytes_read, "reads": self.reads, "syscalls": self.syscalls,
+                "timeouts": self.timeouts}
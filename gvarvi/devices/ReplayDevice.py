@@ -0,0 +1,242 @@
+# coding=utf-8
+
+import socket
+import time
+
+from third_party.ant.core.driver import Driver
+from third_party.ant.core.event import EventMachine
+from devices.IDevice import IDevice
+from devices.PolariWL import PolariWL
+from devices.ANTDevice import AcquisitionCallback, TestCallback
+from devices.Capture import read_capture, POLAR_CAPTURE
+from utils import run_in_thread, monotonic
+from logger import Logger
+
+REAL_TIME = 1.0
+AS_FAST_AS_POSSIBLE = None
+
+# Max seconds waiting for the next record before checking if replay has finished
+_MAX_WAIT = 0.1
+# Max bytes returned by a ReplayDriver read
+_MAX_READ = 4096
+
+
+def _socket_pair():
+    """
+    Connected pair of sockets. Python 2 has no socket.socketpair on Windows, so a
+    loopback TCP connection is used instead.
+    """
+    if hasattr(socket, "socketpair"):
+        return socket.socketpair()
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        client = socket.create_connection(listener.getsockname())
+        server, _address = listener.accept()
+        return server, client
+    finally:
+        listener.close()
+
+
+class ReplayClock(object):
+    """
+    Paces records of a capture.
+    @param speed: REAL_TIME, a factor (records are replayed speed times faster) or AS_FAST_AS_POSSIBLE.
+    """
+
+    def __init__(self, speed=REAL_TIME):
+        self.speed = speed
+        self.start = monotonic()
+
+    def delay(self, seconds):
+        """
+        @param seconds: Time of a record, in seconds since capture started.
+        @return: Seconds until record is due (0 or less if it's due).
+        """
+        if not self.speed:
+            return 0
+        return self.start + seconds / self.speed - monotonic()
+
+
+class ReplayDriver(Driver):
+    """
+    ANT driver that returns the reads of a capture, paced by a ReplayClock, so they are
+    decoded by the ANT event machine as if they came from an USB stick. Every read
+    returns all the records that are due (up to _MAX_READ bytes, even if less were
+    requested, since the event machine appends reads to its own buffer), so a fast
+    replay is not limited by the tiny reads of the event machine.
+    @param records: Records of the capture.
+    @param speed: Replay speed (see ReplayClock).
+    """
+
+    def __init__(self, records, speed=REAL_TIME):
+        Driver.__init__(self, "replay")
+        self.records = iter(records)
+        self.speed = speed
+        self.clock = None
+        self.next_record = None
+
+    def _open(self):
+        self.clock = ReplayClock(self.speed)
+
+    def _close(self):
+        pass
+
+    def _read(self, count):
+        data = []
+        size = 0
+        while size < _MAX_READ:
+            if self.next_record is None:
+                self.next_record = next(self.records, None)
+                if self.next_record is None:
+                    break
+            delay = self.clock.delay(self.next_record[0])
+            if delay > 0:
+                if not data:
+                    time.sleep(min(delay, _MAX_WAIT))
+                break
+            data.append(self.next_record[1])
+            size += len(self.next_record[1])
+            self.next_record = None
+        if not data and self.next_record is None:
+            # Capture finished: like a stick that doesn't receive anything
+            time.sleep(_MAX_WAIT)
+        return "".join(data)
+
+    def _write(self, data):
+        return len(data)
+
+
+class ReplayDevice(IDevice):
+    """
+    Device that replays a capture of raw data received from a real device (see
+    devices.Capture) through the decoding code of that device: Polar captures are
+    sent through a local socket to a PolariWL, and ANT captures are read by the ANT
+    event machine from a ReplayDriver. When capture ends, device doesn't send
+    anything else, as a band that has been taken off.
+    @param capture_file: Path to capture file (or ANT log file).
+    @param speed: REAL_TIME, a factor (capture is replayed speed times faster) or AS_FAST_AS_POSSIBLE.
+    """
+
+    def __init__(self, capture_file, speed=REAL_TIME):
+        self.logger = Logger()
+        self.capture_file = capture_file
+        self.speed = speed
+        self.source = None
+        self.connected = False
+        self.end_acquisition = False
+        self.ended_acquisition = False
+        self.results_written = False
+        self.writer = None
+
+        # Polar replay
+        self.polar_device = None
+        self.feeder_socket = None
+        self.feeder_thread = None
+        self.stop_feeding = False
+        # ANT replay
+        self.driver = None
+        self.evm = None
+        self.callback = None
+
+    @classmethod
+    def find(cls):
+        return []
+
+    def connect(self, *args):
+        """
+        Loads capture and starts replaying it.
+        @param args: List of parameter values (not used).
+        @raise IOError: If capture file can't be read.
+        """
+        self.source, records = read_capture(self.capture_file)
+        self.logger.info("Replaying {0} reads from {1}".format(len(records), self.capture_file))
+        if self.source == POLAR_CAPTURE:
+            self.polar_device = PolariWL(None)
+            self.polar_device.socket, self.feeder_socket = _socket_pair()
+            self.stop_feeding = False
+            self.feeder_thread = self._feed(records)
+        else:
+            self.driver = ReplayDriver(records, self.speed)
+            self.driver.open()
+            self.evm = EventMachine(self.driver)
+        self.connected = True
+
+    @run_in_thread
+    def _feed(self, records):
+        clock = ReplayClock(self.speed)
+        try:
+            for seconds, data in records:
+                delay = clock.delay(seconds)
+                while delay > 0 and not self.stop_feeding:
+                    time.sleep(min(delay, _MAX_WAIT))
+                    delay = clock.delay(seconds)
+                if self.stop_feeding:
+                    break
+                self.feeder_socket.sendall(data)
+        except socket.error:
+            # Device disconnected while replaying
+            pass
+
+    def disconnect(self):
+        """
+        Stops replay.
+        """
+        if self.polar_device:
+            self.stop_feeding = True
+            self.polar_device.disconnect()
+            self.feeder_thread.join()
+            self.feeder_socket.close()
+        elif self.driver:
+            self.evm.stop()
+            self.driver.close()
+        self.connected = False
+
+    def run_test(self, notify_window, live_buffer=None):
+        if self.polar_device:
+            return self.polar_device.run_test(notify_window, live_buffer)
+        self.callback = TestCallback(notify_window, live_buffer)
+        self.evm.registerCallback(self.callback)
+        self.evm.start()
+
+    def finish_test(self):
+        if self.polar_device:
+            self.polar_device.finish_test()
+        else:
+            self.evm.removeCallback(self.callback)
+
+    def stabilize(self):
+        if self.polar_device:
+            self.polar_device.stabilize()
+
+    def begin_acquisition(self, writer):
+        """
+        Starts acquisition, decoding the capture and writing rr values.
+        @param writer: Object that writes rr values.
+        @return: Thread that decodes the capture.
+        """
+        self.writer = writer
+        self.end_acquisition = False
+        self.ended_acquisition = False
+        self.results_written = False
+        if self.polar_device:
+            return self.polar_device.begin_acquisition(writer)
+        self.callback = AcquisitionCallback(self, writer)
+        self.evm.registerCallback(self.callback)
+        self.evm.start()
+        return self.evm.eventPump
+
+    def finish_acquisition(self):
+        """
+        Finishes acquisition.
+        """
+        self.end_acquisition = True
+        if self.polar_device:
+            self.polar_device.finish_acquisition()
+        else:
+            self.evm.stop()
+            if not self.results_written:
+                self.writer.close_writer()
+                self.results_written = True
+        self.ended_acquisition = True
@@ -32,8 +32,10 @@ class AcquisitionFacade(object):
             if self.activity.check_before_run():
                 self.logger.info("Connecting to device")
                 self.device.connect()
+                self.writer.write_event("connected")
                 self.logger.info("Stabilizing device data")
                 self.device.stabilize()
+                self.writer.write_event("stabilized")
                 self.logger.info("Starting acquisition")
                 self.acquisition_thread = self.device.begin_acquisition(self.writer)
                 # Run device acquisition before activity because
@@ -41,6 +43,7 @@ class AcquisitionFacade(object):
                 # doesn't block program
                 self.logger.info("Running activity")
                 self.activity.run(self.writer)
+                self.writer.write_event("activity_ended")
                 self.logger.info("Activity ended. Finishing device acquisition")
                 self.device.finish_acquisition()
                 if self.acquisition_thread and self.acquisition_thread.is_alive():
@@ -0,0 +1,229 @@
+# coding=utf-8
+
+from collections import namedtuple
+from datetime import datetime
+import threading
+import time
+import os
+
+from facade.Writer import IWriter, StreamingTextWriter
+from logger import Logger
+from utils import FailedAcquisition, process_is_running
+from config import JOURNAL_DIR, JOURNAL_FLUSH_SECONDS, RR_FLUSH_SECONDS, RR_FSYNC
+
+JOURNAL_MAGIC = "GVJ1"
+JOURNAL_EXTENSION = ".journal"
+
+Journal = namedtuple("Journal", ["path", "tag_file", "rr_file"])
+
+
+class JournalWriter(IWriter):
+    """
+    IWriter wrapper that journals every record before handing it to the wrapped
+    writer. It must be the first writer of the chain, so records are journaled by
+    the caller thread before they wait in any queue. Caller thread only buffers
+    them in memory: a background thread writes them to the journal file every
+    flush_seconds (and forces it to disk every RR_FLUSH_SECONDS), so the caller
+    never waits for the disk. Journal is removed when the writer is closed or
+    aborted, so any journal left in journal folder belongs to an interrupted
+    acquisition and can be used to rebuild its result files (see recover_journal).
+    @param writer: The wrapped IWriter.
+    @param tag_file: Absolute path to tag file of the acquisition.
+    @param rr_file: Absolute path to rr file of the acquisition.
+    @param journal_dir: Folder where journal is created.
+    @param flush_seconds: Max time, in seconds, that a record waits before being written to journal file.
+    """
+
+    def __init__(self, writer, tag_file, rr_file, journal_dir=JOURNAL_DIR, flush_seconds=JOURNAL_FLUSH_SECONDS):
+        self.logger = Logger()
+
+        self.writer = writer
+        self.tag_file = tag_file
+        self.rr_file = rr_file
+        self.journal_file = os.path.join(journal_dir, "{0}-{1}{2}".format(
+            datetime.now().strftime("%Y%m%d%H%M%S%f"), os.getpid(), JOURNAL_EXTENSION))
+        self.f = None
+        self.last_sync = time.time()
+
+        self.flush_seconds = flush_seconds
+        self.lock = threading.Lock()
+        self.pending_lines = []
+        self.error = None
+        self.stop_flushing = threading.Event()
+        self.flush_thread = threading.Thread(target=self._run, name="JournalWriter")
+        self.flush_thread.daemon = True
+        self.flush_thread.start()
+
+    def write_tag_value(self, name, beg, end):
+        """
+        Writes tag info to journal and wrapped writer.
+        @param name: Tag name.
+        @param beg: Begin time in seconds.
+        @param end: End time in seconds.
+        """
+        name_field = self._encode(name).replace("\t", " ").replace("\n", " ")
+        self._append("T\t{0!r}\t{1!r}\t{2}".format(beg, end, name_field))
+        self.writer.write_tag_value(name, beg, end)
+
+    def write_rr_value(self, rr):
+        """
+        Writes rr value to journal and wrapped writer.
+        @param rr: The value.
+        """
+        self._append("R\t{0}".format(rr))
+        self.writer.write_rr_value(rr)
+
+    def write_event(self, name):
+        """
+        Sends device event to wrapped writer. Events are not journaled.
+        @param name: Event name.
+        """
+        self.writer.write_event(name)
+
+    def close_writer(self):
+        """
+        Writes pending records to journal, closes wrapped writer and removes journal.
+        """
+        self._stop()
+        self.writer.close_writer()
+        self._remove_journal()
+
+    def abort(self):
+        """
+        Aborts wrapped writer and removes journal.
+        """
+        self._stop()
+        self.writer.abort()
+        self._remove_journal()
+
+    def get_stats(self):
+        """
+        Gets counters of the wrapped writer.
+        @return: A dictionary with counters, or None if the wrapped writer has no counters.
+        """
+        return self.writer.get_stats() if hasattr(self.writer, "get_stats") else None
+
+    def _append(self, line):
+        if self.error is not None:
+            raise FailedAcquisition("Unable to write in journal file{0}Exception type: {1}{0}Exception "
+                                    "message: {2}".format(os.linesep, type(self.error), self.error.message))
+        with self.lock:
+            self.pending_lines.append(line)
+
+    def _run(self):
+        while not self.stop_flushing.wait(self.flush_seconds):
+            self._flush()
+        self._flush()
+
+    def _flush(self):
+        with self.lock:
+            lines, self.pending_lines = self.pending_lines, []
+        if not lines or self.error is not None:
+            return
+        try:
+            if self.f is None:
+                # Journal is only created when there is something to recover
+                self.f = open(self.journal_file, "wt")
+                self.f.write("{0}\t{1}\t{2}\n".format(JOURNAL_MAGIC, self._encode(self.tag_file),
+                                                      self._encode(self.rr_file)))
+            self.f.write("".join(line + "\n" for line in lines))
+            self.f.flush()
+            if RR_FSYNC and time.time() - self.last_sync >= RR_FLUSH_SECONDS:
+                os.fsync(self.f.fileno())
+                self.last_sync = time.time()
+        except Exception as e:
+            # Caller is notified on its next record
+            self.logger.exception("Unable to write in journal file: {0}".format(e))
+            self.error = e
+
+    def _stop(self):
+        if self.flush_thread.is_alive():
+            self.stop_flushing.set()
+            self.flush_thread.join()
+
+    def _remove_journal(self):
+        if self.f is not None and not self.f.closed:
+            self.f.close()
+        if os.path.isfile(self.journal_file):
+            os.remove(self.journal_file)
+
+    @staticmethod
+    def _encode(text):
+        if isinstance(text, unicode):
+            text = text.encode("utf-8")
+        return text
+
+
+def find_unfinished_journals(journal_dir=JOURNAL_DIR):
+    """
+    Looks for journals of interrupted acquisitions. Journals of processes that are
+    still running (an acquisition of another gVarvi instance) are skipped.
+    @param journal_dir: Folder where journals are stored.
+    @return: A list of Journal namedtuples, oldest first.
+    """
+    journals = []
+    if not os.path.isdir(journal_dir):
+        return journals
+    for name in sorted(os.listdir(journal_dir)):
+        path = os.path.join(journal_dir, name)
+        if not name.endswith(JOURNAL_EXTENSION):
+            continue
+        pid = _journal_pid(name)
+        if pid is not None and process_is_running(pid):
+            continue
+        with open(path, "rt") as f:
+            header = f.readline().rstrip("\n").split("\t")
+        if len(header) == 3 and header[0] == JOURNAL_MAGIC:
+            journals.append(Journal(path, header[1].decode("utf-8"), header[2].decode("utf-8")))
+        else:
+            Logger().warning("Removing invalid journal {0}".format(path))
+            os.remove(path)
+    return journals
+
+
+def _journal_pid(name):
+    """
+    @param name: Journal file name (see JournalWriter).
+    @return: Id of the process that wrote the journal, or None if name has no valid pid.
+    """
+    try:
+        return int(name[:-len(JOURNAL_EXTENSION)].rsplit("-", 1)[1])
+    except (IndexError, ValueError):
+        return None
+
+
+def recover_journal(journal):
+    """
+    Rebuilds result files of an interrupted acquisition by replaying its journal,
+    then removes the journal. Incomplete records (the last one, usually) are skipped.
+    @param journal: A Journal namedtuple.
+    @return: Number of recovered rr values.
+    """
+    writer = StreamingTextWriter(journal.tag_file, journal.rr_file, flush_beats=4096, fsync=False)
+    beats = 0
+    with open(journal.path, "rt") as f:
+        next(f)  # Skipping header row
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            fields = line.rstrip("\n").split("\t")
+            try:
+                if fields[0] == "R" and len(fields) == 2:
+                    writer.write_rr_value(int(fields[1]))
+                    beats += 1
+                elif fields[0] == "T" and len(fields) == 4:
+                    writer.write_tag_value(fields[3], float(fields[1]), float(fields[2]))
+            except ValueError:
+                Logger().warning("Skipping corrupted journal record: {0}".format(line))
+    writer.close_writer()
+    os.remove(journal.path)
+    return beats
+
+
+def discard_journal(journal):
+    """
+    Removes the journal of an interrupted acquisition.
+    @param journal: A Journal namedtuple.
+    """
+    if os.path.isfile(journal.path):
+        os.remove(journal.path)
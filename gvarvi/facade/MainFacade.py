@@ -1,15 +1,24 @@
 # coding=utf-8
 import shutil
 import os
+import sqlite3
 
 from dao.XMLMapper import XMLMapper
-from utils import Singleton, unpack_tar_file_and_remove, open_file, TarFileNotValid
+from dao.Catalog import Catalog
+from utils import Singleton, unpack_tar_file_and_remove, open_file, TarFileNotValid, result_file_exists, \
+    get_plain_file, summarize_rr, valid_port
 from facade.AcquisitionFacade import AcquisitionFacade
 from devices.PolariWL import PolariWL
 from devices.DemoBand import DemoBand
 from devices.ANTDevice import ANTDevice
-from facade.Writer import TextWriter
-from config import DEVICE_CONNECTED_MODE, DEMO_MODE, CONF_DIR, RECENT_ACQUISITIONS_FILE
+from devices.ReplayDevice import ReplayDevice, REAL_TIME
+from devices.Capture import CAPTURE_EXTENSION
+from facade.Writer import StreamingTextWriter, RotatingTextWriter, CompressedTextWriter, AsyncWriter, TeeWriter, \
+    BinaryWriter, NetworkWriter, StatsWriter, ArtifactWriter, NullWriter
+from analysis.Session import Session
+from analysis.LiveBuffer import BeatRingBuffer
+from facade.Journal import JournalWriter, find_unfinished_journals, recover_journal, discard_journal
+from config import DEVICE_CONNECTED_MODE, DEMO_MODE, REPLAY_MODE, REPLAY_SPEEDS, CONF_DIR, RECENT_ACQUISITIONS_FILE
 from logger import Logger
 from devices.BTDevice import BTDevice
 from utils import run_in_thread
@@ -37,6 +46,9 @@ class MainFacade:
         self.test_thread = None
         self.acquisition_path = None
         self.testing_device = None
+        self.writer_stats = None
+        self.live_writer = None
+        self.catalog = Catalog()
 
     def activate_remote_debug(self, ip, port):
         self.logger.activate_datagram_logging(ip, port)
@@ -50,7 +62,8 @@ class MainFacade:
         return self.activities
 
     def check_acquisition_result_files_exists(self):
-        if os.path.isfile(self.acquisition_path + ".tag.txt") and os.path.isfile(self.acquisition_path + ".rr.txt"):
+        if result_file_exists(self.acquisition_path + ".tag.txt") and \
+                result_file_exists(self.acquisition_path + ".rr.txt"):
             return True
         else:
             return False
@@ -126,14 +139,20 @@ class MainFacade:
         return devices
 
     def run_test(self, notify_window, name, mac, dev_type):
+        """
+        Connects to a device and starts its test.
+        @return: An analysis.LiveBuffer.BeatRingBuffer with the last beats received, to be plotted.
+        """
         if dev_type == "BT" and name == "Polar iWL":
             device = PolariWL(mac)
             print "Mac: {}".format(mac)
         elif dev_type == "ANT+":
             device = ANTDevice()
         device.connect()
-        self.test_thread = device.run_test(notify_window)
+        live_buffer = BeatRingBuffer()
+        self.test_thread = device.run_test(notify_window, live_buffer)
         self.testing_device = device
+        return live_buffer
 
     def end_device_test(self):
         if self.testing_device:
@@ -151,57 +170,186 @@ class MainFacade:
     def is_demo_mode(self):
         return self.conf.defaultMode == "Demo mode"
 
+    def is_replay_mode(self):
+        return self.conf.defaultMode == "Replay mode"
+
+    def get_replay_speed(self):
+        """
+        @return: Speed of replay mode (see devices.ReplayDevice.ReplayClock).
+        """
+        return dict(REPLAY_SPEEDS).get(self.conf.replaySpeed, REAL_TIME)
+
     def begin_acquisition(self, file_path, activity_id, mode, dev_name, dev_type, dev_dir=None):
-        from config import RECENT_ACQUISITIONS_COUNT
         self.acquisition_path = file_path
-        writer = TextWriter(file_path + ".tag.txt", file_path + ".rr.txt")
-        if mode == DEMO_MODE:
-            device = DemoBand()
-            activity = self.xml_mapper.get_activity(activity_id)
-            ad = AcquisitionFacade(activity, device, writer)
-            ad.start()
-        elif mode == DEVICE_CONNECTED_MODE:
-            if dev_type == "BT" and dev_name == "Polar iWL":
-                device = PolariWL(dev_dir)
-                activity = self.xml_mapper.get_activity(activity_id)
+        tag_file = file_path + ".tag.txt"
+        rr_file = file_path + ".rr.txt"
+        if self.conf.compressResults == "Yes":
+            text_writer = CompressedTextWriter(tag_file, rr_file)
+        elif self.conf.rotateRRFile == "Yes":
+            text_writer = RotatingTextWriter(tag_file, rr_file)
+        else:
+            text_writer = StreamingTextWriter(tag_file, rr_file)
+        writers = [text_writer]
+        if self.conf.binaryOutput == "Yes":
+            writers.append(BinaryWriter(file_path + ".session.bin"))
+        if self.conf.liveFeed == "Yes" and not valid_port(self.conf.liveFeedPort):
+            self.logger.warning("Live feed disabled: invalid port {0}".format(self.conf.liveFeedPort))
+        elif self.conf.liveFeed == "Yes":
+            # Live feed is best effort: records are dropped rather than delaying the acquisition
+            writers.append(AsyncWriter(NetworkWriter(self.conf.liveFeedIP, int(self.conf.liveFeedPort)),
+                                       block_on_overflow=False))
+        # Live feed and binary session are auxiliary: the acquisition goes on without them
+        writer = TeeWriter(writers, mandatory=writers[:1])
+        if self.conf.correctArtifacts == "Yes":
+            # Result files keep raw values: only live statistics get corrected values
+            self.live_writer = StatsWriter(NullWriter())
+            writer = ArtifactWriter(writer, file_path + ".artifacts.txt", corrected_writer=self.live_writer)
+        else:
+            writer = self.live_writer = StatsWriter(writer)
+        # Journal is written by the device thread before any queue or filter, so every
+        # received value can be recovered
+        writer = JournalWriter(writer, tag_file, rr_file)
+        activity = self.xml_mapper.get_activity(activity_id)
+        try:
+            if mode == DEMO_MODE:
+                device = DemoBand()
                 ad = AcquisitionFacade(activity, device, writer)
                 ad.start()
-            elif dev_type == "ANT+" and dev_name == "ANT+ HR Band":
-                device = ANTDevice()
-                activity = self.xml_mapper.get_activity(activity_id)
+            elif mode == DEVICE_CONNECTED_MODE:
+                if dev_type == "BT" and dev_name == "Polar iWL":
+                    device = PolariWL(dev_dir)
+                elif dev_type == "ANT+" and dev_name == "ANT+ HR Band":
+                    device = ANTDevice()
+                else:
+                    device = None
+                if device:
+                    if self.conf.captureRawData == "Yes":
+                        device.start_capture(file_path + CAPTURE_EXTENSION)
+                    ad = AcquisitionFacade(activity, device, writer)
+                    ad.start()
+            elif mode == REPLAY_MODE:
+                device = ReplayDevice(dev_dir, self.get_replay_speed())
                 ad = AcquisitionFacade(activity, device, writer)
                 ad.start()
+        finally:
+            self.writer_stats = writer.get_stats()
+            self.logger.info("Writer stats: {0}".format(self.writer_stats))
+            self.logger.info("Final HRV statistics: {0}".format(self.live_writer.get_snapshot()))
+        self.add_recent_acquisition(self.acquisition_path)
+        if mode == DEMO_MODE:
+            self.add_to_catalog(self.acquisition_path, activity, "Demo", "Demo band", None)
+        elif mode == REPLAY_MODE:
+            self.add_to_catalog(self.acquisition_path, activity, "Replay", os.path.basename(dev_dir), dev_dir)
+        else:
+            self.add_to_catalog(self.acquisition_path, activity, dev_type, dev_name, dev_dir)
+
+    def add_to_catalog(self, acquisition_path, activity, dev_type, dev_name, dev_dir):
+        """
+        Saves acquisition metadata and its summary statistics in acquisitions catalog.
+        Catalog errors are logged, never raised: result files are already saved.
+        @param acquisition_path: Acquisition path (without extensions).
+        @param activity: The played activity.
+        @param dev_type: Device type.
+        @param dev_name: Device name.
+        @param dev_dir: Physical address of device.
+        """
+        try:
+            # Session.load also leaves parsed arrays in analysis cache, for later plots and statistics
+            session = Session.load(acquisition_path + ".rr.txt", acquisition_path + ".tag.txt")
+            summary = summarize_rr(session.rr)
+            self.catalog.add_acquisition(acquisition_path, activity, dev_type, dev_name, dev_dir, summary)
+        except (IOError, ValueError, sqlite3.Error):
+            self.logger.exception("Acquisition couldn't be saved in catalog")
+
+    def find_acquisitions(self, **filters):
+        """
+        Looks for acquisitions in catalog. See Catalog.find_acquisitions for available filters.
+        @return: A list of catalog entries, newest first.
+        """
+        return self.catalog.find_acquisitions(**filters)
+
+    def add_recent_acquisition(self, acquisition_path):
+        from config import RECENT_ACQUISITIONS_COUNT
         # Save recent acquisition
         while len(self.recent_acquisitions) >= RECENT_ACQUISITIONS_COUNT:
             del self.recent_acquisitions[-1]
-        self.recent_acquisitions.insert(0, self.acquisition_path.encode('utf-8'))
+        self.recent_acquisitions.insert(0, acquisition_path.encode('utf-8'))
         # Save recent acquisitions to file
         with open(RECENT_ACQUISITIONS_FILE, "w") as f:
             f.write("{}".format(os.linesep).join(self.recent_acquisitions))
 
+    @staticmethod
+    def get_unfinished_acquisitions():
+        """
+        Gets journals of acquisitions interrupted by a crash.
+        @return: A list of journals.
+        """
+        return find_unfinished_journals()
+
+    def recover_acquisition(self, journal):
+        """
+        Rebuilds result files of an interrupted acquisition from its journal.
+        @param journal: The journal.
+        @return: Number of recovered rr values.
+        """
+        beats = recover_journal(journal)
+        self.logger.info("Recovered {0} rr values to {1}".format(beats, journal.rr_file))
+        self.add_recent_acquisition(journal.rr_file[:-len(".rr.txt")])
+        return beats
+
+    @staticmethod
+    def discard_unfinished_acquisition(journal):
+        discard_journal(journal)
+
     @run_in_thread
     def open_ghrv(self):
         """
         Show result data in gHRV application
         """
-        rr_file = "{}.rr.txt".format(self.acquisition_path.encode('utf-8'))
-        tag_file = "{}.tag.txt".format(self.acquisition_path.encode('utf-8'))
+        rr_file = get_plain_file("{}.rr.txt".format(self.acquisition_path.encode('utf-8')))
+        tag_file = get_plain_file("{}.tag.txt".format(self.acquisition_path.encode('utf-8')))
         os.system("/usr/bin/gHRV -loadBeatTXT {0} -loadEpTXT {1}".format(rr_file, tag_file))
 
     def plot_results(self):
         """
         Plots acquisition results in a new window
         """
-        from utils import plot
+        from utils import plot_values
+        from analysis.Session import Session
 
         rr_file = "{}.rr.txt".format(self.acquisition_path.encode('utf-8'))
         tag_file = "{}.tag.txt".format(self.acquisition_path.encode('utf-8'))
-        plot(rr_file, tag_file)
+        session = Session.load(rr_file, tag_file)
+        tags = [[beg, name, end - beg] for beg, name, end in zip(session.tag_beg, session.tag_names, session.tag_end)]
+        plot_values(session.rr, tags)
+
+    def get_hrv_statistics(self):
+        """
+        Computes time and frequency domain HRV metrics of whole acquisition and of every tag.
+        Metrics are taken from analysis cache if acquisition hasn't changed since they were computed.
+        @return: A tuple (summary, by_tag), see analysis.Report.
+        """
+        from analysis.Report import cached_hrv_statistics
 
-    def open_rr_file(self):
         rr_file = "{}.rr.txt".format(self.acquisition_path.encode('utf-8'))
+        tag_file = "{}.tag.txt".format(self.acquisition_path.encode('utf-8'))
+        return cached_hrv_statistics(rr_file, tag_file)
+
+    @run_in_thread
+    def prefetch_analysis(self):
+        """
+        Computes (or loads from analysis cache) the analysis of current acquisition in
+        background, so it's shown immediately when requested.
+        """
+        try:
+            self.get_hrv_statistics()
+        except Exception as e:
+            self.logger.warning("Unable to prefetch analysis of {0}: {1}".format(self.acquisition_path, e))
+
+    def open_rr_file(self):
+        rr_file = get_plain_file("{}.rr.txt".format(self.acquisition_path.encode('utf-8')))
         open_file(rr_file)
 
     def open_tag_file(self):
-        tag_file = "{}.tag.txt".format(self.acquisition_path.encode('utf-8'))
+        tag_file = get_plain_file("{}.tag.txt".format(self.acquisition_path.encode('utf-8')))
         open_file(tag_file)
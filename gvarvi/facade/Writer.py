@@ -2,10 +2,24 @@
 
 from datetime import timedelta
 from abc import ABCMeta, abstractmethod
+import threading
+import socket
+import Queue
+import time
 import os
 
 from logger import Logger
-from utils import FailedAcquisition
+from utils import FailedAcquisition, RRBuffer, monotonic, rr_chunk_file, rr_index_file, RR_INDEX_HEADER, compress, \
+    remove_result_file
+from utils import COMPRESSED_EXTENSION, COMPRESSED_MAGIC, COMPRESSED_FILE_HEADER, COMPRESSED_BLOCK_HEADER, \
+    COMPRESSION_CODECS
+from utils import BINARY_MAGIC, BINARY_VERSION, BINARY_FILE_HEADER, BINARY_CHUNK_HEADER, BINARY_RR_CHUNK, \
+    BINARY_TAG_CHUNK, BINARY_EVENT_CHUNK, BINARY_RR_RECORD, BINARY_TAG_RECORD, BINARY_EVENT_RECORD
+from config import RR_FLUSH_BEATS, RR_FLUSH_SECONDS, RR_FSYNC, WRITER_QUEUE_SIZE, BINARY_CHUNK_RECORDS, \
+    ROTATION_BEATS, ROTATION_SECONDS, COMPRESSION_CODEC, COMPRESSION_BLOCK_SIZE, LIVE_HR_WINDOW_SECONDS, \
+    ARTIFACT_ACTION
+from analysis.OnlineStats import OnlineHRV
+from analysis.Artifacts import StreamingArtifactFilter, DEFAULT_RULES as DEFAULT_ARTIFACT_RULES
 
 
 class IWriter:
@@ -32,6 +46,14 @@ class IWriter:
         """
         pass
 
+    def write_event(self, name):
+        """
+        Writes a device event (connection, disconnection...). Writers that don't
+        store events just ignore it.
+        @param name: Event name.
+        """
+        pass
+
     @abstractmethod
     def close_writer(self):
         """
@@ -54,14 +76,19 @@ class TextWriter(IWriter):
     @param rr_file: Absolute path to rr file.
     """
 
+    TAG_HEADER = "Init_time\tEvent\tDurat"
+
     def __init__(self, tag_file, rr_file):
         self.logger = Logger()
 
         self.tag_file = tag_file
-        with open(self.tag_file, "wt") as f:
-            f.write("Init_time\tEvent\tDurat" + os.linesep)
         self.rr_file = rr_file
-        self.rr_values = []
+        # Files of an older acquisition with the same name, in any format, would be read instead of the new ones
+        remove_result_file(self.tag_file)
+        remove_result_file(self.rr_file)
+        with open(self.tag_file, "wt") as f:
+            f.write(self.TAG_HEADER + os.linesep)
+        self.rr_values = RRBuffer()
 
     def write_tag_value(self, name, beg, end):
         """
@@ -73,25 +100,33 @@ class TextWriter(IWriter):
 
         try:
             with open(self.tag_file, "at") as f:
-                line = "{0}\t{1}\t{2:3f}".format(str(timedelta(seconds=beg)),
-                                                 name.replace(' ', '_'),
-                                                 end - beg)
-                f.write(line + os.linesep)
+                f.write(self.format_tag_line(name, beg, end) + os.linesep)
 
         except Exception as e:
             raise FailedAcquisition("Unable to write tag value in text file{0}Exception type: {1}{0}Exception "
                                     "message: {2}".format(os.linesep, type(e), e.message))
 
+    @staticmethod
+    def format_tag_line(name, beg, end):
+        """
+        Formats tag info as a line of tag text file.
+        @param name: Tag name.
+        @param beg: Begin time in seconds.
+        @param end: End time in seconds.
+        @return: The line, without line separator.
+        """
+        return "{0}\t{1}\t{2:3f}".format(str(timedelta(seconds=beg)), name.replace(' ', '_'), end - beg)
+
     def write_rr_value(self, rr):
         """
-        Writes rr value to list.
+        Writes rr value to buffer.
         @param rr: The value.
         """
         self.rr_values.append(rr)
 
     def close_writer(self):
         """
-        Writes list values to text file and closes it.
+        Writes buffer values to text file and closes it.
         """
         with open(self.rr_file, "wt") as f:
             for rr in self.rr_values:
@@ -105,3 +140,836 @@ class TextWriter(IWriter):
             os.remove(self.rr_file)
         if os.path.isfile(self.tag_file):
             os.remove(self.tag_file)
+
+
+class StreamingTextWriter(TextWriter):
+    """
+    TextWriter implementation that appends rr values to the rr text file in small
+    batches while acquisition is running, so a crash only loses the last batch and
+    memory use doesn't grow with acquisition length. Resulting files are identical
+    to the TextWriter ones.
+    @param tag_file: Absolute path to tag file.
+    @param rr_file: Absolute path to rr file.
+    @param flush_beats: Number of buffered rr values that forces a write to disk.
+    @param flush_seconds: Max time, in seconds, that a rr value stays buffered.
+    @param fsync: If True, written data is forced to disk after every flush.
+    """
+
+    def __init__(self, tag_file, rr_file, flush_beats=RR_FLUSH_BEATS, flush_seconds=RR_FLUSH_SECONDS,
+                 fsync=RR_FSYNC):
+        TextWriter.__init__(self, tag_file, rr_file)
+        self.flush_beats = flush_beats
+        self.flush_seconds = flush_seconds
+        self.fsync = fsync
+
+        # rr_values only holds the values that haven't been written yet
+        self.rr_f = self._open_rr_file()
+        self.last_flush = time.time()
+
+    def write_rr_value(self, rr):
+        """
+        Buffers rr value and writes the buffer to text file when flush policy requires it.
+        @param rr: The value.
+        """
+        self.rr_values.append(rr)
+        if len(self.rr_values) >= self.flush_beats or time.time() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes buffered rr values to text file.
+        """
+        try:
+            if self.rr_values:
+                self.rr_f.write("".join(str(rr) + os.linesep for rr in self.rr_values))
+                del self.rr_values[:]
+            self.rr_f.flush()
+            if self.fsync:
+                os.fsync(self.rr_f.fileno())
+            self.last_flush = time.time()
+
+        except Exception as e:
+            raise FailedAcquisition("Unable to write rr values in text file{0}Exception type: {1}{0}Exception "
+                                    "message: {2}".format(os.linesep, type(e), e.message))
+
+    def close_writer(self):
+        """
+        Writes remaining rr values to text file and closes it.
+        """
+        if not self.rr_f.closed:
+            self.flush()
+            self.rr_f.close()
+
+    def abort(self):
+        """
+        Abort writing operation by closing and removing both text files.
+        """
+        if not self.rr_f.closed:
+            self.rr_f.close()
+        TextWriter.abort(self)
+
+    def _open_rr_file(self):
+        return open(self.rr_file, "wt")
+
+
+class RotatingTextWriter(StreamingTextWriter):
+    """
+    StreamingTextWriter implementation that splits rr values in chunk files, starting
+    a new one every chunk_beats values or chunk_seconds seconds of acquisition, and
+    keeps an index file with the time range of every chunk (see utils.read_rr_index),
+    so long acquisitions can be read by time window without reading the whole file.
+    @param tag_file: Absolute path to tag file.
+    @param rr_file: Absolute path to rr file. Chunks and index are named after it.
+    @param chunk_beats: Max number of rr values per chunk.
+    @param chunk_seconds: Max duration, in seconds, of every chunk.
+    """
+
+    def __init__(self, tag_file, rr_file, chunk_beats=ROTATION_BEATS, chunk_seconds=ROTATION_SECONDS, **kwargs):
+        self.chunk_beats = chunk_beats
+        self.chunk_seconds = chunk_seconds
+        self.index_file = rr_index_file(rr_file)
+        self.chunk_number = 0
+        self.chunk_beg = 0
+        self.chunk_first_beat = 0
+        self.chunk_beats_written = 0
+        self.elapsed = 0  # Accumulated rr values, in ms
+        StreamingTextWriter.__init__(self, tag_file, rr_file, **kwargs)
+        with open(self.index_file, "wt") as f:
+            f.write(RR_INDEX_HEADER + os.linesep)
+
+    def write_rr_value(self, rr):
+        """
+        Buffers rr value, writes the buffer to current chunk when flush policy requires
+        it and starts a new chunk when rotation policy requires it.
+        @param rr: The value.
+        """
+        StreamingTextWriter.write_rr_value(self, rr)
+        self.elapsed += rr
+        self.chunk_beats_written += 1
+        if self.chunk_beats_written >= self.chunk_beats or self.elapsed - self.chunk_beg >= self.chunk_seconds * 1000:
+            self._rotate()
+
+    def close_writer(self):
+        """
+        Writes remaining rr values to current chunk and adds it to index.
+        """
+        if not self.rr_f.closed:
+            self._close_chunk()
+
+    def abort(self):
+        """
+        Abort writing operation by removing tag file, every chunk and index.
+        """
+        if not self.rr_f.closed:
+            self.rr_f.close()
+        for number in range(self.chunk_number + 1):
+            chunk_file = rr_chunk_file(self.rr_file, number)
+            if os.path.isfile(chunk_file):
+                os.remove(chunk_file)
+        if os.path.isfile(self.index_file):
+            os.remove(self.index_file)
+        TextWriter.abort(self)
+
+    def _rotate(self):
+        self._close_chunk()
+        self.chunk_number += 1
+        self.chunk_beg = self.elapsed
+        self.chunk_first_beat += self.chunk_beats_written
+        self.chunk_beats_written = 0
+        self.rr_f = self._open_rr_file()
+
+    def _open_rr_file(self):
+        return open(rr_chunk_file(self.rr_file, self.chunk_number), "wt")
+
+    def _close_chunk(self):
+        self.flush()
+        self.rr_f.close()
+        chunk_file = rr_chunk_file(self.rr_file, self.chunk_number)
+        if self.chunk_beats_written == 0:
+            os.remove(chunk_file)
+            return
+        with open(self.index_file, "at") as f:
+            f.write("{0}\t{1:.3f}\t{2:.3f}\t{3}\t{4}".format(os.path.basename(chunk_file), self.chunk_beg / 1000.0,
+                                                           self.elapsed / 1000.0, self.chunk_first_beat,
+                                                           self.chunk_beats_written) + os.linesep)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+
+class CompressedTextWriter(IWriter):
+    """
+    IWriter implementation that writes the same content of TextWriter files to
+    compressed result files (tag_file and rr_file plus COMPRESSED_EXTENSION).
+    Text is compressed in independent blocks as values arrive, so memory use is
+    bounded by block size and any block can be read on its own (see
+    utils.BlockCompressedFile). Blocks are only written when they are full, except
+    for tags, that are written as soon as they arrive.
+    @param tag_file: Absolute path to tag file.
+    @param rr_file: Absolute path to rr file.
+    @param codec: "zlib" or "lzma".
+    @param block_size: Uncompressed bytes per block.
+    """
+
+    def __init__(self, tag_file, rr_file, codec=COMPRESSION_CODEC, block_size=COMPRESSION_BLOCK_SIZE):
+        self.logger = Logger()
+
+        # Plain or rotated files of an older acquisition with the same name would be read instead of these
+        remove_result_file(tag_file)
+        remove_result_file(rr_file)
+        self.tag_file = tag_file + COMPRESSED_EXTENSION
+        self.rr_file = rr_file + COMPRESSED_EXTENSION
+        self.tag_compressor = BlockCompressor(self.tag_file, codec, block_size)
+        self.rr_compressor = BlockCompressor(self.rr_file, codec, block_size)
+        self.tag_compressor.write_line(TextWriter.TAG_HEADER)
+
+    def write_tag_value(self, name, beg, end):
+        """
+        Writes tag info to compressed tag file.
+        @param name: Tag name.
+        @param beg: Begin time in seconds.
+        @param end: End time in seconds.
+        """
+        try:
+            self.tag_compressor.write_line(TextWriter.format_tag_line(name, beg, end))
+            self.tag_compressor.flush()
+        except Exception as e:
+            raise FailedAcquisition("Unable to write tag value in compressed file{0}Exception type: {1}{0}Exception "
+                                    "message: {2}".format(os.linesep, type(e), e.message))
+
+    def write_rr_value(self, rr):
+        """
+        Writes rr value to compressed rr file.
+        @param rr: The value.
+        """
+        try:
+            self.rr_compressor.write_line(str(rr), rr)
+        except Exception as e:
+            raise FailedAcquisition("Unable to write rr values in compressed file{0}Exception type: {1}{0}Exception "
+                                    "message: {2}".format(os.linesep, type(e), e.message))
+
+    def close_writer(self):
+        """
+        Writes pending blocks and closes both files.
+        """
+        self.tag_compressor.close()
+        self.rr_compressor.close()
+
+    def abort(self):
+        """
+        Abort writing operation by removing both files.
+        """
+        for compressor in (self.tag_compressor, self.rr_compressor):
+            compressor.f.close()
+            if os.path.isfile(compressor.path):
+                os.remove(compressor.path)
+
+
+class BlockCompressor(object):
+    """
+    Writes text lines to a file in independently compressed blocks.
+    @param path: Absolute path to file.
+    @param codec: "zlib" or "lzma".
+    @param block_size: Uncompressed bytes per block.
+    """
+
+    def __init__(self, path, codec, block_size):
+        compress("", codec)  # Fail now if codec is not available
+        self.path = path
+        self.codec = codec
+        self.block_size = block_size
+        self.lines = []
+        self.size = 0
+        self.value_sum = 0
+        self.f = open(path, "wb")
+        self.f.write(COMPRESSED_FILE_HEADER.pack(COMPRESSED_MAGIC, COMPRESSION_CODECS[codec]))
+
+    def write_line(self, line, value=0):
+        """
+        Adds a line to current block and writes the block when it's full.
+        @param line: The line, without line separator.
+        @param value: Value added to the sum of values of the block.
+        """
+        line += os.linesep
+        self.lines.append(line)
+        self.size += len(line)
+        self.value_sum += value
+        if self.size >= self.block_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes current block, if not empty.
+        """
+        if self.lines:
+            data = "".join(self.lines)
+            compressed_data = compress(data, self.codec)
+            self.f.write(COMPRESSED_BLOCK_HEADER.pack(len(compressed_data), len(data), len(self.lines),
+                                                      self.value_sum) + compressed_data)
+            self.f.flush()
+            self.lines = []
+            self.size = 0
+            self.value_sum = 0
+
+    def close(self):
+        """
+        Writes current block and closes the file.
+        """
+        if not self.f.closed:
+            self.flush()
+            self.f.close()
+
+
+class AsyncWriter(IWriter):
+    """
+    IWriter wrapper that hands every record over a bounded queue to a dedicated
+    I/O thread, so device and player threads never wait for the disk.
+    Errors raised by the wrapped writer are logged and raised again on the next
+    call made to this object.
+    @param writer: The wrapped IWriter.
+    @param max_size: Max number of records waiting in queue.
+    @param block_on_overflow: If True, callers wait when queue is full. Otherwise the
+    record is dropped. Overflows are counted in both cases.
+    """
+
+    _STOP = object()
+
+    def __init__(self, writer, max_size=WRITER_QUEUE_SIZE, block_on_overflow=True):
+        self.logger = Logger()
+
+        self.writer = writer
+        self.block_on_overflow = block_on_overflow
+        self.queue = Queue.Queue(max_size)
+        self.error = None
+        self.stats_lock = threading.Lock()
+        self.stats = {"records": 0, "written": 0, "overflows": 0, "dropped": 0, "errors": 0,
+                      "max_queue_depth": 0, "mean_latency": 0.0, "max_latency": 0.0}
+        self._total_latency = 0.0
+
+        self.io_thread = threading.Thread(target=self._run, name="AsyncWriter")
+        self.io_thread.daemon = True
+        self.io_thread.start()
+
+    def write_tag_value(self, name, beg, end):
+        """
+        Enqueues tag info.
+        @param name: Tag name.
+        @param beg: Begin time in seconds.
+        @param end: End time in seconds.
+        """
+        self._put(self.writer.write_tag_value, (name, beg, end))
+
+    def write_rr_value(self, rr):
+        """
+        Enqueues rr value.
+        @param rr: The value.
+        """
+        self._put(self.writer.write_rr_value, (rr,))
+
+    def write_event(self, name):
+        """
+        Enqueues device event.
+        @param name: Event name.
+        """
+        self._put(self.writer.write_event, (name,))
+
+    def close_writer(self):
+        """
+        Waits until every enqueued record has been written and closes wrapped writer.
+        """
+        self._stop()
+        self.writer.close_writer()
+        self._raise_error()
+
+    def abort(self):
+        """
+        Stops I/O thread and aborts wrapped writer.
+        """
+        self._stop()
+        self.writer.abort()
+
+    def get_stats(self):
+        """
+        Gets queue and latency counters. Latencies are measured, in seconds, from the
+        moment a record is enqueued until it has been written.
+        @return: A dictionary with all counters.
+        """
+        with self.stats_lock:
+            stats = dict(self.stats)
+        stats["queue_depth"] = self.queue.qsize()
+        return stats
+
+    def _put(self, fn, args):
+        self._raise_error()
+        if not self.io_thread.is_alive():
+            self.logger.warning("Writer already closed. Value discarded")
+            return
+        record = (fn, args, time.time())
+        try:
+            self.queue.put_nowait(record)
+        except Queue.Full:
+            with self.stats_lock:
+                self.stats["overflows"] += 1
+            if self.block_on_overflow:
+                self.queue.put(record)
+            else:
+                with self.stats_lock:
+                    self.stats["dropped"] += 1
+                return
+        depth = self.queue.qsize()
+        with self.stats_lock:
+            self.stats["records"] += 1
+            if depth > self.stats["max_queue_depth"]:
+                self.stats["max_queue_depth"] = depth
+
+    def _run(self):
+        while True:
+            record = self.queue.get()
+            if record is self._STOP:
+                break
+            fn, args, t = record
+            try:
+                fn(*args)
+            except Exception as e:
+                if self.error is None:
+                    self.logger.exception("Asynchronous write failed: {0}".format(e.message))
+                    self.error = e
+                else:
+                    # Caller hasn't been notified about the previous error yet
+                    self.logger.debug("Asynchronous write failed: {0}".format(e.message))
+                with self.stats_lock:
+                    self.stats["errors"] += 1
+                continue
+            latency = time.time() - t
+            with self.stats_lock:
+                self.stats["written"] += 1
+                self._total_latency += latency
+                self.stats["mean_latency"] = self._total_latency / self.stats["written"]
+                if latency > self.stats["max_latency"]:
+                    self.stats["max_latency"] = latency
+
+    def _stop(self):
+        if self.io_thread.is_alive():
+            self.queue.put(self._STOP)
+            self.io_thread.join()
+
+    def _raise_error(self):
+        error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+
+class BinaryWriter(IWriter):
+    """
+    IWriter implementation that writes acquisition results to a chunked binary file
+    with fixed-width records. Every rr value is stored with the time, in seconds
+    since the writer was created, when write_rr_value was called (monotonic clock).
+    Use utils.read_binary_session to read it back.
+    @param session_file: Absolute path to binary session file.
+    @param chunk_records: Number of rr values per chunk.
+    """
+
+    def __init__(self, session_file, chunk_records=BINARY_CHUNK_RECORDS):
+        self.logger = Logger()
+
+        self.session_file = session_file
+        self.chunk_records = chunk_records
+        self.start = monotonic()
+        self.pending_records = []
+        self.f = open(self.session_file, "wb")
+        self.f.write(BINARY_FILE_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, BINARY_FILE_HEADER.size, time.time()))
+
+    def write_tag_value(self, name, beg, end):
+        """
+        Writes tag info as a single record chunk.
+        @param name: Tag name.
+        @param beg: Begin time in seconds.
+        @param end: End time in seconds.
+        """
+        self._write_chunk(BINARY_TAG_CHUNK, [BINARY_TAG_RECORD.pack(beg, end, self._encode(name))])
+
+    def write_rr_value(self, rr):
+        """
+        Buffers rr value with its receive time and writes a chunk when buffer is full.
+        @param rr: The value.
+        """
+        self.pending_records.append(BINARY_RR_RECORD.pack(monotonic() - self.start, rr))
+        if len(self.pending_records) >= self.chunk_records:
+            self._flush_rr_values()
+
+    def write_event(self, name):
+        """
+        Writes device event as a single record chunk.
+        @param name: Event name.
+        """
+        self._write_chunk(BINARY_EVENT_CHUNK, [BINARY_EVENT_RECORD.pack(monotonic() - self.start,
+                                                                         self._encode(name))])
+
+    def close_writer(self):
+        """
+        Writes buffered rr values and closes binary file.
+        """
+        if not self.f.closed:
+            self._flush_rr_values()
+            self.f.close()
+
+    def abort(self):
+        """
+        Abort writing operation by removing binary file.
+        """
+        if not self.f.closed:
+            self.f.close()
+        if os.path.isfile(self.session_file):
+            os.remove(self.session_file)
+
+    def _flush_rr_values(self):
+        if self.pending_records:
+            self._write_chunk(BINARY_RR_CHUNK, self.pending_records)
+            self.pending_records = []
+
+    def _write_chunk(self, chunk_type, records):
+        try:
+            payload = b"".join(records)
+            self.f.write(BINARY_CHUNK_HEADER.pack(chunk_type, len(records), len(payload)) + payload)
+            self.f.flush()
+        except Exception as e:
+            raise FailedAcquisition("Unable to write in binary file{0}Exception type: {1}{0}Exception "
+                                    "message: {2}".format(os.linesep, type(e), e.message))
+
+    @staticmethod
+    def _encode(name):
+        if isinstance(name, unicode):
+            name = name.encode("utf-8")
+        return name
+
+
+class TeeWriter(IWriter):
+    """
+    IWriter that sends every record to several writers (sinks) in one pass. Each
+    sink is fed through its own AsyncWriter, so a slow sink doesn't hold back the
+    others. An auxiliary sink that fails is logged and dropped instead of failing
+    the whole acquisition, but the failure of a mandatory sink (the result files)
+    fails it.
+    @param writers: List of sinks. Sinks that are already an AsyncWriter are used
+    as they are.
+    @param mandatory: Sinks (of writers) whose failure raises FailedAcquisition.
+    """
+
+    def __init__(self, writers, mandatory=()):
+        self.logger = Logger()
+
+        self.sinks = [w if isinstance(w, AsyncWriter) else AsyncWriter(w) for w in writers]
+        self.mandatory_sinks = [sink for w, sink in zip(writers, self.sinks)
+                                if any(w is m for m in mandatory)]
+        self.failed_sinks = []
+        self.failure = None
+
+    def write_tag_value(self, name, beg, end):
+        """
+        Sends tag info to every sink.
+        @param name: Tag name.
+        @param beg: Begin time in seconds.
+        @param end: End time in seconds.
+        """
+        self._dispatch("write_tag_value", name, beg, end)
+
+    def write_rr_value(self, rr):
+        """
+        Sends rr value to every sink.
+        @param rr: The value.
+        """
+        self._dispatch("write_rr_value", rr)
+
+    def write_event(self, name):
+        """
+        Sends device event to every sink.
+        @param name: Event name.
+        """
+        self._dispatch("write_event", name)
+
+    def close_writer(self):
+        """
+        Closes every sink.
+        @raise FailedAcquisition: If a mandatory sink or every sink has failed.
+        """
+        self._dispatch("close_writer")
+        if not self.sinks:
+            raise FailedAcquisition("Every results writer has failed")
+
+    def abort(self):
+        """
+        Aborts every sink, including the failed ones.
+        """
+        for sink in self.sinks + self.failed_sinks:
+            try:
+                sink.abort()
+            except Exception as e:
+                self.logger.exception("Unable to abort {0}: {1}".format(sink.writer.__class__.__name__, e.message))
+
+    def get_stats(self):
+        """
+        Gets queue and latency counters of every sink.
+        @return: A dictionary with counters of each sink, by writer class name.
+        """
+        stats = {}
+        for sink in self.sinks + self.failed_sinks:
+            sink_stats = sink.get_stats()
+            sink_stats["failed"] = sink in self.failed_sinks
+            name = sink.writer.__class__.__name__
+            while name in stats:
+                name += "_"
+            stats[name] = sink_stats
+        return stats
+
+    def _dispatch(self, method, *args):
+        for sink in list(self.sinks):
+            try:
+                getattr(sink, method)(*args)
+            except Exception as e:
+                if sink in self.mandatory_sinks:
+                    self.logger.exception("{0} failed: {1}".format(sink.writer.__class__.__name__, e.message))
+                    # Every later call fails too, so acquisition thread can't hide the failure
+                    self.failure = e if isinstance(e, FailedAcquisition) else FailedAcquisition(
+                        "Unable to write results{0}Exception type: {1}{0}Exception message: {2}".format(
+                            os.linesep, type(e), e.message))
+                else:
+                    self.logger.exception("{0} failed and will be dropped: {1}".format(
+                        sink.writer.__class__.__name__, e.message))
+                self.sinks.remove(sink)
+                self.failed_sinks.append(sink)
+                if method != "close_writer":
+                    self._close_failed_sink(sink)
+        if self.failure is not None:
+            raise self.failure
+        if not self.sinks and method != "close_writer":
+            raise FailedAcquisition("Every results writer has failed")
+
+    def _close_failed_sink(self, sink):
+        try:
+            sink.close_writer()
+        except Exception as e:
+            self.logger.debug("Failed sink not closed properly: {0}".format(e.message))
+
+
+class StatsWriter(IWriter):
+    """
+    IWriter that updates online HRV statistics with every rr value before passing
+    it on to another writer. Statistics can be read from any thread with
+    get_snapshot().
+    @param writer: The wrapped writer.
+    @param window_seconds: Duration of the sliding window of live heart rate.
+    """
+
+    def __init__(self, writer, window_seconds=LIVE_HR_WINDOW_SECONDS):
+        self.writer = writer
+        self.online_stats = OnlineHRV(window_seconds)
+
+    def write_tag_value(self, name, beg, end):
+        """
+        Records tag as last tag played and writes it.
+        @param name: Tag name.
+        @param beg: Begin time in seconds.
+        @param end: End time in seconds.
+        """
+        self.online_stats.set_tag(name)
+        self.writer.write_tag_value(name, beg, end)
+
+    def write_rr_value(self, rr):
+        """
+        Writes rr value and updates statistics with it. Value is written first, so it
+        is never lost because of statistics.
+        @param rr: The value.
+        """
+        self.writer.write_rr_value(rr)
+        self.online_stats.update(rr)
+
+    def write_event(self, name):
+        self.writer.write_event(name)
+
+    def close_writer(self):
+        self.writer.close_writer()
+
+    def abort(self):
+        self.writer.abort()
+
+    def get_snapshot(self):
+        """
+        Gets current HRV statistics.
+        @return: An analysis.OnlineStats.HRVSnapshot.
+        """
+        return self.online_stats.snapshot()
+
+    def get_stats(self):
+        """
+        Gets counters of the wrapped writer.
+        @return: A dictionary with counters, or None if the wrapped writer has no counters.
+        """
+        return self.writer.get_stats() if hasattr(self.writer, "get_stats") else None
+
+
+class NullWriter(IWriter):
+    """
+    IWriter that discards every record. It ends writer chains that are only used for
+    their side effects (e.g. a StatsWriter that only feeds live statistics).
+    """
+
+    def write_tag_value(self, name, beg, end):
+        pass
+
+    def write_rr_value(self, rr):
+        pass
+
+    def close_writer(self):
+        pass
+
+    def abort(self):
+        pass
+
+
+class ArtifactWriter(IWriter):
+    """
+    IWriter that detects and corrects artifacts (see analysis.Artifacts) before
+    passing rr values on to another writer. Every value is delayed until the
+    following beats needed to judge it have been received. Detected artifacts are
+    saved in an audit file when writer is closed.
+    If a corrected_writer is given, corrected values are passed on to it, and the
+    wrapped writer gets the raw values as they are received, so result files keep
+    the original series.
+    @param writer: The wrapped writer.
+    @param audit_file: Absolute path to audit file.
+    @param rules: The artifact detection rules.
+    @param action: What is done with artifacts: "flag", "interpolate" or "drop".
+    @param corrected_writer: Writer of corrected values (None: the wrapped writer).
+    """
+
+    AUDIT_HEADER = "Beat\tRR\tReasons\tAction\tValue"
+
+    def __init__(self, writer, audit_file, rules=DEFAULT_ARTIFACT_RULES, action=ARTIFACT_ACTION,
+                 corrected_writer=None):
+        self.logger = Logger()
+
+        self.writer = writer
+        self.corrected_writer = corrected_writer
+        self.audit_file = audit_file
+        self.filter = StreamingArtifactFilter(rules, action)
+
+    def _writers(self):
+        return [self.writer] if self.corrected_writer is None else [self.writer, self.corrected_writer]
+
+    def write_tag_value(self, name, beg, end):
+        """
+        Writes tag info.
+        @param name: Tag name.
+        @param beg: Begin time in seconds.
+        @param end: End time in seconds.
+        """
+        for writer in self._writers():
+            writer.write_tag_value(name, beg, end)
+
+    def write_rr_value(self, rr):
+        """
+        Adds rr value to artifact filter and writes values that leave it.
+        @param rr: The value.
+        """
+        if self.corrected_writer is None:
+            for value in self.filter.push(rr):
+                self.writer.write_rr_value(value)
+        else:
+            self.writer.write_rr_value(rr)
+            for value in self.filter.push(rr):
+                self.corrected_writer.write_rr_value(value)
+
+    def write_event(self, name):
+        for writer in self._writers():
+            writer.write_event(name)
+
+    def close_writer(self):
+        """
+        Writes values left in artifact filter, saves audit file and closes wrapped writers.
+        """
+        for value in self.filter.flush():
+            self._writers()[-1].write_rr_value(value)
+        try:
+            with open(self.audit_file, "wt") as f:
+                f.write(self.AUDIT_HEADER + os.linesep)
+                for entry in self.filter.audit:
+                    f.write("{0}\t{1}\t{2}\t{3}\t{4}{5}".format(entry.index, entry.rr, entry.reasons, entry.action,
+                                                               "" if entry.value is None else entry.value,
+                                                               os.linesep))
+        except IOError as e:
+            self.logger.error("Unable to save artifacts audit file: {0}".format(e))
+        self.logger.info("{0} artifacts detected".format(len(self.filter.audit)))
+        for writer in reversed(self._writers()):
+            writer.close_writer()
+
+    def abort(self):
+        for writer in self._writers():
+            writer.abort()
+
+    def get_snapshot(self):
+        return self._writers()[-1].get_snapshot()
+
+    def get_stats(self):
+        return self.writer.get_stats() if hasattr(self.writer, "get_stats") else None
+
+
+class NetworkWriter(IWriter):
+    """
+    IWriter implementation that sends acquisition results, as they arrive, to a
+    remote host as UDP datagrams with one tab separated record each:
+    RR <value> <seconds since start>, TAG <beg> <end> <name>, EVENT <name> and END.
+    @param ip: IP of remote host.
+    @param port: UDP port of remote host.
+    """
+
+    def __init__(self, ip, port):
+        self.logger = Logger()
+
+        self.address = (ip, port)
+        self.start = monotonic()
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def write_tag_value(self, name, beg, end):
+        """
+        Sends tag info.
+        @param name: Tag name.
+        @param beg: Begin time in seconds.
+        @param end: End time in seconds.
+        """
+        if isinstance(name, unicode):
+            name = name.encode("utf-8")
+        self._send("TAG\t{0!r}\t{1!r}\t{2}".format(beg, end, name))
+
+    def write_rr_value(self, rr):
+        """
+        Sends rr value.
+        @param rr: The value.
+        """
+        self._send("RR\t{0}\t{1:.3f}".format(rr, monotonic() - self.start))
+
+    def write_event(self, name):
+        """
+        Sends device event.
+        @param name: Event name.
+        """
+        self._send("EVENT\t{0}".format(name))
+
+    def close_writer(self):
+        """
+        Notifies the end of the acquisition and closes the socket.
+        """
+        self._send("END")
+        self.socket.close()
+
+    def abort(self):
+        """
+        Closes the socket.
+        """
+        self.socket.close()
+
+    def _send(self, record):
+        try:
+            self.socket.sendto(record, self.address)
+        except socket.error as e:
+            raise FailedAcquisition("Unable to send results to {0}:{1}{2}Exception message: {3}".format(
+                self.address[0], self.address[1], os.linesep, e))
@@ -7,7 +7,7 @@ import sys
 import traceback
 
 from config import CONF_DIR, DEFAULT_CONF_FILE, DEFAULT_ACTIV_FILE, CONF_FILE, ACTIV_FILE, LOG_FILE, \
-    RECENT_ACQUISITIONS_FILE
+    RECENT_ACQUISITIONS_FILE, JOURNAL_DIR
 from logger import Logger
 
 
@@ -25,6 +25,8 @@ if not os.path.isfile(LOG_FILE):
     open(LOG_FILE, 'a').close()
 if not os.path.isfile(RECENT_ACQUISITIONS_FILE):
     open(RECENT_ACQUISITIONS_FILE, 'a').close()
+if not os.path.isdir(JOURNAL_DIR):
+    os.mkdir(JOURNAL_DIR)
 
 from facade.MainFacade import MainFacade
 # Application logger initialization
@@ -118,4 +120,5 @@ from view.MainWindow import MainWindow
 app = GVarviApp()
 frame = MainWindow("gVARVI", main_facade)
 frame.Show()
+wx.CallAfter(frame.check_unfinished_acquisitions)
 app.MainLoop()
@@ -0,0 +1,106 @@
+# coding=utf-8
+
+import struct
+import unittest
+
+from devices.PolarProtocol import PolarStreamParser, FRAME_START, MIN_FRAME_LENGTH
+from devices.ReceiveBuffer import ReceiveBuffer
+
+
+def polar_frame(rr, sequence=0, hr=70):
+    """
+    Builds a valid Polar frame.
+    @param rr: List of rr values.
+    @return: Frame bytes.
+    """
+    length = MIN_FRAME_LENGTH + 2 * len(rr)
+    return struct.pack(">BBBBBB{0}H".format(len(rr)), FRAME_START, length, 255 - length, sequence, 0, hr, *rr)
+
+
+class PolarStreamParserTest(unittest.TestCase):
+    def setUp(self):
+        self.parser = PolarStreamParser()
+        self.frames = [polar_frame([800 + i, 810 + i], sequence=i) for i in range(3)]
+
+    def parse(self, data):
+        return [frame.rr for frame in self.parser.parse(data)]
+
+    def assertStats(self, frames, dropped_bytes=0, dropped_frames=0, recovered_frames=0):
+        self.assertEqual(self.parser.get_stats(), {"frames": frames, "dropped_bytes": dropped_bytes,
+                                                   "dropped_frames": dropped_frames,
+                                                   "recovered_frames": recovered_frames})
+
+    def test_clean_stream(self):
+        self.assertEqual(self.parse(b"".join(self.frames)), [(800, 810), (801, 811), (802, 812)])
+        self.assertStats(3)
+
+    def test_byte_by_byte(self):
+        rr = []
+        for b in b"".join(self.frames):
+            rr += self.parse(b)
+        self.assertEqual(rr, [(800, 810), (801, 811), (802, 812)])
+        self.assertStats(3)
+
+    def test_stream_bigger_than_buffer(self):
+        self.parser = PolarStreamParser(ReceiveBuffer(capacity=32))
+        frames = [polar_frame([700 + i], sequence=i % 256) for i in range(100)]
+        self.assertEqual(self.parse(b"".join(frames)), [(700 + i,) for i in range(100)])
+        self.assertStats(100)
+
+    def test_leading_garbage(self):
+        self.assertEqual(self.parse(b"\x01\x02\x03" + b"".join(self.frames)), [(800, 810), (801, 811), (802, 812)])
+        self.assertStats(3, dropped_bytes=3, dropped_frames=1, recovered_frames=1)
+
+    def test_garbage_between_frames(self):
+        # A frame followed by garbage is dropped too, as its length can't be trusted
+        data = self.frames[0] + b"\x00\x11\x22\x33\x44" + self.frames[1] + self.frames[2]
+        self.assertEqual(self.parse(data), [(801, 811), (802, 812)])
+        self.assertStats(2, dropped_bytes=len(self.frames[0]) + 5, dropped_frames=1, recovered_frames=1)
+
+    def test_bad_checksum(self):
+        fake = bytearray(self.frames[1])
+        fake[2] ^= 0x01
+        data = self.frames[0] + bytes(fake) + self.frames[2] + self.frames[0]
+        self.assertEqual(self.parse(data), [(800, 810), (802, 812), (800, 810)])
+        self.assertStats(3, dropped_bytes=len(fake), dropped_frames=1, recovered_frames=1)
+
+    def test_bad_length(self):
+        # Odd length (with a matching checksum) can't be a frame
+        fake = struct.pack(">BBBBBBB", FRAME_START, 7, 248, 0, 0, 70, 3)
+        data = self.frames[0] + fake + self.frames[1] + self.frames[2]
+        self.assertEqual(self.parse(data), [(800, 810), (801, 811), (802, 812)])
+        self.assertStats(3, dropped_bytes=len(fake), dropped_frames=1, recovered_frames=1)
+
+    def test_fake_header_in_garbage(self):
+        # Looks like a valid frame, but it isn't followed by a header byte
+        fake = polar_frame([], hr=1) + b"\x11"
+        data = b"\x01\x02" + fake + self.frames[0] + self.frames[1]
+        self.assertEqual(self.parse(data), [(800, 810), (801, 811)])
+        self.assertStats(2, dropped_bytes=2 + len(fake), dropped_frames=1, recovered_frames=1)
+
+    def test_truncated_frame(self):
+        self.assertEqual(self.parse(self.frames[0][:4]), [])
+        self.assertStats(0)
+        self.assertEqual(self.parse(self.frames[1] + self.frames[2]), [(801, 811), (802, 812)])
+        self.assertStats(2, dropped_bytes=4, dropped_frames=1, recovered_frames=1)
+
+    def test_incomplete_frame_is_kept(self):
+        self.assertEqual(self.parse(self.frames[0] + self.frames[1][:5]), [(800, 810)])
+        self.assertEqual(self.parse(self.frames[1][5:]), [(801, 811)])
+        self.assertStats(2)
+
+    def test_recovered_frame_waits_for_next_header(self):
+        # While synchronization is lost, a frame is only accepted when next header byte is received
+        self.assertEqual(self.parse(b"\x01" + self.frames[0]), [])
+        self.assertEqual(self.parse(self.frames[1]), [(800, 810), (801, 811)])
+        self.assertStats(2, dropped_bytes=1, dropped_frames=1, recovered_frames=1)
+
+    def test_several_losses(self):
+        data = b"\x01" + self.frames[0] + self.frames[1] + b"\x02\x03" + self.frames[2] + self.frames[0] + \
+            self.frames[1]
+        self.assertEqual(self.parse(data), [(800, 810), (802, 812), (800, 810), (801, 811)])
+        self.assertStats(4, dropped_bytes=1 + len(self.frames[1]) + 2, dropped_frames=2, recovered_frames=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+# coding=utf-8
+
+import socket
+import unittest
+
+from devices.ReceiveBuffer import ReceiveBuffer
+
+
+class ReceiveBufferFillTest(unittest.TestCase):
+    def setUp(self):
+        self.device, self.sock = socket.socketpair()
+        self.buffer = ReceiveBuffer(capacity=16)
+
+    def tearDown(self):
+        self.device.close()
+        self.sock.close()
+
+    def assertStats(self, bytes_read, reads, syscalls, timeouts=0):
+        self.assertEqual(self.buffer.get_stats(), {"bytes_read": bytes_read, "reads": reads, "syscalls": syscalls,
+                                                   "timeouts": timeouts})
+
+    def test_single_read(self):
+        self.device.sendall(b"abcdef")
+        self.assertEqual(self.buffer.fill(self.sock), 6)
+        self.assertEqual(bytes(self.buffer.buffer[self.buffer.start:self.buffer.end]), b"abcdef")
+        self.assertStats(6, 1, 1)
+
+    def test_timeout(self):
+        self.assertEqual(self.buffer.fill(self.sock, timeout=0.01), 0)
+        self.assertEqual(len(self.buffer), 0)
+        self.assertStats(0, 0, 1, timeouts=1)
+        self.device.sendall(b"abc")
+        self.assertEqual(self.buffer.fill(self.sock, timeout=1), 3)
+        # Every wait is a syscall too
+        self.assertStats(3, 1, 3, timeouts=1)
+
+    def test_read_up_to_free_space(self):
+        self.device.sendall(b"0123456789abcdefXYZ")
+        self.assertEqual(self.buffer.fill(self.sock), 16)
+        self.buffer.consume(10)
+        # Unparsed bytes are moved to the beginning to make room
+        self.assertEqual(self.buffer.fill(self.sock), 3)
+        self.assertEqual(self.buffer.start, 0)
+        self.assertEqual(bytes(self.buffer.buffer[:len(self.buffer)]), b"abcdefXYZ")
+        self.assertStats(19, 2, 2)
+
+    def test_consumed_buffer_is_reused(self):
+        for data in (b"abcdefghij", b"klmnopqrst"):
+            self.device.sendall(data)
+            self.assertEqual(self.buffer.fill(self.sock), 10)
+            self.assertEqual(bytes(self.buffer.buffer[self.buffer.start:self.buffer.end]), data)
+            self.buffer.consume(10)
+        self.assertEqual(len(self.buffer), 0)
+        self.assertStats(20, 2, 2)
+
+    def test_socket_without_recv_into(self):
+        class RecvOnly(object):
+            def __init__(self, sock):
+                self.sock = sock
+
+            def recv(self, n):
+                return self.sock.recv(n)
+
+        self.device.sendall(b"abc")
+        self.assertEqual(self.buffer.fill(RecvOnly(self.sock)), 3)
+        self.assertEqual(bytes(self.buffer.buffer[:3]), b"abc")
+        self.assertStats(3, 1, 1)
+
+    def test_connection_closed(self):
+        self.device.close()
+        self.assertRaises(ValueError, self.buffer.fill, self.sock, 1)
+        self.assertStats(0, 0, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,15 @@
 # coding=utf-8
+import errno
+import hashlib
 import os
+import re
 import shutil
 import tarfile
+import struct
+import mmap
+import zlib
+from array import array
+import time
 import sys
 
 __author__ = 'nico'
@@ -9,30 +17,100 @@ __author__ = 'nico'
 import threading
 import contextlib
 import itertools
+import tempfile
+from collections import namedtuple
 import wave
 import logging
-import wx
 from random import shuffle
 
-import mutagen.mp3
+try:
+    import wx
+except ImportError:
+    wx = None  # Headless tools (see batch.py) don't use GUI helpers
 
-from config import EVT_RESULT_ID, SUPPORTED_IMG_EXTENSIONS
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None  # Only zlib compression available
+
+from config import SUPPORTED_IMG_EXTENSIONS, PLAIN_FILES_DIR
+
+
+# Binary session format
+# --------------------------------
+# File header: magic, version, header size and session start time (epoch seconds).
+# Then any number of chunks: chunk header (type, record count and payload size)
+# followed by count fixed-width records of the type.
+
+BINARY_MAGIC = b"GVSB"
+BINARY_VERSION = 1
+BINARY_FILE_HEADER = struct.Struct("<4sHHd")
+BINARY_CHUNK_HEADER = struct.Struct("<4sII")
+BINARY_RR_CHUNK = b"RRVL"
+BINARY_TAG_CHUNK = b"TAGS"
+BINARY_EVENT_CHUNK = b"EVNT"
+BINARY_RR_RECORD = struct.Struct("<dI")
+BINARY_TAG_RECORD = struct.Struct("<dd32s")
+BINARY_EVENT_RECORD = struct.Struct("<d32s")
+BINARY_RR_DTYPE = [("timestamp", "<f8"), ("rr", "<u4")]
+BINARY_TAG_DTYPE = [("beg", "<f8"), ("end", "<f8"), ("name", "S32")]
+BINARY_EVENT_DTYPE = [("timestamp", "<f8"), ("name", "S32")]
+
+
+# Rotated rr files
+# --------------------------------
+# A rotated rr file is split in chunk files (name.rr.000.txt, name.rr.001.txt...)
+# with the same format as a plain rr file, plus an index file (name.rr.idx) with
+# one line per finished chunk: chunk file name, begin and end time (in seconds,
+# from the accumulated rr values), index of the first beat and number of beats.
+
+RR_INDEX_HEADER = "Chunk\tInit_time\tEnd_time\tFirst_beat\tBeats"
+RRChunk = namedtuple("RRChunk", ["path", "beg", "end", "first_beat", "beats"])
+
+
+# Compressed result files
+# --------------------------------
+# Same text as plain result files, split at line boundaries in blocks that are
+# compressed independently. File header: magic and codec. Every block: block
+# header (compressed size, uncompressed size, number of lines and sum of the
+# values of the block, only used for rr files) followed by compressed data.
+
+COMPRESSED_EXTENSION = ".gvz"
+COMPRESSED_MAGIC = b"GVZ1"
+COMPRESSED_FILE_HEADER = struct.Struct("<4sB3x")
+COMPRESSED_BLOCK_HEADER = struct.Struct("<IIIQ")
+COMPRESSION_CODECS = {"zlib": 1, "lzma": 2}
+CompressedBlock = namedtuple("CompressedBlock", ["offset", "compressed_size", "size", "first_line", "lines",
+                                                 "beg", "value_sum"])
+
+# Result file parsers
+# --------------------------------
+MalformedLine = namedtuple("MalformedLine", ["file", "line", "text"])
+TagArrays = namedtuple("TagArrays", ["beg", "names", "duration"])
+# Bytes that can be found in a rr file line (digits and line separators)
+INT_LINE_BYTES = b"0123456789\r\n"
 
 
 # Custom classes
 # --------------------------------
 
 
-class ResultEvent(wx.PyEvent):
-    """
-    Simple event to carry arbitrary result data.
-    @param data: The data to be carried
-    """
+if wx is not None:
+    from config import EVT_RESULT_ID
+
+    class ResultEvent(wx.PyEvent):
+        """
+        Simple event to carry arbitrary result data.
+        @param data: The data to be carried
+        """
 
-    def __init__(self, data):
-        wx.PyEvent.__init__(self)
-        self.SetEventType(EVT_RESULT_ID)
-        self.data = data
+        def __init__(self, data):
+            wx.PyEvent.__init__(self)
+            self.SetEventType(EVT_RESULT_ID)
+            self.data = data
 
 
 class Singleton(type):
@@ -69,6 +147,240 @@ class CustomConsoleHandler(logging.StreamHandler):
         self.flush()
 
 
+class RRBuffer(object):
+    """
+    Compact container for rr values (in ms). Values are stored in a typed array of
+    unsigned shorts, switching to unsigned ints if any value doesn't fit, instead
+    of a list of Python ints.
+    @param values: Optional iterable with initial values.
+    """
+
+    def __init__(self, values=()):
+        self.values = array("H")
+        self.extend(values)
+
+    def append(self, rr):
+        """
+        Adds a value at the end of the buffer.
+        @param rr: The value.
+        """
+        try:
+            self.values.append(rr)
+        except OverflowError:
+            self._promote()
+            self.values.append(rr)
+
+    def extend(self, values):
+        """
+        Adds every value of an iterable at the end of the buffer.
+        @param values: The iterable.
+        """
+        for rr in values:
+            self.append(rr)
+
+    @classmethod
+    def from_numpy(cls, values):
+        """
+        Builds a buffer from a numpy array of integer values, without per value conversions.
+        @param values: The numpy array.
+        @return: The buffer.
+        """
+        import numpy as np
+
+        buf = cls()
+        if len(values) and values.max() > 0xFFFF:
+            buf.values = array("I", np.asarray(values, dtype=np.dtype("I")).tostring())
+        else:
+            buf.values = array("H", np.asarray(values, dtype=np.dtype("H")).tostring())
+        return buf
+
+    def tolist(self):
+        """
+        @return: A list with all values.
+        """
+        return self.values.tolist()
+
+    def as_numpy(self):
+        """
+        Gets a numpy array that shares memory with the buffer (no copy). The array
+        is only valid while the buffer isn't modified.
+        @return: The numpy array.
+        """
+        import numpy as np
+
+        return np.frombuffer(self.values, dtype=np.dtype(self.values.typecode))
+
+    @property
+    def nbytes(self):
+        """
+        Memory used by stored values, in bytes.
+        """
+        return len(self.values) * self.values.itemsize
+
+    def _promote(self):
+        self.values = array("I", self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __getitem__(self, item):
+        return self.values[item]
+
+    def __delitem__(self, item):
+        del self.values[item]
+
+    def __eq__(self, other):
+        return list(self.values) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "RRBuffer({0})".format(self.values.tolist())
+
+
+class BlockCompressedFile(object):
+    """
+    Reader for compressed result files (see CompressedTextWriter). Only block
+    headers are read on opening, so any block can be decompressed on its own.
+    Blocks of an interrupted acquisition that were not completely written are ignored.
+    @param path: Path to compressed file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.blocks = []
+        with open(path, "rb") as f:
+            magic, codec_id = COMPRESSED_FILE_HEADER.unpack(f.read(COMPRESSED_FILE_HEADER.size))
+            if magic != COMPRESSED_MAGIC or codec_id not in COMPRESSION_CODECS.values():
+                raise IOError("Not a valid compressed result file: {0}".format(path))
+            self.codec = [name for name, value in COMPRESSION_CODECS.items() if value == codec_id][0]
+            size = os.fstat(f.fileno()).st_size
+            offset = COMPRESSED_FILE_HEADER.size
+            first_line = 0
+            beg = 0
+            while offset + COMPRESSED_BLOCK_HEADER.size <= size:
+                f.seek(offset)
+                compressed_size, block_size, lines, value_sum = COMPRESSED_BLOCK_HEADER.unpack(
+                    f.read(COMPRESSED_BLOCK_HEADER.size))
+                offset += COMPRESSED_BLOCK_HEADER.size
+                if offset + compressed_size > size:
+                    break  # Truncated block
+                self.blocks.append(CompressedBlock(offset, compressed_size, block_size, first_line, lines, beg,
+                                                   value_sum))
+                offset += compressed_size
+                first_line += lines
+                beg += value_sum
+
+    def read_block(self, number):
+        """
+        Decompresses a block.
+        @param number: Block number.
+        @return: Block text.
+        """
+        block = self.blocks[number]
+        with open(self.path, "rb") as f:
+            f.seek(block.offset)
+            return decompress(f.read(block.compressed_size), self.codec)
+
+    def iter_lines(self, blocks=None):
+        """
+        Iterates over text lines, decompressing one block at a time.
+        @param blocks: Block numbers to read. All by default.
+        """
+        if blocks is None:
+            blocks = range(len(self.blocks))
+        for number in blocks:
+            for l in self.read_block(number).splitlines(True):
+                yield l
+
+    def blocks_in_window(self, beg, end):
+        """
+        Gets the blocks of a rr file whose values fall in a time window.
+        @param beg: Window begin, in ms.
+        @param end: Window end, in ms.
+        @return: List of block numbers.
+        """
+        return [i for i, block in enumerate(self.blocks) if block.beg + block.value_sum > beg and block.beg < end]
+
+
+class BinarySession(object):
+    """
+    Read only view of a binary session file (see BinaryWriter). The file is memory
+    mapped and every section is returned as numpy arrays that point to the mapped
+    data, so nothing is copied until values are actually used.
+    @param session_file: Path to binary session file.
+    """
+
+    def __init__(self, session_file):
+        import numpy as np
+
+        with open(session_file, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, header_size, self.start_time = BINARY_FILE_HEADER.unpack_from(self.mm, 0)
+        if magic != BINARY_MAGIC or version != BINARY_VERSION:
+            raise IOError("Not a valid binary session file: {0}".format(session_file))
+
+        self.dtypes = {BINARY_RR_CHUNK: np.dtype(BINARY_RR_DTYPE),
+                       BINARY_TAG_CHUNK: np.dtype(BINARY_TAG_DTYPE),
+                       BINARY_EVENT_CHUNK: np.dtype(BINARY_EVENT_DTYPE)}
+        self.chunks = {chunk_type: [] for chunk_type in self.dtypes}
+        offset = header_size
+        size = len(self.mm)
+        while offset + BINARY_CHUNK_HEADER.size <= size:
+            chunk_type, count, length = BINARY_CHUNK_HEADER.unpack_from(self.mm, offset)
+            offset += BINARY_CHUNK_HEADER.size
+            if offset + length > size:
+                break  # Truncated chunk (interrupted acquisition)
+            if chunk_type in self.dtypes:
+                self.chunks[chunk_type].append(np.frombuffer(self.mm, dtype=self.dtypes[chunk_type],
+                                                             count=count, offset=offset))
+            offset += length
+
+    def _section(self, chunk_type):
+        import numpy as np
+
+        chunks = self.chunks[chunk_type]
+        if len(chunks) == 1:
+            return chunks[0]
+        elif not chunks:
+            return np.empty(0, dtype=self.dtypes[chunk_type])
+        return np.concatenate(chunks)
+
+    @property
+    def rr_chunks(self):
+        """
+        List of array views (one per chunk) with 'timestamp' and 'rr' fields.
+        """
+        return self.chunks[BINARY_RR_CHUNK]
+
+    @property
+    def beats(self):
+        """
+        Array with 'timestamp' (seconds since session start) and 'rr' (ms) fields.
+        Only copied when session has more than one rr chunk.
+        """
+        return self._section(BINARY_RR_CHUNK)
+
+    @property
+    def tags(self):
+        """
+        Array with 'beg', 'end' (seconds) and 'name' (utf-8 encoded) fields.
+        """
+        return self._section(BINARY_TAG_CHUNK)
+
+    @property
+    def events(self):
+        """
+        Array with 'timestamp' (seconds since session start) and 'name' (utf-8 encoded) fields.
+        """
+        return self._section(BINARY_EVENT_CHUNK)
+
+
 # Custom functions
 # --------------------------------
 
@@ -87,6 +399,76 @@ def run_in_thread(fn):
     return _run
 
 
+def process_is_running(pid):
+    """
+    Checks if a process is running. A process that has ended and whose pid has
+    been reused by another one is taken as running.
+    @param pid: Process id.
+    @return: True if there is a process with that pid.
+    """
+    if sys.platform == "win32":
+        import ctypes
+
+        process_query_limited_information = 0x1000
+        still_active = 259
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(process_query_limited_information, False, pid)
+        if not handle:
+            return False
+        try:
+            exit_code = ctypes.c_ulong()
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))) and \
+                exit_code.value == still_active
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        # EPERM: process exists but belongs to another user
+        return e.errno == errno.EPERM
+    return True
+
+
+def monotonic():
+    """
+    Gets the value, in seconds, of a clock that can't go backwards (unlike time.time,
+    that changes with system clock adjustments). Falls back to time.time when
+    there is no monotonic clock available.
+    @return: Clock value in seconds
+    """
+    return _monotonic()
+
+
+def _get_monotonic_clock():
+    if hasattr(time, "monotonic"):
+        return time.monotonic
+    try:
+        import ctypes
+        import ctypes.util
+
+        class Timespec(ctypes.Structure):
+            _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+        librt = ctypes.CDLL(ctypes.util.find_library("rt") or "librt.so.1", use_errno=True)
+        clock_gettime = librt.clock_gettime
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(Timespec)]
+        clock_monotonic = 1
+
+        def _clock():
+            ts = Timespec()
+            if clock_gettime(clock_monotonic, ctypes.byref(ts)) != 0:
+                return time.time()
+            return ts.tv_sec + ts.tv_nsec * 1e-9
+
+        _clock()
+        return _clock
+    except (OSError, AttributeError):
+        return time.time
+
+
+_monotonic = _get_monotonic_clock()
+
+
 def get_sound_length(sound_path):
     """
     Gets total duration of a sound
@@ -101,6 +483,8 @@ def get_sound_length(sound_path):
     extension = sound_path.split(".")[-1]
     assert isinstance(sound_path, str)
     if extension in _combinations("mp3"):
+        import mutagen.mp3
+
         return mutagen.mp3.MP3(sound_path).info.length
     elif extension in _combinations("wav"):
         with contextlib.closing(wave.open(sound_path, 'r')) as f:
@@ -131,6 +515,18 @@ def unpack_tar_file_and_remove(tar_path, dst_path):
         f.extractall(dst_path)
 
 
+def valid_port(port):
+    """
+    Checks if a value is a valid port number
+    @param port: The value (string or integer)
+    @return: True if value is a port number between 1 and 65535. Otherwise returns False
+    """
+    try:
+        return 1 <= int(port) <= 65535
+    except (TypeError, ValueError):
+        return False
+
+
 def valid_ip(address):
     """
     Checks if an string is an IP
@@ -164,34 +560,494 @@ def hex2bin(a):
         return hex2bin(a)[4:]
 
 
+def compress(data, codec):
+    """
+    Compresses a block of data
+    @param data: The data
+    @param codec: "zlib" or "lzma"
+    @return: Compressed data
+    """
+    if codec == "lzma":
+        if lzma is None:
+            raise ValueError("lzma compression is not available")
+        return lzma.compress(data)
+    return zlib.compress(data)
+
+
+def decompress(data, codec):
+    """
+    Decompresses a block of data
+    @param data: Compressed data
+    @param codec: "zlib" or "lzma"
+    @return: The data
+    """
+    if codec == "lzma":
+        if lzma is None:
+            raise ValueError("lzma compression is not available")
+        return lzma.decompress(data)
+    return zlib.decompress(data)
+
+
+def is_compressed_file(path):
+    """
+    Checks if a result file has been compressed
+    @param path: Path to result file (without compressed extension)
+    @return: True if there is no plain file but there is a compressed one
+    """
+    return not os.path.isfile(path) and os.path.isfile(path + COMPRESSED_EXTENSION)
+
+
+def result_file_exists(path):
+    """
+    Checks if a result file exists, either plain, rotated or compressed
+    @param path: Path to result file
+    @return: True if result file exists
+    """
+    return os.path.isfile(path) or os.path.isfile(rr_index_file(path)) or \
+        os.path.isfile(path + COMPRESSED_EXTENSION)
+
+
+def result_file_stamp(path):
+    """
+    Identifies current contents of a result file, either plain, rotated or compressed
+    @param path: Path to result file
+    @return: A tuple (real path, size, modification time), or None if result file doesn't exist
+    """
+    for real_path in (path, path + COMPRESSED_EXTENSION, rr_index_file(path)):
+        if os.path.isfile(real_path):
+            st = os.stat(real_path)
+            return os.path.abspath(real_path), st.st_size, st.st_mtime
+    return None
+
+
+def _iter_result_lines(path):
+    """
+    Iterates over the lines of a plain or compressed result file
+    @param path: Path to result file
+    """
+    if is_compressed_file(path):
+        for l in BlockCompressedFile(path + COMPRESSED_EXTENSION).iter_lines():
+            yield l
+    else:
+        with open(path, "rt") as f:
+            for l in f:
+                yield l
+
+
+def rr_chunk_file(rr_file, number):
+    """
+    Gets the path of a chunk of a rotated rr file
+    @param rr_file: Path to rr file
+    @param number: Chunk number, starting at 0
+    @return: Path to chunk file
+    """
+    base, extension = os.path.splitext(rr_file)
+    return "{0}.{1:03d}{2}".format(base, number, extension)
+
+
+def rr_index_file(rr_file):
+    """
+    Gets the path of the index file of a rotated rr file
+    @param rr_file: Path to rr file
+    @return: Path to index file
+    """
+    return os.path.splitext(rr_file)[0] + ".idx"
+
+
+def is_rotated_rr_file(rr_file):
+    """
+    Checks if a rr file has been split in chunks
+    @param rr_file: Path to rr file
+    @return: True if there is no plain rr file but there is an index of chunks
+    """
+    return not os.path.isfile(rr_file) and os.path.isfile(rr_index_file(rr_file))
+
+
+def read_rr_index(rr_file):
+    """
+    Reads the index of a rotated rr file. If the acquisition was interrupted, the
+    chunk being written (not indexed yet) is also returned, with infinite end time
+    and unknown (None) number of beats
+    @param rr_file: Path to rr file
+    @return: A list of RRChunk namedtuples
+    """
+    folder = os.path.dirname(rr_file)
+    chunks = []
+    with open(rr_index_file(rr_file), "rt") as f:
+        next(f)  # Skipping header row
+        for l in f:
+            name, beg, end, first_beat, beats = l.split("\t")
+            chunks.append(RRChunk(os.path.join(folder, name), float(beg), float(end), int(first_beat), int(beats)))
+    pending_chunk = rr_chunk_file(rr_file, len(chunks))
+    if os.path.isfile(pending_chunk):
+        if chunks:
+            last = chunks[-1]
+            chunks.append(RRChunk(pending_chunk, last.end, float("inf"), last.first_beat + last.beats, None))
+        else:
+            chunks.append(RRChunk(pending_chunk, 0.0, float("inf"), 0, None))
+    return chunks
+
+
+def remove_result_file(path):
+    """
+    Removes every format of a result file: plain, compressed and rotated (every chunk
+    and the index). Writers call it before writing, so the files of an older
+    acquisition with the same name are never read instead of the new ones
+    @param path: Path to result file
+    """
+    folder = os.path.dirname(path) or "."
+    base, extension = os.path.splitext(os.path.basename(path))
+    chunk_pattern = re.compile(r"{0}\.\d{{3,}}{1}$".format(re.escape(base), re.escape(extension)))
+    stale_files = [path, path + COMPRESSED_EXTENSION, rr_index_file(path)]
+    if os.path.isdir(folder):
+        stale_files += [os.path.join(folder, name) for name in os.listdir(folder) if chunk_pattern.match(name)]
+    for stale_file in stale_files:
+        if os.path.isfile(stale_file):
+            os.remove(stale_file)
+
+
+def _read_result_file(path):
+    """
+    Reads the whole contents of a plain or compressed result file
+    @param path: Path to result file
+    @return: File contents
+    """
+    if is_compressed_file(path):
+        compressed_file = BlockCompressedFile(path + COMPRESSED_EXTENSION)
+        return b"".join(compressed_file.read_block(i) for i in range(len(compressed_file.blocks)))
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _report_malformed(malformed, source, lines):
+    """
+    Logs malformed lines found by a parser and adds them to caller's list
+    """
+    if not lines:
+        return
+    from logger import Logger
+
+    Logger().warning("{0} malformed lines skipped in {1} (first one, line {2}: {3!r})".format(
+        len(lines), source, lines[0].line, lines[0].text))
+    if malformed is not None:
+        malformed.extend(lines)
+
+
+def _bulk_parse_ints(data):
+    """
+    Parses text with an integer per line (and nothing else) with a single numpy call
+    """
+    import numpy as np
+
+    # numpy parses a text without numbers as [0]
+    if not data.strip():
+        return np.empty(0, dtype=np.int64)
+    return np.fromstring(data, dtype=np.int64, sep="\n")
+
+
+def _parse_int_line(text):
+    """
+    Parses a line with a positive integer
+    @return: The integer, or None if line is malformed
+    """
+    try:
+        value = int(text)
+    except ValueError:
+        return None
+    return value if value > 0 else None
+
+
+def _parse_int_lines_slowly(data, source):
+    """
+    Parses text with a positive integer per line, one line at a time
+    (see _parse_int_lines)
+    """
+    import numpy as np
+
+    values = []
+    malformed = []
+    for i, text in enumerate(data.split(b"\n")):
+        value = _parse_int_line(text)
+        if value is not None:
+            values.append(value)
+        elif text.strip():
+            malformed.append(MalformedLine(source, i + 1, text.rstrip("\r")))
+    return np.array(values, dtype=np.int64), malformed
+
+
+def _parse_int_lines(data, source):
+    """
+    Parses text with a positive integer per line. Bytes of the whole text are
+    classified at once, so only lines with unexpected characters are parsed one by
+    one. The rest are parsed in bulk by numpy, between those lines. Lines with
+    zero or a negative value are malformed
+    @param data: The text
+    @param source: Name of parsed file, for malformed lines reports
+    @return: A tuple with a numpy array of values and a list of MalformedLine
+    """
+    import numpy as np
+
+    expected_bytes = np.zeros(256, dtype=bool)
+    expected_bytes[np.frombuffer(INT_LINE_BYTES, dtype=np.uint8)] = True
+    buf = np.frombuffer(data, dtype=np.uint8)
+    suspicious = np.flatnonzero(~expected_bytes[buf])
+    if len(suspicious) == 0:
+        values, malformed = _bulk_parse_ints(data), []
+    else:
+        line_ends = np.flatnonzero(buf == ord("\n"))
+        bad_lines = np.unique(line_ends.searchsorted(suspicious))
+        line_starts = np.concatenate(([0], line_ends + 1))
+        parts = []
+        malformed = []
+        pos = 0
+        for line in bad_lines:
+            beg = line_starts[line]
+            end = line_ends[line] if line < len(line_ends) else len(data)
+            parts.append(_bulk_parse_ints(data[pos:beg]))
+            text = data[beg:end]
+            value = _parse_int_line(text)
+            if value is not None:
+                parts.append(np.array([value], dtype=np.int64))
+            elif text.strip():
+                malformed.append(MalformedLine(source, line + 1, text.rstrip("\r")))
+            pos = end
+        parts.append(_bulk_parse_ints(data[pos:]))
+        values = np.concatenate(parts)
+    if (values <= 0).any():
+        # Only digits, but zero: rare, so their lines are found parsing the text again one line at a time
+        return _parse_int_lines_slowly(data, source)
+    return values, malformed
+
+
+def parse_rr_array(rr_file, malformed=None):
+    """
+    Parses file that contains rr values into a numpy array. Whole file is read and
+    parsed in bulk. Rotated and compressed rr files are also supported. Malformed
+    lines are skipped, logged and reported
+    @param rr_file: Path to file
+    @param malformed: Optional list where a MalformedLine is added for every malformed line
+    @return: A numpy array (uint32) with all rr values
+    """
+    import numpy as np
+
+    if is_rotated_rr_file(rr_file):
+        sources = [chunk.path for chunk in read_rr_index(rr_file)]
+    else:
+        sources = [rr_file]
+    parts = []
+    for source in sources:
+        values, bad_lines = _parse_int_lines(_read_result_file(source), source)
+        _report_malformed(malformed, source, bad_lines)
+        parts.append(values)
+    return np.concatenate(parts).astype(np.uint32) if parts else np.empty(0, dtype=np.uint32)
+
+
 def parse_rr_file(rr_file):
     """
-    Parses file that contains rr values and return a list with all integer values
+    Parses file that contains rr values and return a buffer with all integer values.
+    Rotated and compressed rr files are also supported. Malformed lines are skipped
+    (see parse_rr_array)
+    @param rr_file: Path to file
+    @return: A RRBuffer with all rr values converted to integer
+    """
+    return RRBuffer.from_numpy(parse_rr_array(rr_file))
+
+
+def parse_rr_window(rr_file, beg, end):
+    """
+    Parses the rr values of a time window. On rotated rr files, only the chunks that
+    overlap the window are read. On compressed rr files, only the blocks that
+    overlap the window are decompressed
     @param rr_file: Path to file
-    @return: The list with all rr values converted to integer
+    @param beg: Window begin, in seconds
+    @param end: Window end, in seconds
+    @return: A tuple with the time (in seconds) of the beat previous to the first
+    returned one and a RRBuffer with the rr values of the window
+    """
+
+    def _chunk_lines(chunk_path):
+        with open(chunk_path, "rt") as f:
+            for l in f:
+                yield l
+
+    if is_rotated_rr_file(rr_file):
+        sources = [(chunk.beg * 1000, _chunk_lines(chunk.path)) for chunk in read_rr_index(rr_file)
+                   if chunk.end > beg and chunk.beg < end]
+    elif is_compressed_file(rr_file):
+        compressed_file = BlockCompressedFile(rr_file + COMPRESSED_EXTENSION)
+        sources = [(compressed_file.blocks[i].beg, compressed_file.iter_lines([i]))
+                   for i in compressed_file.blocks_in_window(beg * 1000, end * 1000)]
+    else:
+        sources = [(0, _chunk_lines(rr_file))]
+
+    rr_values = RRBuffer()
+    start = None
+    for t, lines in sources:
+        for l in lines:
+            rr = _parse_int_line(l)
+            if rr is None:
+                # Malformed lines are skipped, as parse_rr_array does
+                continue
+            if t + rr >= end * 1000:
+                break
+            if t + rr >= beg * 1000:
+                if start is None:
+                    start = t / 1000.0
+                rr_values.append(rr)
+            t += rr
+    return start if start is not None else beg, rr_values
+
+
+def get_plain_file(path, plain_dir=PLAIN_FILES_DIR):
+    """
+    Gets a plain text result file, for applications that don't support rotated or
+    compressed files. Chunks of a rotated rr file are merged, and compressed files
+    are decompressed, to a plain copy in plain_dir. There is one copy per result
+    file, made again only when the result file changes
+    @param path: Path to result file
+    @param plain_dir: Folder of plain copies
+    @return: Path to a plain result file
+    """
+    rotated = is_rotated_rr_file(path)
+    if not rotated and not is_compressed_file(path):
+        return path
+    stamp = result_file_stamp(path)
+    plain_file = os.path.join(plain_dir, "{0}-{1}".format(hashlib.sha1(stamp[0]).hexdigest()[:16],
+                                                          os.path.basename(path)))
+    # Copy has the modification time of its result file
+    if os.path.isfile(plain_file) and os.path.getmtime(plain_file) == stamp[2]:
+        return plain_file
+    if not os.path.isdir(plain_dir):
+        os.makedirs(plain_dir)
+    fd, tmp_file = tempfile.mkstemp(suffix=".tmp", dir=plain_dir)
+    try:
+        with os.fdopen(fd, "wb") as dst:
+            if rotated:
+                for chunk in read_rr_index(path):
+                    with open(chunk.path, "rb") as src:
+                        shutil.copyfileobj(src, dst)
+            else:
+                compressed_file = BlockCompressedFile(path + COMPRESSED_EXTENSION)
+                for i in range(len(compressed_file.blocks)):
+                    dst.write(compressed_file.read_block(i))
+        os.utime(tmp_file, (stamp[2], stamp[2]))
+        if os.path.isfile(plain_file):
+            # Windows can't rename over an existing file
+            os.remove(plain_file)
+        os.rename(tmp_file, plain_file)
+    except Exception:
+        if os.path.isfile(tmp_file):
+            os.remove(tmp_file)
+        raise
+    return plain_file
+
+
+def _parse_tag_line(line):
     """
-    with open(rr_file, "rt") as f:
-        rr_values = [int(l) for l in f]
-        return rr_values
+    Parses a tag line. Fields may be separated by any whitespace, and begin time may
+    have a days prefix ("1 day, 2:00:00", as written by timedelta for long acquisitions)
+    @param line: The line
+    @return: A tuple (beg_seconds, tag_name, duration_seconds)
+    @raise ValueError: If line is malformed
+    """
+    fields = line.split()
+    days = 0
+    if len(fields) == 5 and fields[1].rstrip(",") in ("day", "days"):
+        days = int(fields[0])
+        fields = fields[2:]
+    if len(fields) != 3:
+        raise ValueError("Expected 3 fields")
+    h, m, sec = fields[0].split(":")
+    return days * 86400 + int(h) * 3600 + int(m) * 60 + float(sec), fields[1], float(fields[2])
+
+
+def parse_tag_arrays(tag_file, malformed=None):
+    """
+    Parses file (plain or compressed) that contains tag values into arrays. Lines
+    with the format written by gVARVI are parsed in bulk: fields of all of them are
+    split at once and times are converted by numpy. Any other line is parsed on its
+    own and, if it's malformed, it's skipped, logged and reported
+    @param tag_file: Path to file
+    @param malformed: Optional list where a MalformedLine is added for every malformed line
+    @return: A TagArrays with begin times (s), names and durations (s), in file order
+    """
+    import numpy as np
+
+    lines = _read_result_file(tag_file).splitlines()[1:]  # Skipping header row
+    lines = np.array(lines, dtype=bytes) if lines else np.empty(0, dtype="S1")
+    # Regular lines: three tab separated fields, H:MM:SS begin time, no spaces
+    regular = (np.char.count(lines, "\t") == 2) & (np.char.count(lines, " ") == 0) & \
+              (np.char.count(lines, ":") == 2) & (np.char.str_len(lines) > 0)
+    beg = np.empty(len(lines))
+    duration = np.empty(len(lines))
+    names = np.empty(len(lines), dtype=object)
+    valid = np.ones(len(lines), dtype=bool)
+    if regular.any():
+        fields = np.array("\t".join(lines[regular]).split("\t"), dtype=object).reshape(-1, 3)
+        try:
+            hms = np.array(":".join(fields[:, 0]).split(":"), dtype=float).reshape(-1, 3)
+            beg[regular] = hms.dot([3600, 60, 1])
+            duration[regular] = np.array(fields[:, 2].tolist(), dtype=float)
+            names[regular] = fields[:, 1]
+        except ValueError:
+            # Some regular looking line has a bad number: they are parsed one by one
+            regular[:] = False
+
+    bad_lines = []
+    for i in np.flatnonzero(~regular):
+        try:
+            beg[i], names[i], duration[i] = _parse_tag_line(lines[i])
+        except ValueError:
+            valid[i] = False
+            if lines[i].strip():
+                bad_lines.append(MalformedLine(tag_file, i + 2, lines[i]))
+    _report_malformed(malformed, tag_file, bad_lines)
+    return TagArrays(beg[valid], names[valid].tolist(), duration[valid])
 
 
 def parse_tag_file(tag_file):
     """
-    Parses file that contains tag values and return a list with all information
+    Parses file (plain or compressed) that contains tag values and return a list with all information.
+    Malformed lines are skipped (see parse_tag_arrays)
     @param tag_file: Path to file
     @return: A list of lists with this structure: [beg_seconds, tag_name, duration_seconds]
     """
-    with open(tag_file, "rt") as f:
-        tag_list = []
-        next(f)  # Skipping header row
-        for l in f:
-            l = l.split()
-            beg_list = map(float, l[0].split(":"))
-            beg_seconds = beg_list[0] * 3600 + beg_list[1] * 60 + beg_list[2]
-            name = l[1]
-            duration_seconds = float(l[2])
-            tag_list.append([beg_seconds, name, duration_seconds])
-        return tag_list
+    tags = parse_tag_arrays(tag_file)
+    return [[beg, name, duration] for beg, name, duration in zip(tags.beg.tolist(), tags.names,
+                                                                  tags.duration.tolist())]
+
+
+def summarize_rr(rr_values):
+    """
+    Computes summary statistics of a whole rr series
+    @param rr_values: RRBuffer (or any sequence) with rr values, in ms
+    @return: A dictionary with beats, duration (s), mean_rr (ms), sdnn (ms), rmssd (ms)
+    and mean_hr (bpm). Statistics that can't be computed are None
+    """
+    import numpy as np
+
+    if isinstance(rr_values, RRBuffer):
+        rr = rr_values.as_numpy().astype(float)
+    else:
+        rr = np.asarray(rr_values, dtype=float)
+    summary = {"beats": len(rr), "duration": rr.sum() / 1000, "mean_rr": None, "sdnn": None, "rmssd": None,
+               "mean_hr": None}
+    if len(rr) > 0:
+        summary["mean_rr"] = rr.mean()
+        summary["mean_hr"] = (60000 / rr).mean()
+    if len(rr) > 1:
+        summary["sdnn"] = rr.std(ddof=1)
+        summary["rmssd"] = np.sqrt((np.diff(rr) ** 2).mean())
+    return summary
+
+
+def read_binary_session(session_file):
+    """
+    Memory maps a binary session file
+    @param session_file: Path to file
+    @return: A BinarySession object
+    """
+    return BinarySession(session_file)
 
 
 def cumsum(it):
@@ -205,24 +1061,99 @@ def cumsum(it):
         yield total
 
 
+def minmax_decimate(x, y, beg, end, buckets):
+    """
+    Decimates the points of a line inside an index range, keeping its shape: points
+    are grouped in buckets (i.e. one per pixel) and only the minimum and maximum
+    of every bucket are kept, in their original order
+    @param x: Numpy array with x values (sorted)
+    @param y: Numpy array with y values
+    @param beg: First index of range
+    @param end: Last index (excluded) of range
+    @param buckets: Number of buckets
+    @return: A tuple of numpy arrays (x, y) with at most 2 * buckets + 2 points
+    """
+    import numpy as np
+
+    size = (end - beg) // buckets if buckets > 0 else 0
+    if size < 2:
+        return x[beg:end], y[beg:end]
+    # Whole buckets are reduced at once as rows of a matrix. The remainder is kept as is
+    stop = beg + size * buckets
+    rows = y[beg:stop].reshape(buckets, size)
+    offsets = beg + np.arange(buckets) * size
+    idx_min = offsets + rows.argmin(axis=1)
+    idx_max = offsets + rows.argmax(axis=1)
+    indices = np.empty(2 * buckets, dtype=np.intp)
+    indices[0::2] = np.minimum(idx_min, idx_max)
+    indices[1::2] = np.maximum(idx_min, idx_max)
+    indices = np.concatenate((indices, np.arange(stop, end)))
+    return x[indices], y[indices]
+
+
+class DecimatedLine(object):
+    """
+    Matplotlib line that only draws the points that can be seen: visible range is
+    found with binary search over x values, and it's decimated to about two points
+    per horizontal pixel (minmax_decimate). The line is decimated again whenever
+    axes are zoomed, panned or resized, so full resolution is drawn on zoom
+    @param ax: Matplotlib axes
+    @param x: Numpy array with x values (sorted)
+    @param y: Numpy array with y values
+    @param kwargs: Matplotlib line properties
+    """
+
+    def __init__(self, ax, x, y, **kwargs):
+        self.ax = ax
+        self.x = x
+        self.y = y
+        self.line, = ax.plot(x[:0], y[:0], **kwargs)
+        # Unlike a decimated line, axes limits must cover the whole data
+        if len(x):
+            ax.set_xlim(x[0], x[-1])
+        self.update()
+        ax.callbacks.connect("xlim_changed", self.update)
+        ax.figure.canvas.mpl_connect("resize_event", self.update)
+
+    def update(self, *_args):
+        """
+        Decimates visible points of the line
+        """
+        beg, end = self.ax.get_xlim()
+        # One more point at both sides, so the line reaches the edges of the axes
+        i0 = max(self.x.searchsorted(beg, "left") - 1, 0)
+        i1 = min(self.x.searchsorted(end, "right") + 1, len(self.x))
+        pixels = max(int(self.ax.bbox.width), 1)
+        self.line.set_data(*minmax_decimate(self.x, self.y, i0, i1, pixels))
+        self.ax.figure.canvas.draw_idle()
+
+
 def plot(rr_file, tag_file):
     """
     Paint results of acquisition
     @param rr_file: Path to file that contains rr values
     @param tag_file: Path to file that contains tag values
     """
+    plot_values(parse_rr_array(rr_file), parse_tag_file(tag_file))
+
+
+def plot_values(rr_values, tag_values):
+    """
+    Paint results of acquisition. Long acquisitions are decimated to the resolution
+    of the window (see DecimatedLine)
+    @param rr_values: Numpy array of rr values
+    @param tag_values: List of tags, with parse_tag_file structure
+    """
 
     import matplotlib.pyplot as plt
     plt.switch_backend("WXAgg")
 
     colors = ['orange', 'green', 'lightblue', 'grey', 'brown', 'red', 'yellow', 'black', 'magenta', 'purple']
     shuffle(colors)
-    rr_values = parse_rr_file(rr_file)
-    hr_values = map(lambda rr: 60 / (float(rr) / 1000), rr_values)
-    tag_values = parse_tag_file(tag_file)
-    x = [x / 1000 for x in cumsum(rr_values)]
-    y = hr_values
-    plt.plot(x, y)
+    x = rr_values.cumsum(dtype=float) / 1000
+    y = 60000.0 / rr_values
+    ax = plt.gca()
+    line = DecimatedLine(ax, x, y)
 
     for tag in tag_values:
         c = colors.pop()
@@ -231,8 +1162,10 @@ def plot(rr_file, tag_file):
     plt.ylabel('Heart rate (bpm)')
     plt.xlabel('Time (s)')
     plt.title('Acquisition results')
-    plt.ylim(ymin=min(min(y) - 10, 40), ymax=max(max(y) + 10, 150))
+    if len(y):
+        plt.ylim(ymin=min(y.min() - 10, 40), ymax=max(y.max() + 10, 150))
     plt.legend()
+    line.update()
     plt.show()
 
 
@@ -3,8 +3,8 @@ import os
 import wx
 
 from view.wxutils import ConfirmDialog, ErrorDialog, InfoDialog
-from config import MAIN_ICON
-from utils import valid_ip, get_translation
+from config import MAIN_ICON, REPLAY_SPEEDS
+from utils import valid_ip, valid_port, get_translation
 
 _ = get_translation()
 
@@ -25,7 +25,7 @@ class ConfWindow(wx.Frame):
         self.parent = parent
 
         wx.Frame.__init__(self, parent, style=wx.DEFAULT_FRAME_STYLE ^ wx.RESIZE_BORDER, title=_("Preferences"),
-                          size=(400, 420))
+                          size=(400, 750))
 
         icon = wx.Icon(MAIN_ICON, wx.BITMAP_TYPE_PNG)
         self.SetIcon(icon)
@@ -33,7 +33,7 @@ class ConfWindow(wx.Frame):
         self.CenterOnScreen()
 
         self.main_panel = wx.Panel(self)
-        self.MinSize = (400, 450)
+        self.MinSize = (400, 780)
         self.MaxSize = self.MinSize
 
         sizer = wx.BoxSizer(wx.VERTICAL)
@@ -59,13 +59,29 @@ class ConfWindow(wx.Frame):
         default_mode_label = wx.StaticText(self.main_panel, label=_("Default mode"))
         self.default_mode_list_box = wx.ListBox(self.main_panel,
                                                 size=(180, -1),
-                                                choices=[_("Device connected mode"), _("Demo mode")])
+                                                choices=[_("Device connected mode"), _("Demo mode"),
+                                                         _("Replay mode")])
 
         if self.conf.defaultMode == "Device connected mode":
             self.default_mode_list_box.Select(0)
+        elif self.conf.defaultMode == "Replay mode":
+            self.default_mode_list_box.Select(2)
         else:
             self.default_mode_list_box.Select(1)
 
+        self.Bind(wx.EVT_LISTBOX, self.OnSelectDefaultMode, id=self.default_mode_list_box.GetId())
+
+        replay_speed_label = wx.StaticText(self.main_panel, label=_("Replay speed"))
+        replay_speeds = [name for name, _speed in REPLAY_SPEEDS]
+        self.replay_speed_combo_box = wx.ComboBox(self.main_panel,
+                                                  size=(180, -1),
+                                                  choices=[_(name) for name in replay_speeds],
+                                                  style=wx.CB_READONLY)
+        self.replay_speed_combo_box.Select(replay_speeds.index(self.conf.replaySpeed)
+                                           if self.conf.replaySpeed in replay_speeds else 0)
+        if self.conf.defaultMode != "Replay mode":
+            self.replay_speed_combo_box.Disable()
+
         bluetooth_support_label = wx.StaticText(self.main_panel, label=_("Bluetooth support"))
         self.bluetooth_support_check_box = wx.CheckBox(self.main_panel)
         if self.conf.bluetoothSupport == "Yes":
@@ -106,16 +122,80 @@ class ConfWindow(wx.Frame):
         if self.conf.remoteDebugger == "No":
             self.rd_port_text_ctrl.Disable()
 
+        binary_output_label = wx.StaticText(self.main_panel, label=_("Save binary session file"))
+        self.binary_output_check_box = wx.CheckBox(self.main_panel)
+        if self.conf.binaryOutput == "Yes":
+            self.binary_output_check_box.SetValue(state=True)
+        else:
+            self.binary_output_check_box.SetValue(state=False)
+
+        rotate_rr_file_label = wx.StaticText(self.main_panel, label=_("Split rr file every hour"))
+        self.rotate_rr_file_check_box = wx.CheckBox(self.main_panel)
+        if self.conf.rotateRRFile == "Yes":
+            self.rotate_rr_file_check_box.SetValue(state=True)
+        else:
+            self.rotate_rr_file_check_box.SetValue(state=False)
+
+        compress_results_label = wx.StaticText(self.main_panel, label=_("Compress result files"))
+        self.compress_results_check_box = wx.CheckBox(self.main_panel)
+        if self.conf.compressResults == "Yes":
+            self.compress_results_check_box.SetValue(state=True)
+        else:
+            self.compress_results_check_box.SetValue(state=False)
+
+        correct_artifacts_label = wx.StaticText(self.main_panel, label=_("Correct artifacts (live statistics)"))
+        self.correct_artifacts_check_box = wx.CheckBox(self.main_panel)
+        if self.conf.correctArtifacts == "Yes":
+            self.correct_artifacts_check_box.SetValue(state=True)
+        else:
+            self.correct_artifacts_check_box.SetValue(state=False)
+
+        capture_raw_data_label = wx.StaticText(self.main_panel, label=_("Capture raw device data"))
+        self.capture_raw_data_check_box = wx.CheckBox(self.main_panel)
+        if self.conf.captureRawData == "Yes":
+            self.capture_raw_data_check_box.SetValue(state=True)
+        else:
+            self.capture_raw_data_check_box.SetValue(state=False)
+
+        live_feed_label = wx.StaticText(self.main_panel, label=_("Live network feed"))
+        self.live_feed_check_box = wx.CheckBox(self.main_panel)
+        if self.conf.liveFeed == "Yes":
+            self.live_feed_check_box.SetValue(state=True)
+        else:
+            self.live_feed_check_box.SetValue(state=False)
+
+        self.Bind(wx.EVT_CHECKBOX, self.OnCheckLiveFeed, id=self.live_feed_check_box.GetId())
+
+        live_feed_ip_label = wx.StaticText(self.main_panel, label=_("Live feed IP"))
+        self.live_feed_ip_text_ctrl = wx.TextCtrl(self.main_panel, -1, size=(180, -1), value=self.conf.liveFeedIP)
+        if self.conf.liveFeed == "No":
+            self.live_feed_ip_text_ctrl.Disable()
+
+        live_feed_port_label = wx.StaticText(self.main_panel, label=_("Live feed port"))
+        self.live_feed_port_text_ctrl = wx.SpinCtrl(self.main_panel, value=str(self.conf.liveFeedPort), min=1025,
+                                                    max=65535)
+        if self.conf.liveFeed == "No":
+            self.live_feed_port_text_ctrl.Disable()
+
         general_data_sizer.AddMany(
             [language_label, self.language_combo_box,
              check_for_updates_label, self.check_for_updates_check_box,
              default_mode_label, self.default_mode_list_box,
+             replay_speed_label, self.replay_speed_combo_box,
              bluetooth_support_label, self.bluetooth_support_check_box,
              ant_support_label, self.ant_support_check_box,
              scan_devices_on_startup_label, self.scan_devices_on_startup_check_box,
              remote_debugger_label, self.remote_debugger_check_box,
              rd_ip_label, self.rd_ip_text_ctrl,
-             rd_port_label, self.rd_port_text_ctrl])
+             rd_port_label, self.rd_port_text_ctrl,
+             binary_output_label, self.binary_output_check_box,
+             rotate_rr_file_label, self.rotate_rr_file_check_box,
+             compress_results_label, self.compress_results_check_box,
+             correct_artifacts_label, self.correct_artifacts_check_box,
+             capture_raw_data_label, self.capture_raw_data_check_box,
+             live_feed_label, self.live_feed_check_box,
+             live_feed_ip_label, self.live_feed_ip_text_ctrl,
+             live_feed_port_label, self.live_feed_port_text_ctrl])
 
         static_line = wx.StaticLine(self.main_panel, -1, size=(1, 1), style=wx.LI_HORIZONTAL)
         static_line.SetForegroundColour(wx.Colour(255, 0, 255))
@@ -151,22 +231,50 @@ class ConfWindow(wx.Frame):
             self.rd_ip_text_ctrl.Disable()
             self.rd_port_text_ctrl.Disable()
 
+    def OnSelectDefaultMode(self, _e):
+        if self.default_mode_list_box.GetSelection() == 2:
+            self.replay_speed_combo_box.Enable()
+        else:
+            self.replay_speed_combo_box.Disable()
+
+    def OnCheckLiveFeed(self, _):
+        if self.live_feed_check_box.IsChecked():
+            self.live_feed_ip_text_ctrl.Enable()
+            self.live_feed_port_text_ctrl.Enable()
+        else:
+            self.live_feed_ip_text_ctrl.Disable()
+            self.live_feed_port_text_ctrl.Disable()
+
     def OnSavePreferences(self, _e):
         new_config = self.main_facade.conf
         previous_language = new_config.language
         new_config.language = language_codes[languages.index(self.language_combo_box.GetValue())]
         new_config.checkForUpdatesOnStart = "Yes" if self.check_for_updates_check_box.IsChecked() else "No"
-        new_config.defaultMode = "Demo mode" if self.default_mode_list_box.GetStringSelection() == _("Demo mode") \
-            else "Device connected mode"
+        new_config.defaultMode = ["Device connected mode", "Demo mode", "Replay mode"][
+            self.default_mode_list_box.GetSelection()]
+        new_config.replaySpeed = REPLAY_SPEEDS[self.replay_speed_combo_box.GetSelection()][0]
         new_config.bluetoothSupport = "Yes" if self.bluetooth_support_check_box.IsChecked() else "No"
         new_config.antSupport = "Yes" if self.ant_support_check_box.IsChecked() else "No"
 
         new_config.scanDevicesOnStartup = "Yes" if self.scan_devices_on_startup_check_box.IsChecked() else "No"
         new_config.remoteDebugger = "Yes" if self.remote_debugger_check_box.IsChecked() else "No"
 
+        new_config.binaryOutput = "Yes" if self.binary_output_check_box.IsChecked() else "No"
+        new_config.rotateRRFile = "Yes" if self.rotate_rr_file_check_box.IsChecked() else "No"
+        new_config.compressResults = "Yes" if self.compress_results_check_box.IsChecked() else "No"
+        new_config.correctArtifacts = "Yes" if self.correct_artifacts_check_box.IsChecked() else "No"
+        new_config.captureRawData = "Yes" if self.capture_raw_data_check_box.IsChecked() else "No"
+        new_config.liveFeed = "Yes" if self.live_feed_check_box.IsChecked() else "No"
+
         new_config.rdIP = self.rd_ip_text_ctrl.GetValue()
-        if valid_ip(new_config.rdIP):
+        new_config.liveFeedIP = self.live_feed_ip_text_ctrl.GetValue()
+        if not valid_ip(new_config.liveFeedIP):
+            ErrorDialog(_("Live feed IP field must be a valid ip, although it had not been activated.")).show()
+        elif not valid_port(self.live_feed_port_text_ctrl.GetValue()):
+            ErrorDialog(_("Live feed port field must be a valid port, although it had not been activated.")).show()
+        elif valid_ip(new_config.rdIP):
             new_config.rdPort = self.rd_port_text_ctrl.GetValue()
+            new_config.liveFeedPort = self.live_feed_port_text_ctrl.GetValue()
             self.main_facade.save_config()
             if new_config.remoteDebugger == "Yes":
                 self.main_facade.activate_remote_debug(new_config.rdIP, int(new_config.rdPort))
@@ -6,6 +6,7 @@ import sys
 import os
 
 from view.wxutils import ErrorDialog
+from view.HRVStatsWindow import HRVStatsWindow
 from utils import get_translation
 
 _ = get_translation()
@@ -19,7 +20,7 @@ class EndedAcquisitionDialog(wx.Frame):
     """
 
     def __init__(self, parent, main_facade, title):
-        wx.Frame.__init__(self, parent, title=title, size=(265, 220))
+        wx.Frame.__init__(self, parent, title=title, size=(265, 250))
         self.main_facade = main_facade
         self.main_panel = wx.Panel(self)
 
@@ -30,6 +31,8 @@ class EndedAcquisitionDialog(wx.Frame):
         self.ghrv_check_box = wx.CheckBox(self.main_panel)
         plot_label = wx.StaticText(self.main_panel, label=_('Plot results'))
         self.plot_check_box = wx.CheckBox(self.main_panel)
+        stats_label = wx.StaticText(self.main_panel, label=_('Show HRV statistics'))
+        self.stats_check_box = wx.CheckBox(self.main_panel)
         open_tag_file_label = wx.StaticText(self.main_panel, label=_('Open tag file'))
         self.open_tag_file_check_box = wx.CheckBox(self.main_panel)
         open_rr_file_label = wx.StaticText(self.main_panel, label=_('Open rr file'))
@@ -38,6 +41,7 @@ class EndedAcquisitionDialog(wx.Frame):
         options_sizer.AddMany(
             [ghrv_label, self.ghrv_check_box,
              plot_label, self.plot_check_box,
+             stats_label, self.stats_check_box,
              open_tag_file_label, self.open_tag_file_check_box,
              open_rr_file_label, self.open_rr_file_check_box]
         )
@@ -62,6 +66,8 @@ class EndedAcquisitionDialog(wx.Frame):
             self._OnOpenRRFile()
         if self.open_tag_file_check_box.IsChecked():
             self._OnOpenTagFile()
+        if self.stats_check_box.IsChecked():
+            self._OnShowStatistics()
         # -------------------------------
 
         # - Blocking operation must be after non blocking ones -
@@ -88,5 +94,9 @@ class EndedAcquisitionDialog(wx.Frame):
     def _OnOpenTagFile(self):
         self.main_facade.open_tag_file()
 
+    def _OnShowStatistics(self):
+        summary, by_tag = self.main_facade.get_hrv_statistics()
+        HRVStatsWindow(self.GetParent(), summary, by_tag).Show()
+
     def _OnPlotResults(self):
         self.main_facade.plot_results()
@@ -0,0 +1,70 @@
+# coding=utf-8
+
+import wx
+import wx.lib.agw.ultimatelistctrl as ULC
+
+from config import GRID_STYLE
+from utils import get_translation
+
+_ = get_translation()
+
+
+class HRVStatsWindow(wx.Frame):
+    """
+    Window that shows time and frequency domain HRV metrics of an acquisition, for the whole
+    acquisition and for every tag.
+    @param parent: Parent window.
+    @param summary: Metrics of whole acquisition.
+    @param by_tag: Metrics of every tag.
+    """
+
+    # (metric, column title, format)
+    COLUMNS = [("beats", _("Beats"), "{0:d}"),
+               ("mean_rr", _("Mean RR (ms)"), "{0:.1f}"),
+               ("sdnn", _("SDNN (ms)"), "{0:.1f}"),
+               ("rmssd", _("RMSSD (ms)"), "{0:.1f}"),
+               ("pnn50", _("pNN50 (%)"), "{0:.1f}"),
+               ("mean_hr", _("Mean HR (bpm)"), "{0:.1f}"),
+               ("hr_range", _("HR range (bpm)"), "{0:.1f}"),
+               ("lf", _("LF (bpm²)"), "{0:.2f}"),
+               ("hf", _("HF (bpm²)"), "{0:.2f}"),
+               ("lf_hf", _("LF/HF"), "{0:.2f}"),
+               ("sd1", _("SD1 (ms)"), "{0:.1f}"),
+               ("sd2", _("SD2 (ms)"), "{0:.1f}"),
+               ("sampen", _("SampEn"), "{0:.3f}"),
+               ("dfa_alpha1", _("DFA α1"), "{0:.3f}"),
+               ("dfa_alpha2", _("DFA α2"), "{0:.3f}")]
+
+    def __init__(self, parent, summary, by_tag):
+        wx.Frame.__init__(self, parent, title=_("HRV statistics"), size=(1700, 400))
+        self.main_panel = wx.Panel(self)
+        sizer = wx.BoxSizer(wx.VERTICAL)
+
+        self.stats_grid = ULC.UltimateListCtrl(self.main_panel, agwStyle=GRID_STYLE)
+        self.stats_grid.InsertColumn(0, _("Tag"))
+        self.stats_grid.SetColumnWidth(0, 180)
+        for i, (_metric, title, _fmt) in enumerate(self.COLUMNS, 1):
+            self.stats_grid.InsertColumn(i, title)
+            self.stats_grid.SetColumnWidth(i, 100)
+
+        self._add_row(0, _("Whole acquisition"), summary)
+        for i, name in enumerate(by_tag["tag"]):
+            self._add_row(i + 1, name, dict((metric, by_tag[metric][i]) for metric, _title, _fmt in self.COLUMNS))
+
+        sizer.Add(self.stats_grid, 1, wx.EXPAND | wx.ALL, border=10)
+        close_btn = wx.Button(self.main_panel, label=_("Close"))
+        close_btn.Bind(wx.EVT_BUTTON, lambda _event: self.Destroy())
+        sizer.Add(close_btn, 0, wx.CENTER | wx.BOTTOM, border=10)
+        self.main_panel.SetSizer(sizer)
+        self.Centre()
+
+    def _add_row(self, row, name, metrics):
+        self.stats_grid.InsertStringItem(row, name)
+        for i, (metric, _title, fmt) in enumerate(self.COLUMNS, 1):
+            value = metrics[metric]
+            if metric != "beats" and value != value:
+                # nan: not enough beats
+                text = "-"
+            else:
+                text = fmt.format(int(value) if metric == "beats" else value)
+            self.stats_grid.SetStringItem(row, i, text)
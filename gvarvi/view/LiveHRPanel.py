@@ -0,0 +1,108 @@
+# coding=utf-8
+import math
+
+import wx
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_wxagg import FigureCanvasWxAgg
+
+from config import BACKGROUND_COLOUR, LIVE_PLOT_SECONDS, LIVE_PLOT_FPS
+from utils import get_translation
+
+_ = get_translation()
+
+
+class LiveHRPanel(wx.Panel):
+    """
+    Panel that plots heart rate of the last beats received. Beats are pulled from a
+    BeatRingBuffer by a timer, so device thread never waits for the GUI and redraws
+    are limited to fps per second (and skipped when no beat has arrived). Only the
+    line is redrawn (blitting over a saved background); axes are redrawn when the
+    line leaves them, scrolling half a window at once.
+    @param parent: Parent window.
+    @param live_buffer: analysis.LiveBuffer.BeatRingBuffer to plot. It can be set later with set_buffer().
+    @param seconds: Seconds shown.
+    @param fps: Maximum redraws per second.
+    """
+
+    HR_RANGE = (40, 180)
+
+    def __init__(self, parent, live_buffer=None, seconds=LIVE_PLOT_SECONDS, fps=LIVE_PLOT_FPS):
+        wx.Panel.__init__(self, parent)
+        self.SetBackgroundColour(BACKGROUND_COLOUR)
+        self.seconds = seconds
+        self.live_buffer = None
+        self.drawn_count = None
+        self.background = None
+
+        self.figure = Figure(figsize=(4, 2.5))
+        self.ax = self.figure.add_subplot(111)
+        self.ax.set_xlabel(_("Time (s)"))
+        self.ax.set_ylabel(_("Heart rate (bpm)"))
+        self.line, = self.ax.plot([], [], color="red", animated=True)
+        self.canvas = FigureCanvasWxAgg(self, -1, self.figure)
+        self.canvas.mpl_connect("draw_event", self._OnDraw)
+        self.set_buffer(live_buffer)
+
+        box = wx.BoxSizer(wx.VERTICAL)
+        box.Add(self.canvas, 1, wx.EXPAND)
+        self.SetSizer(box)
+
+        self.timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self._OnTimer, self.timer)
+        self.Bind(wx.EVT_WINDOW_DESTROY, self._OnDestroy)
+        self.timer.Start(int(1000 / fps))
+
+    def set_buffer(self, live_buffer):
+        """
+        Changes plotted buffer, resetting axes.
+        @param live_buffer: analysis.LiveBuffer.BeatRingBuffer to plot.
+        """
+        self.live_buffer = live_buffer
+        self.drawn_count = None
+        self.line.set_data([], [])
+        self.ax.set_xlim(0, self.seconds)
+        self.ax.set_ylim(*self.HR_RANGE)
+        self.canvas.draw()
+
+    def _OnDraw(self, _event):
+        # Axes have been redrawn (new limits, resize...): save them to blit the line over them
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self.ax.draw_artist(self.line)
+
+    def _OnTimer(self, _e):
+        if self.live_buffer is None:
+            return
+        times, hr, count = self.live_buffer.latest()
+        if count == self.drawn_count:
+            return
+        self.drawn_count = count
+        self.line.set_data(times, hr)
+        if self._update_limits(times, hr) or self.background is None:
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self.background)
+            self.ax.draw_artist(self.line)
+            self.canvas.blit(self.ax.bbox)
+
+    def _update_limits(self, times, hr):
+        """
+        Moves axes limits when line leaves them.
+        @return: True if limits have changed.
+        """
+        if not len(times):
+            return False
+        changed = False
+        if times[-1] > self.ax.get_xlim()[1]:
+            end = times[-1] + self.seconds / 2.0
+            self.ax.set_xlim(end - self.seconds, end)
+            changed = True
+        low, high = self.ax.get_ylim()
+        if hr.min() < low or hr.max() > high:
+            self.ax.set_ylim(min(low, math.floor(hr.min() / 10) * 10), max(high, math.ceil(hr.max() / 10) * 10))
+            changed = True
+        return changed
+
+    def _OnDestroy(self, event):
+        if event.GetEventObject() is self:
+            self.timer.Stop()
+        event.Skip()
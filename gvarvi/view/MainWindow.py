@@ -5,11 +5,12 @@ import os
 import wx.lib.agw.ultimatelistctrl as ULC
 
 from logger import Logger
-from wxutils import InfoDialog, ErrorDialog, ConfirmDialog
+from wxutils import InfoDialog, ErrorDialog, ConfirmDialog, RecoverDialog
 from config import ACTIVITIES_LIST_ID, DEVICES_LIST_ID, GRID_STYLE, MAIN_ICON, BACKGROUND_COLOUR
-from config import DEVICE_CONNECTED_MODE, DEMO_MODE
+from config import DEVICE_CONNECTED_MODE, DEMO_MODE, REPLAY_MODE
+from devices.Capture import CAPTURE_EXTENSION
 from utils import MissingFiles, AbortedAcquisition, FailedAcquisition, HostDownError, get_translation, TarFileNotValid
-from utils import ResultEvent, EVT_RESULT_ID
+from utils import ResultEvent, EVT_RESULT_ID, result_file_exists
 from view.DebugWindow import DebugWindow
 from view.AddActivityWindow import AddActivityWindow
 from view.InsModPhotoPresentation import InsModPhotoPresentation
@@ -406,10 +407,33 @@ the lack of specific tools for this purpose.""")
         from EndedAcquisitionDialog import EndedAcquisitionDialog
         self.main_facade.acquisition_path = acq_path
         if self.main_facade.check_acquisition_result_files_exists():
+            self.main_facade.prefetch_analysis()
             EndedAcquisitionDialog(self, self.main_facade, title=acq_path).Show()
         else:
             ErrorDialog(_("Result files of acquisition not found")).show()
 
+    def check_unfinished_acquisitions(self):
+        """
+        Offers to recover acquisitions interrupted by a crash. Journals that are neither
+        recovered nor discarded are offered again next time.
+        """
+        for journal in self.main_facade.get_unfinished_acquisitions():
+            acq_path = journal.rr_file[:-len(".rr.txt")]
+            result = RecoverDialog(_("Acquisition {0} was interrupted. Do you want to recover it?").format(acq_path),
+                                   _("Interrupted acquisition")).get_result()
+            if result == RecoverDialog.RECOVER:
+                try:
+                    self.main_facade.recover_acquisition(journal)
+                    self._build_menu()
+                except (IOError, OSError) as e:
+                    self.logger.exception("Unable to recover acquisition")
+                    ErrorDialog(_("Unable to recover acquisition{0}{1}").format(os.linesep, e)).show()
+            elif result == RecoverDialog.DISCARD:
+                confirm = ConfirmDialog(_("Data of acquisition {0} will be lost. Are you sure?").format(acq_path),
+                                        _("Discard acquisition")).get_result()
+                if confirm == wx.ID_YES:
+                    self.main_facade.discard_unfinished_acquisition(journal)
+
     def _OnToggleDebug(self, _e):
         if self.debug_window.IsShown():
             self.debug_window.Hide()
@@ -461,7 +485,8 @@ the lack of specific tools for this purpose.""")
         mode = None
         if self._is_activity_selected():
             activity_id = self.activities_grid.GetItem(self.activities_grid.GetFirstSelected()).GetText()
-            if not self.main_facade.is_demo_mode() and self._is_device_selected():
+            if not self.main_facade.is_demo_mode() and not self.main_facade.is_replay_mode() and \
+                    self._is_device_selected():
                 mode = DEVICE_CONNECTED_MODE
                 dev_name = self.devicesGrid.GetItem(self.devicesGrid.GetFirstSelected()).GetText()
                 dev_dir = self.devicesGrid.GetItem(self.devicesGrid.GetFirstSelected(), 1).GetText()
@@ -474,11 +499,17 @@ the lack of specific tools for this purpose.""")
             elif self.main_facade.is_demo_mode():
                 mode = DEMO_MODE
 
+            elif self.main_facade.is_replay_mode():
+                mode = REPLAY_MODE
+                dev_dir = self._select_capture_file()
+                if dev_dir is None:
+                    correct_data = False
+
             else:
                 correct_data = False
                 InfoDialog(_("You must select an activity and a device")).show()
 
-        elif self.main_facade.is_demo_mode():
+        elif self.main_facade.is_demo_mode() or self.main_facade.is_replay_mode():
             correct_data = False
             InfoDialog(_("You must select an activity")).show()
 
@@ -498,7 +529,8 @@ the lack of specific tools for this purpose.""")
             while not close_dialog:
                 if dlg.ShowModal() == wx.ID_OK:
                     path = dlg.GetPath()
-                    if os.path.isfile(path + ".rr.txt") or os.path.isfile(path) or os.path.isfile(path + ".tag.txt"):
+                    if result_file_exists(path + ".rr.txt") or os.path.isfile(path) or \
+                            result_file_exists(path + ".tag.txt"):
                         result = ConfirmDialog(_("File already exists. Do you want to overwrite it?"),
                                                _("Confirm")).get_result()
                         if result == wx.ID_YES:
@@ -526,6 +558,20 @@ the lack of specific tools for this purpose.""")
                 except HostDownError:
                     ErrorDialog("It seems that device is down").show()
 
+    def _select_capture_file(self):
+        """
+        Asks for the capture file replayed in replay mode.
+        @return: Path to capture file, or None if user cancels.
+        """
+        dlg = wx.FileDialog(self, message=_("Select the capture file to replay"),
+                            defaultDir="",
+                            defaultFile="",
+                            wildcard="{0} (*{1})|*{1}".format(_("Capture files"), CAPTURE_EXTENSION),
+                            style=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST)
+        path = dlg.GetPath() if dlg.ShowModal() == wx.ID_OK else None
+        dlg.Destroy()
+        return path
+
     def _refresh_nearby_devices(self):
         self.button_rescan_devices.SetLabel(_("Searching..."))
         self.devicesGrid.DeleteAllItems()
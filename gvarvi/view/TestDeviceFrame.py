@@ -3,6 +3,7 @@ import wx
 
 from config import BACKGROUND_COLOUR, EVT_RESULT_ID
 from utils import get_translation
+from view.LiveHRPanel import LiveHRPanel
 
 _ = get_translation()
 
@@ -18,7 +19,7 @@ class TestDeviceFrame(wx.Frame):
         NORMAL_FONT = wx.Font(pointSize=18, family=wx.SWISS, style=wx.NORMAL, weight=wx.LIGHT)
         self.main_facade = main_facade
         no_close = wx.MINIMIZE_BOX | wx.SYSTEM_MENU | wx.CAPTION | wx.CLIP_CHILDREN
-        wx.Frame.__init__(self, None, title=_("Running test"), size=(400, 260), style=no_close)
+        wx.Frame.__init__(self, None, title=_("Running test"), size=(500, 560), style=no_close)
 
         self.SetBackgroundColour(BACKGROUND_COLOUR)
 
@@ -43,6 +44,9 @@ class TestDeviceFrame(wx.Frame):
                                hr_label, self.hr_text])
         box.Add(results_sizer, proportion=1, flag=wx.ALIGN_CENTER)
 
+        box.AddSpacer(10)
+        self.live_panel = LiveHRPanel(self)
+        box.Add(self.live_panel, 4, wx.EXPAND | wx.LEFT | wx.RIGHT, 10)
         box.AddSpacer(20)
 
         close_button = wx.Button(self, wx.OK, _("OK"))
@@ -55,7 +59,8 @@ class TestDeviceFrame(wx.Frame):
 
     def run_test(self, name, mac, dev_type):
         self.Connect(-1, -1, EVT_RESULT_ID, self.OnResult)
-        self.main_facade.run_test(notify_window=self, name=name, mac=mac, dev_type=dev_type)
+        live_buffer = self.main_facade.run_test(notify_window=self, name=name, mac=mac, dev_type=dev_type)
+        self.live_panel.set_buffer(live_buffer)
 
     def OnOk(self, _e):
         self.status_text.SetLabel(_("Disconnecting..."))
@@ -59,3 +59,29 @@ class ConfirmDialog(wx.MessageDialog):
         result = self.ShowModal()
         self.Destroy()
         return result
+
+
+class RecoverDialog(wx.MessageDialog):
+    """
+    Dialog that asks what to do with an interrupted acquisition: recover it now,
+    ask again later or discard it
+    :param msg: Message of the dialog
+    :param title: Title of the dialog
+    """
+
+    RECOVER = wx.ID_YES
+    DISCARD = wx.ID_NO
+    LATER = wx.ID_CANCEL
+
+    def __init__(self, msg, title):
+        wx.MessageDialog.__init__(self, None, msg, title, wx.YES_NO | wx.CANCEL | wx.YES_DEFAULT | wx.ICON_QUESTION)
+        self.SetYesNoCancelLabels(_("Recover"), _("Discard"), _("Ask me later"))
+
+    def get_result(self):
+        """
+        Gets the button pressed by the user
+        :return: RECOVER, DISCARD or LATER (also if dialog is closed)
+        """
+        result = self.ShowModal()
+        self.Destroy()
+        return result